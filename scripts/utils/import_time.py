@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+HEAVY_MODULES = ["numpy", "cv2", "scipy", "sklearn", "matplotlib", "torch"]
+
+COMMANDS = {
+    "help": [sys.executable, "-m", "src.betteredit.cli", "--help"],
+    "check-config": [sys.executable, "-m", "src.betteredit.cli", "check-config"],
+    "import-pipeline": [sys.executable, "-c", "import src.pipeline"],
+}
+
+
+def time_command(cmd, runs):
+    """Median wall time in milliseconds of running cmd `runs` times."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(samples)
+
+
+def heavy_modules_loaded_by_cli():
+    """Heavy top-level modules present in sys.modules after importing the CLI."""
+    code = (
+        "import sys, json, src.betteredit.cli; "
+        f"print(json.dumps(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure betteredit CLI startup time.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command (median is reported)")
+    parser.add_argument("--max-help-ms", type=float, default=None, help="Fail if `--help` is slower than this")
+    parser.add_argument("--max-check-config-ms", type=float, default=None, help="Fail if `check-config` is slower than this")
+    args = parser.parse_args()
+
+    results = {name: time_command(cmd, args.runs) for name, cmd in COMMANDS.items()}
+    for name, ms in results.items():
+        print(f"{name:<16} {ms:8.1f} ms")
+
+    heavy = heavy_modules_loaded_by_cli()
+    print(f"heavy modules imported by the CLI module: {heavy or 'none'}")
+
+    failed = bool(heavy)
+    for name, limit in (("help", args.max_help_ms), ("check-config", args.max_check_config_ms)):
+        if limit is not None and results[name] > limit:
+            print(f"FAIL: {name} took {results[name]:.1f} ms (limit {limit:.1f} ms)")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
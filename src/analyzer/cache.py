@@ -0,0 +1,202 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import numpy as np
+from typing import Any, Callable, Dict, Mapping, Optional
+from numpy.typing import NDArray
+from loguru import logger
+
+# Bump when a cached stage's output format or algorithm changes.
+CACHE_VERSION = 3
+
+
+def file_content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """
+    Content-addressed on-disk cache of detector intermediates.
+
+    An entry is a directory of `.npy` files (one per named array) whose name
+    is the hash of (image key, stage, stage parameters, CACHE_VERSION). Image
+    keys come from `image_data["cache_keys"]`, set by `preprocess_image`; the
+    stage parameters must be exactly the config fields the stage depends on,
+    so unrelated config edits (e.g. fusion weights) keep hitting the cache.
+
+    Hits are memory-mapped read-only. Entries are written to a temporary
+    directory and renamed into place, so concurrent processes never observe
+    partial entries. When the cache grows past `max_bytes`, the least recently
+    used entries (by directory mtime, refreshed on every hit) are removed.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._approx_bytes: Optional[int] = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, cfg: Any) -> Optional["FeatureCache"]:
+        """Build a cache from a CacheConfig, or None when caching is disabled."""
+        if not cfg.enabled:
+            return None
+        return cls(os.path.expanduser(cfg.directory), max_bytes=cfg.max_bytes)
+
+    @staticmethod
+    def key(image_key: str, stage: str, params: Mapping[str, Any]) -> str:
+        payload = json.dumps(
+            {"image": image_key, "stage": stage, "params": params, "version": CACHE_VERSION},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, NDArray[Any]]]:
+        entry = self._entry_path(key)
+        try:
+            names = sorted(f for f in os.listdir(entry) if f.endswith(".npy"))
+            arrays = {
+                name[:-4]: np.load(os.path.join(entry, name), mmap_mode="r", allow_pickle=False)
+                for name in names
+            }
+            os.utime(entry)
+        except (FileNotFoundError, ValueError, OSError):
+            # Missing, or evicted by another process while loading.
+            return None
+        return arrays
+
+    def put(self, key: str, arrays: Mapping[str, NDArray[Any]]) -> None:
+        entry = self._entry_path(key)
+        if os.path.isdir(entry):
+            return
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.cache_dir)
+        try:
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(arr), allow_pickle=False)
+            os.rename(tmp, entry)
+        except OSError:
+            # Another process stored the same entry first.
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        with self._lock:
+            if self._approx_bytes is not None:
+                self._approx_bytes += self._entry_size(entry)
+            needs_scan = self._approx_bytes is None or self._approx_bytes > self.max_bytes
+        if needs_scan:
+            self._evict()
+
+    def lookup(
+        self,
+        image_data: Mapping[str, Any],
+        resolution: str,
+        stage: str,
+        params: Mapping[str, Any]
+    ) -> Optional[Dict[str, NDArray[Any]]]:
+        """
+        Cached arrays for `stage` of this image, or None.
+
+        resolution: "og" or "padded", selecting which image key the stage's
+        input depends on. Images without cache keys (e.g. synthetic test
+        inputs) never hit.
+        """
+        image_key = (image_data.get("cache_keys") or {}).get(resolution)
+        if image_key is None:
+            return None
+        key = self.key(image_key, stage, params)
+        hit = self.get(key)
+        if hit is not None:
+            logger.debug("Feature cache hit: {} ({})", stage, key[:12])
+        return hit
+
+    def store(
+        self,
+        image_data: Mapping[str, Any],
+        resolution: str,
+        stage: str,
+        params: Mapping[str, Any],
+        arrays: Mapping[str, NDArray[Any]]
+    ) -> None:
+        image_key = (image_data.get("cache_keys") or {}).get(resolution)
+        if image_key is not None:
+            self.put(self.key(image_key, stage, params), arrays)
+
+    def fetch(
+        self,
+        image_data: Mapping[str, Any],
+        resolution: str,
+        stage: str,
+        params: Mapping[str, Any],
+        compute: Callable[[], Dict[str, NDArray[Any]]]
+    ) -> Dict[str, NDArray[Any]]:
+        """Return the cached arrays for `stage`, or run `compute` and store its result."""
+        hit = self.lookup(image_data, resolution, stage, params)
+        if hit is not None:
+            return hit
+        arrays = compute()
+        self.store(image_data, resolution, stage, params, arrays)
+        return arrays
+
+    def size_bytes(self) -> int:
+        total = 0
+        for entry, _ in self._entries():
+            total += self._entry_size(entry)
+        return total
+
+    def clear(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock:
+            self._approx_bytes = 0
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _entries(self):
+        for shard in os.listdir(self.cache_dir):
+            shard_path = os.path.join(self.cache_dir, shard)
+            if shard.startswith(".") or not os.path.isdir(shard_path):
+                continue
+            for name in os.listdir(shard_path):
+                entry = os.path.join(shard_path, name)
+                try:
+                    yield entry, os.stat(entry).st_mtime
+                except FileNotFoundError:
+                    continue
+
+    @staticmethod
+    def _entry_size(entry: str) -> int:
+        size = 0
+        for name in os.listdir(entry):
+            try:
+                size += os.path.getsize(os.path.join(entry, name))
+            except FileNotFoundError:
+                pass
+        return size
+
+    def _evict(self) -> None:
+        """Rescan the cache (other processes may share it) and drop LRU entries above max_bytes."""
+        with self._lock:
+            try:
+                entries = sorted(self._entries(), key=lambda item: item[1])
+                sizes = {entry: self._entry_size(entry) for entry, _ in entries}
+            except FileNotFoundError:
+                return
+            total = sum(sizes.values())
+            for entry, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= sizes[entry]
+                logger.debug("Evicted feature cache entry {}", os.path.basename(entry)[:12])
+            self._approx_bytes = total
@@ -1,16 +1,20 @@
 import logging
 import numpy as np
-from typing import Any, Dict, List, Tuple
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
 
 from src.analyzer.features.edge_detection.base import EdgeDetector
 from src.analyzer.features.color_detection.base import ColorDetector
+from src.analyzer.features.color_detection.incremental import IncrementalColorAnalysis
+from src.analyzer.features.parallel import run_tasks
+from src.analyzer.cache import FeatureCache
 
 from src.betteredit.analyzer.protocols.edge_detector_protocol import EdgeDetectorProtocol
 from src.betteredit.analyzer.protocols.color_detector_protocol import ColorDetectorProtocol
 from src.betteredit.analyzer.protocols.object_detector_protocol import ObjectDetectorProtocol
 from src.betteredit.analyzer.protocols.inter_fusion_strategy_protocol import InterFusionStrategyProtocol
 from src.betteredit.analyzer.protocols.human_saliency_model_protocol import HumanSaliencyModelProtocol
-from src.betteredit.config import EdgeDetectionConfig, ColorDetectionConfig, Settings
+from src.betteredit.config import EdgeDetectionConfig, ColorDetectionConfig, IncrementalConfig, Settings, TilingConfig
 
 
 class FeatureExtractor:
@@ -22,7 +26,10 @@ class FeatureExtractor:
         enable_saliency: bool,
         use_dl_models: bool,
         color_detector_config: ColorDetectionConfig,
-        edge_detector_config:   EdgeDetectionConfig
+        edge_detector_config:   EdgeDetectionConfig,
+        max_workers: int = 1,
+        cache: Optional[FeatureCache] = None,
+        tiling: Optional[TilingConfig] = None
     ):
         self.enable_color = enable_color
         self.enable_edges = enable_edges
@@ -31,6 +38,9 @@ class FeatureExtractor:
         self.use_dl_models = use_dl_models
         self.color_detector_config = color_detector_config
         self.edge_detector_config = edge_detector_config
+        self.max_workers = max_workers
+        self.cache = cache
+        self.tiling = tiling
 
         self.engines: List[Tuple[str, Any]] = []
 
@@ -39,11 +49,13 @@ class FeatureExtractor:
 
     def _load_models(self):
         if self.enable_edges:
-            edge_engine: EdgeDetectorProtocol = EdgeDetector(self.edge_detector_config)
+            edge_engine: EdgeDetectorProtocol = EdgeDetector(self.edge_detector_config, cache=self.cache)
             self.engines.append(("edges", edge_engine))
 
         if self.enable_color:
-            color_engine: ColorDetectorProtocol = ColorDetector(self.color_detector_config)
+            color_engine: ColorDetectorProtocol = ColorDetector(
+                self.color_detector_config, cache=self.cache, tiling=self.tiling
+            )
             self.engines.append(("color", color_engine))
 
         if self.enable_objects:
@@ -68,23 +80,92 @@ class FeatureExtractor:
           so future object/segmentation modules slot in cleanly.
         """
         logging.info("[EXTRACT] Starting feature extraction via interfaces...")
-        features: Dict[str, Any] = {}
-        for name, engine in self.engines:
-            raw = engine.detect(image_data)
+        features: Dict[str, Any] = run_tasks(
+            {name: partial(self._detect, engine, image_data) for name, engine in self.engines},
+            self.max_workers,
+            stage="detect"
+        )
 
-            # flatten the new schema for backwards compatibility
-            if isinstance(raw, dict) and "cues" in raw and "combined" in raw:
-                merged = {**raw["cues"], **raw["combined"]}
-            else:
-                merged = raw
+        logging.info("[EXTRACT] Feature extraction complete.")
 
-            # always add placeholders for detections/segmentation
-            if isinstance(merged, dict):
-                merged.setdefault("detections", None)
-                merged.setdefault("segmentation", None)
+        return features
 
-            features[name] = merged
 
-        logging.info("[EXTRACT] Feature extraction complete.")
+    def sweep(self, image_data: Dict[str, Any], color_strategies: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Extract features once per image and re-run only color intra-fusion
+        for each strategy in `color_strategies`.
+        Returns a dict: { strategy: { "edges": {...}, "color": {...}, ... } }.
+
+        Engines without a strategy sweep are run once and their features are
+        shared by every strategy.
+        """
+        logging.info("[EXTRACT] Starting strategy sweep over %d strategies...", len(color_strategies))
+        def run(name: str, engine: Any) -> Dict[str, Any]:
+            if name == "color":
+                per_strategy = engine.sweep(image_data, color_strategies)
+                return {strategy: self._flatten(per_strategy[strategy]) for strategy in color_strategies}
+            shared = self._detect(engine, image_data)
+            return {strategy: shared for strategy in color_strategies}
+
+        results = run_tasks(
+            {name: partial(run, name, engine) for name, engine in self.engines},
+            self.max_workers,
+            stage="detect"
+        )
+        sweeps: Dict[str, Dict[str, Any]] = {
+            strategy: {name: per_strategy[strategy] for name, per_strategy in results.items()}
+            for strategy in color_strategies
+        }
+
+        logging.info("[EXTRACT] Strategy sweep complete.")
+
+        return sweeps
+
+
+    def incremental_analysis(self, cfg: Optional[IncrementalConfig] = None) -> IncrementalColorAnalysis:
+        """Empty incremental color state for `extract_incremental` (color must be enabled)."""
+        return dict(self.engines)["color"].incremental_analysis(cfg)
+
+
+    def extract_incremental(self, image_data: Dict[str, Any], analysis: IncrementalColorAnalysis) -> Dict[str, Any]:
+        """
+        `extract` for a new version of a previously analyzed image. Color
+        features are updated by `analysis`, recomputing only what the changed
+        tiles reach; other engines run as usual.
+        """
+        logging.info("[EXTRACT] Starting incremental feature extraction...")
+        def run(name: str, engine: Any) -> Any:
+            if name == "color":
+                return self._flatten(engine.detect_incremental(image_data, analysis))
+            return self._detect(engine, image_data)
+
+        features: Dict[str, Any] = run_tasks(
+            {name: partial(run, name, engine) for name, engine in self.engines},
+            self.max_workers,
+            stage="detect"
+        )
+
+        logging.info("[EXTRACT] Incremental feature extraction complete.")
+
+        return features
+
+
+    def _detect(self, engine: Any, image_data: Dict[str, Any]) -> Any:
+        return self._flatten(engine.detect(image_data))
+
+
+    @staticmethod
+    def _flatten(raw: Any) -> Any:
+        # flatten the new schema for backwards compatibility
+        if isinstance(raw, dict) and "cues" in raw and "combined" in raw:
+            merged = {**raw["cues"], **raw["combined"]}
+        else:
+            merged = raw
+
+        # always add placeholders for detections/segmentation
+        if isinstance(merged, dict):
+            merged.setdefault("detections", None)
+            merged.setdefault("segmentation", None)
 
-        return features
\ No newline at end of file
+        return merged
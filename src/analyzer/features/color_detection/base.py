@@ -1,128 +1,598 @@
 import cv2
 import numpy as np
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 from numpy.typing import NDArray
 from . import extractors, transforms
-from .transforms import compute_color_density
-from .intra_fusion import compute_cue_salience, compute_salience
+from .transforms import compute_color_density, compute_color_density_stack
+from .intra_fusion import compute_cue_salience, compute_cue_salience_stack, compute_salience
+from .tiled import TiledColorAnalysis
+from .incremental import IncrementalColorAnalysis
+from src.analyzer.features.parallel import run_tasks
+from src.analyzer.features.stacking import stack_maps
+from src.analyzer.preprocessing import CONTENT_RES, color_view, content_slices, pad_content
+from src.analyzer.gradients import Gradients, image_gradients
+from src.analyzer.pyramid import GaussianPyramid, image_pyramid
+from src.config.profiler import StageProfiler
+from src.analyzer.cache import FeatureCache
 from src.betteredit.analyzer.protocols.color_detector_protocol import ColorDetectorProtocol
-from src.betteredit.analyzer.protocols.detection_protocols import DetectionResult, CueBlock
-from src.analyzer.report.report_generator import print_structure
-from src.betteredit.config import ColorDetectionConfig
+from src.betteredit.analyzer.protocols.detection_protocols import DetectionResult, CueBlock, CombinedBlock
+from src.analyzer.report.report_generator import format_structure
+from src.betteredit.config import ColorDetectionConfig, IncrementalConfig, RoiRefinementConfig, TilingConfig
 from loguru import logger
 
 
+RAW_CUES = ("hue", "saturation", "luminance", "rarity")
+DERIVED_CUES = ("hue_contrast", "luminance_contrast")
+# raw cue each derived cue is computed from
+DERIVED_INPUTS = {"hue_contrast": "hue", "luminance_contrast": "luminance"}
+
+
 class ColorDetector(ColorDetectorProtocol):
     """
     Unified ColorDetector supporting multiple cues and intra-fusion.
     Returns a DetectionResult with `cues` and `combined` blocks.
     """
-    def __init__(self, cfg: ColorDetectionConfig):
+    def __init__(
+        self,
+        cfg: ColorDetectionConfig,
+        cache: Optional[FeatureCache] = None,
+        tiling: Optional[TilingConfig] = None
+    ):
         """
         cfg: validated ColorDetectionConfig from Pydantic.
+        cache: optional on-disk cache for cue maps and their blocks.
+        tiling: optional tiled execution of large originals (see `tiled_analysis`).
         """
+        self.cfg                 = cfg
         self.salience_strategy   = cfg.salience_strategy
         self.contrast_method     = cfg.contrast_method
         self.sobel_weight        = cfg.sobel_weight
         self.rarity_space        = cfg.rarity_space
         self.rarity_k            = cfg.rarity_k
+        self.rarity_engine       = cfg.rarity_engine
+        self.rarity_seed         = cfg.rarity_seed
+        self.rarity_sample_size  = cfg.rarity_sample_size
+        self.rarity_bins         = cfg.rarity_bins
         self.weights             = cfg.weights
         self.return_density      = cfg.return_density
         self.return_salience     = cfg.return_salience
         self.density_window_size = cfg.density_window_size
+        self.density_windows     = cfg.density_window_sizes or cfg.density_window_size
         self.hue_contrast_sigma  = cfg.hue_contrast_sigma
+        self.contrast_pyramid_level = cfg.contrast_pyramid_level
+        self.analysis_resolution = cfg.analysis_resolution
+        self.analysis_max_pixels = cfg.analysis_max_pixels
+        self.crop_padding        = cfg.crop_padding
+        self.upsample_to_original = cfg.upsample_to_original
+        self.max_workers         = cfg.max_workers
+        self.cues                = tuple(c for c in RAW_CUES + DERIVED_CUES if cfg.cues is None or c in cfg.cues)
+        self.roi_refinement      = cfg.roi_refinement
+        self.refine_rarity       = cfg.roi_refinement.enabled and "rarity" in self.cues
+        self.coarse_detector     = self._coarse_detector(cfg) if self.refine_rarity else None
+        self.cache               = cache
+        self.tiling              = tiling
 
-        logger.debug(
+        if cfg.roi_refinement.enabled and not self.refine_rarity:
+            logger.warning("roi_refinement is enabled but rarity is not among the cues; it has no effect")
+        logger.opt(lazy=True).debug(
             "Initialized ColorDetector with config:\n{}",
-            cfg.model_dump_json(indent=2)
+            lambda: cfg.model_dump_json(indent=2)
         )
 
     def detect(self, image_data: Dict[str, Any]) -> DetectionResult:
-        # Prepare raw inputs
-        bgr_img = image_data["bgr"]["og"]
-        hsv = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2HSV)
+        cue_maps = self.compute_cues(image_data)
+        outputs: DetectionResult = {
+            "cues": self.build_cue_blocks(cue_maps, image_data),
+            "combined": self.fuse(cue_maps, image_data=image_data)
+        }
 
-        # 1. Raw cues
-        raw_cues: Dict[str, np.ndarray] = {
-            "hue": extractors.extract_hue_map(hsv),
-            "saturation": extractors.extract_saturation_map(hsv),
-            "luminance": extractors.extract_luminance_map(bgr_img),
-            "rarity": transforms.compute_color_rarity(
-                bgr_img,
-                space=self.rarity_space,
-                k=self.rarity_k
-            )
+        logger.opt(lazy=True).debug("ColorDetector.detect() structure:\n{}", lambda: format_structure(outputs))
+        return outputs
+
+    def sweep(
+        self,
+        image_data: Dict[str, Any],
+        strategies: List[str]
+    ) -> Dict[str, DetectionResult]:
+        """
+        Evaluate several intra-fusion strategies against one set of cue maps.
+
+        Cue maps and per-cue blocks are computed once and shared by every
+        strategy's result; only the combined block is recomputed per strategy.
+        """
+        cue_maps = self.compute_cues(image_data)
+        cue_blocks = self.build_cue_blocks(cue_maps, image_data)
+        return {
+            strategy: {
+                "cues": cue_blocks,
+                "combined": self.fuse(cue_maps, strategy=strategy, image_data=image_data)
+            }
+            for strategy in strategies
         }
 
-        outputs: DetectionResult = {"cues": {}, "combined": {}}
+    def compute_cues(self, image_data: Dict[str, Any]) -> Dict[str, NDArray[Any]]:
+        """
+        Compute the configured raw and derived cue maps (`cues`), which do not
+        depend on the intra-fusion strategy. Raw cues a derived cue needs are
+        computed even if not configured. With a cache, only missing cues are
+        computed, and the analysis image is not even prepared when every cue hits.
+        """
+        tiled = self.tiled_analysis(image_data)
+        if tiled is not None:
+            return {name: cue_map for name, cue_map in self._tiled_cues(tiled, image_data).items() if name in self.cues}
+
+        cue_maps = self._cached_cues(image_data, self.cues)
+        pending_derived = [name for name in DERIVED_CUES if name in self.cues and name not in cue_maps]
+        needed_raw = tuple(
+            name for name in RAW_CUES
+            if name in self.cues or any(DERIVED_INPUTS[derived] == name for derived in pending_derived)
+        )
+        cue_maps.update(self._cached_cues(image_data, tuple(name for name in needed_raw if name not in cue_maps)))
 
-        # Process each raw cue
-        for name, cue_map in raw_cues.items():
-            block: CueBlock = {"map": cue_map}
-            if self.return_density:
-                block["density"] = compute_color_density(
-                    cue_map, window_size=self.density_window_size
-                )
-            if self.return_salience:
-                strength = cue_map.astype(np.float32)
-                density_for_sal = block.get("density", strength)
-                block["salience"] = compute_cue_salience(
-                    strength=strength,
-                    density=density_for_sal,
-                    strategy="product"
+        # 1. Raw cues
+        missing = [name for name in needed_raw if name not in cue_maps]
+        if missing:
+            # Prepare raw inputs; color-space views are converted at most once
+            # per image and resolution, and shared with other detectors
+            with StageProfiler.stage("color.prepare"):
+                res = self.analysis_view(image_data)
+                bgr_img = color_view(image_data, "bgr", res)
+            rarity_view = "lab" if self.rarity_space == "lab" else "hsv"
+
+            raw_tasks = {
+                "hue": lambda: extractors.extract_hue_map(color_view(image_data, "hsv", res)),
+                "saturation": lambda: extractors.extract_saturation_map(color_view(image_data, "hsv", res)),
+                "luminance": lambda: extractors.extract_luminance_map(
+                    bgr_img, lab=color_view(image_data, "lab", res)
+                ),
+                "rarity": lambda: transforms.compute_color_rarity(
+                    bgr_img,
+                    space=self.rarity_space,
+                    k=self.rarity_k,
+                    engine=self.rarity_engine,
+                    seed=self.rarity_seed,
+                    sample_size=self.rarity_sample_size,
+                    bins=self.rarity_bins,
+                    space_img=color_view(image_data, rarity_view, res)
                 )
-            outputs["cues"][name] = block
+            }
+            if self.refine_rarity:
+                raw_tasks["rarity"] = lambda: self.refined_rarity(image_data, res)
+            computed = run_tasks({name: raw_tasks[name] for name in missing}, self.max_workers, stage="color")
+            self._store_cues(image_data, computed)
+            cue_maps.update(computed)
 
         # 2. Derived cues (contrast maps)
-        derived: Dict[str, np.ndarray] = {
-            "hue_contrast": transforms.compute_hue_contrast(raw_cues["hue"], sigma=self.hue_contrast_sigma),
-            "luminance_contrast": transforms.compute_luminance_contrast(
-                raw_cues["luminance"],
+        derived_tasks = {
+            "hue_contrast": lambda: transforms.compute_hue_contrast(
+                cue_maps["hue"],
+                sigma=self.hue_contrast_sigma,
+                level=self.contrast_pyramid_level,
+                pyramids=self.hue_pyramids(image_data, cue_maps["hue"]) if self.contrast_pyramid_level else None
+            ),
+            "luminance_contrast": lambda: transforms.compute_luminance_contrast(
+                cue_maps["luminance"],
                 method=self.contrast_method,
-                sobel_weight=self.sobel_weight
+                sobel_weight=self.sobel_weight,
+                gradient_magnitude=self.luminance_gradients(image_data, cue_maps["luminance"]).magnitude()
+                if self.contrast_method != "local_std" else None
             )
         }
-        for name, cue_map in derived.items():
-            derived_block: CueBlock = {"map": cue_map}
-            if self.return_density:
-                derived_block["density"] = compute_color_density(
-                    cue_map, window_size=self.density_window_size
+        if pending_derived:
+            computed = run_tasks({name: derived_tasks[name] for name in pending_derived}, self.max_workers, stage="color")
+            self._store_cues(image_data, computed)
+            cue_maps.update(computed)
+
+        return {name: cue_maps[name] for name in self.cues}
+
+    def _coarse_detector(self, cfg: ColorDetectionConfig) -> Optional["ColorDetector"]:
+        """
+        Detector for the coarse pass of ROI refinement: the other configured
+        cues, computed on a pyramid level and fused without density or salience.
+        None when rarity is the only cue; the coarse salience is then rarity alone.
+        """
+        others = [name for name in self.cues if name != "rarity"]
+        if not others:
+            return None
+        return ColorDetector(cfg.model_copy(update={
+            "cues": others,
+            "analysis_resolution": "original",
+            "contrast_pyramid_level": 0,
+            "return_density": False,
+            "return_salience": False,
+            "max_workers": 1,
+            "roi_refinement": RoiRefinementConfig()
+        }))
+
+    def refined_rarity(self, image_data: Dict[str, Any], res: str) -> NDArray[Any]:
+        """
+        Coarse-to-fine rarity (roi_refinement). The rarity model is fit on
+        the coarse pyramid level of the analysis image, where all cues are
+        also fused; regions of interest are the most salient coarse pixels,
+        grown by the margin. Raw rarity is evaluated at the analysis
+        resolution only inside them and feathered into the expanded coarse
+        raw rarity, and the blend is normalized as a whole.
+        """
+        roi = self.roi_refinement
+        pyramid = image_pyramid(image_data, "bgr", res)
+        level = min(roi.coarse_level, pyramid.max_level)
+        with StageProfiler.stage("color.roi_coarse"):
+            coarse_bgr = pyramid.level(level)
+            model = transforms.rarity_model(
+                transforms.rarity_space_image(coarse_bgr, self.rarity_space),
+                space=self.rarity_space,
+                k=self.rarity_k,
+                engine=self.rarity_engine,
+                seed=self.rarity_seed,
+                sample_size=self.rarity_sample_size,
+                bins=self.rarity_bins
+            )
+            coarse_raw = model(transforms.rarity_space_image(coarse_bgr, self.rarity_space))
+            coarse_raw = coarse_raw.reshape(coarse_bgr.shape[:2]).astype(np.float32)
+            weight = pyramid.expand(self.regions_of_interest(coarse_bgr, coarse_raw, level), level)
+
+        with StageProfiler.stage("color.roi_refine"):
+            raw = pyramid.expand(coarse_raw, level)
+            inside = weight > 0
+            space_img = color_view(image_data, "lab" if self.rarity_space == "lab" else "hsv", res)
+            fine = model(space_img[inside].reshape(-1, 1, 3))
+            raw[inside] += weight[inside] * (fine - raw[inside])
+        logger.opt(lazy=True).debug(
+            "ROI refinement: rarity recomputed for {:.1%} of pixels", lambda: inside.mean()
+        )
+        return transforms.normalize(raw)
+
+    def regions_of_interest(self, coarse_bgr: NDArray[Any], coarse_rarity: NDArray[Any], level: int) -> NDArray[Any]:
+        """
+        float32 0/1 mask of the coarse pixels whose fused salience reaches
+        roi_refinement.salience_quantile, dilated by the margin (converted to
+        level-`level` pixels). Without other cues the salience is the coarse
+        rarity itself.
+        """
+        roi = self.roi_refinement
+        rarity = transforms.normalize(coarse_rarity)
+        if self.coarse_detector is None:
+            salience = rarity
+        else:
+            cue_maps = self.coarse_detector.compute_cues({"bgr": {"og": coarse_bgr}})
+            cue_maps["rarity"] = rarity
+            salience = self.coarse_detector.fuse(cue_maps)["strength"]
+        mask = (salience >= np.quantile(salience, roi.salience_quantile)).astype(np.float32)
+        radius = -(-roi.margin // 2 ** level)
+        if radius:
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+            mask = cv2.dilate(mask, kernel)
+        return mask
+
+    def incremental_analysis(self, cfg: Optional[IncrementalConfig] = None) -> IncrementalColorAnalysis:
+        """An empty IncrementalColorAnalysis with this detector's settings, for `detect_incremental`."""
+        return IncrementalColorAnalysis(self.cfg, cfg)
+
+    def detect_incremental(self, image_data: Dict[str, Any], analysis: IncrementalColorAnalysis) -> DetectionResult:
+        """
+        `detect` for a new version of a previously analyzed image: cue maps,
+        their blocks and the combined block are updated by `analysis`, which
+        recomputes only what the changed tiles reach. The arrays are the
+        analysis state's own (see IncrementalColorAnalysis) unless they are
+        restored to another resolution. Originals large enough for the tiled
+        analysis (see `tiled_analysis`) are analyzed in full, tile by tile.
+        """
+        if self.tiled_analysis(image_data) is not None:
+            logger.info("Original is tiled; color features are recomputed in full instead of incrementally")
+            return self.detect(image_data)
+        with StageProfiler.stage("color.incremental"):
+            result = analysis.update(self.analysis_image(image_data))
+
+        def restore(block: Dict[str, Any], circular: bool = False) -> Dict[str, Any]:
+            return self._restore_resolution(dict(block), image_data, circular)
+
+        return {
+            "cues": {name: restore(block, name == "hue") for name, block in result["cues"].items()},  # type: ignore[misc]
+            "combined": restore(result["combined"])  # type: ignore[typeddict-item]
+        }
+
+    def tiled_analysis(self, image_data: Dict[str, Any]) -> Optional[TiledColorAnalysis]:
+        """
+        The tiled executor for this image, or None when it is analyzed in
+        memory. Tiling applies when it is enabled, cues run at the original
+        resolution, and the original has at least tiling.min_pixels pixels.
+        Tiled cue maps and blocks are disk-backed and bypass the feature cache.
+        """
+        if self.tiling is None or not self.tiling.enabled or self.analysis_resolution != "original":
+            return None
+        h, w = image_data["bgr"]["og"].shape[:2]
+        if h * w < self.tiling.min_pixels:
+            return None
+        return TiledColorAnalysis(self.tiling.tile_size, self.tiling.directory)
+
+    def _tiled_cues(self, tiled: TiledColorAnalysis, image_data: Dict[str, Any]) -> Dict[str, NDArray[Any]]:
+        with StageProfiler.stage("color.tiled_cues"):
+            cue_maps = tiled.raw_cues(
+                image_data["bgr"]["og"],
+                rarity_space=self.rarity_space,
+                rarity_k=self.rarity_k,
+                rarity_engine=self.rarity_engine,
+                rarity_seed=self.rarity_seed,
+                rarity_sample_size=self.rarity_sample_size,
+                rarity_bins=self.rarity_bins
+            )
+            cue_maps["hue_contrast"] = tiled.hue_contrast(
+                cue_maps["hue"], self.hue_contrast_sigma, self.contrast_pyramid_level
+            )
+            cue_maps["luminance_contrast"] = tiled.luminance_contrast(
+                cue_maps["luminance"], self.contrast_method, self.sobel_weight
+            )
+        return cue_maps
+
+    def _tiled_block(self, tiled: TiledColorAnalysis, strength: NDArray[Any]) -> Dict[str, NDArray[Any]]:
+        """Density and salience of one map, tile by tile."""
+        block: Dict[str, NDArray[Any]] = {}
+        if self.return_density:
+            block["density"] = tiled.density(strength, self.density_windows)
+        if self.return_salience:
+            block["salience"] = tiled.cue_salience(strength, block.get("density", strength))
+        return block
+
+    def _input_resolution(self) -> str:
+        """Which preprocessed resolution ("og" or "padded") the cues are computed from."""
+        return "padded" if self.analysis_resolution == "padded" else "og"
+
+    def _cue_params(self, name: str) -> Dict[str, Any]:
+        """The config fields a cue map depends on (its cache key)."""
+        params: Dict[str, Any] = {"cue": name, "analysis_resolution": self.analysis_resolution}
+        if self.analysis_resolution == "max_pixels":
+            params["analysis_max_pixels"] = self.analysis_max_pixels
+        elif self.analysis_resolution == "padded":
+            params["crop_padding"] = self.crop_padding
+        if name == "rarity":
+            params.update(space=self.rarity_space, engine=self.rarity_engine)
+            if self.roi_refinement.enabled:
+                # the regions depend on the coarse fusion of every cue
+                params["roi_refinement"] = {
+                    **self.roi_refinement.model_dump(exclude={"enabled"}),
+                    "fused": [self._cue_params(cue) for cue in self.cues if cue != "rarity"],
+                    "salience_strategy": self.salience_strategy,
+                    "weights": self.weights
+                }
+            if self.rarity_engine == "histogram":
+                params["bins"] = self.rarity_bins
+            else:
+                params.update(k=self.rarity_k, seed=self.rarity_seed)
+                if self.rarity_engine == "sampled":
+                    params["sample_size"] = self.rarity_sample_size
+        elif name == "hue_contrast":
+            params["sigma"] = self.hue_contrast_sigma
+            if self.contrast_pyramid_level:
+                params["pyramid_level"] = self.contrast_pyramid_level
+        elif name == "luminance_contrast":
+            params.update(method=self.contrast_method, sobel_weight=self.sobel_weight)
+        return params
+
+    def _block_params(self, name: str) -> Dict[str, Any]:
+        """The config fields a cue's density and salience depend on."""
+        return {
+            **self._cue_params(name),
+            "return_density": self.return_density,
+            "return_salience": self.return_salience,
+            "density_window_size": self.density_windows,
+            "upsample_to_original": self.upsample_to_original
+        }
+
+    def _cached_cues(self, image_data: Dict[str, Any], names: Tuple[str, ...]) -> Dict[str, NDArray[Any]]:
+        if self.cache is None:
+            return {}
+        cue_maps: Dict[str, NDArray[Any]] = {}
+        for name in names:
+            hit = self.cache.lookup(image_data, self._input_resolution(), f"color.{name}", self._cue_params(name))
+            if hit is not None:
+                cue_maps[name] = hit["map"]
+        return cue_maps
+
+    def _store_cues(self, image_data: Dict[str, Any], cue_maps: Dict[str, NDArray[Any]]) -> None:
+        if self.cache is None:
+            return
+        for name, cue_map in cue_maps.items():
+            self.cache.store(
+                image_data, self._input_resolution(), f"color.{name}", self._cue_params(name), {"map": cue_map}
+            )
+
+    def _cue_resolution(self, image_data: Dict[str, Any]) -> str:
+        """Name of the resolution cue maps are computed at, for keying shared derived channels."""
+        res = self._input_resolution()
+        if self.analysis_resolution == "max_pixels":
+            res = f"max_pixels_{self.analysis_max_pixels}"
+        elif res == "padded" and self._crops_padding(image_data):
+            res = CONTENT_RES
+        return res
+
+    def luminance_gradients(self, image_data: Dict[str, Any], luminance: NDArray[Any]) -> Gradients:
+        """The shared Gradients of the luminance cue map at the analysis resolution."""
+        return image_gradients(image_data, "luminance", self._cue_resolution(image_data), lambda: luminance)
+
+    def hue_pyramids(
+        self, image_data: Dict[str, Any], hue: NDArray[Any]
+    ) -> Tuple[GaussianPyramid, GaussianPyramid]:
+        """The shared Gaussian pyramids of the hue cue map's (sin, cos) unit vectors."""
+        res = self._cue_resolution(image_data)
+        vectors: List[NDArray[Any]] = []
+
+        def unit_vector(i: int) -> NDArray[Any]:
+            if not vectors:
+                vectors.extend(transforms.hue_unit_vectors(hue))
+            return vectors[i]
+
+        return (
+            image_pyramid(image_data, "hue_sin", res, lambda: unit_vector(0)),
+            image_pyramid(image_data, "hue_cos", res, lambda: unit_vector(1))
+        )
+
+    def analysis_image(self, image_data: Dict[str, Any]) -> NDArray[Any]:
+        """
+        BGR image at the configured analysis resolution:
+        - original:   the full-resolution original
+        - padded:     the letterboxed target_size image used by edge detection
+        - max_pixels: the original, area-downsampled only if it exceeds the budget
+        """
+        return color_view(image_data, "bgr", self.analysis_view(image_data))
+
+    def analysis_view(self, image_data: Dict[str, Any]) -> str:
+        """
+        Key of the analysis image in image_data["bgr"]. A 'max_pixels'
+        downsample is stored under "max_pixels_<budget>" so it, and the color
+        spaces derived from it, are built once per image. A letterboxed
+        'padded' image is cropped to its content (CONTENT_RES) with crop_padding.
+        """
+        if self.analysis_resolution == "padded":
+            return CONTENT_RES if self._crops_padding(image_data) else "padded"
+        if self.analysis_resolution != "max_pixels":
+            return "og"
+
+        key = f"max_pixels_{self.analysis_max_pixels}"
+        bgr_views = image_data["bgr"]
+        if key in bgr_views:
+            return key
+        bgr_img = bgr_views["og"]
+        h, w = bgr_img.shape[:2]
+        if h * w <= self.analysis_max_pixels:
+            return "og"
+        factor = (self.analysis_max_pixels / (h * w)) ** 0.5
+        size = (max(1, int(w * factor)), max(1, int(h * factor)))
+        logger.debug("Downsampling color analysis input from {}x{} to {}x{}", w, h, *size)
+        bgr_views[key] = cv2.resize(bgr_img, size, interpolation=cv2.INTER_AREA)
+        return key
+
+    def _crops_padding(self, image_data: Dict[str, Any]) -> bool:
+        return self.crop_padding and content_slices(image_data) is not None
+
+    def _restore_resolution(
+        self,
+        block: Dict[str, Any],
+        image_data: Dict[str, Any],
+        circular: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Upsample a block's arrays back to the original resolution, only when
+        upsample_to_original is set and 'max_pixels' actually downsampled.
+        Cropped 'padded' blocks are padded back to the padded frame with zeros.
+        circular: the block's "map" is a hue map, upsampled along the hue circle.
+        """
+        if self.analysis_resolution == "padded" and self._crops_padding(image_data):
+            return {key: pad_content(arr, image_data["padding"]) for key, arr in block.items()}
+        if not (self.upsample_to_original and self.analysis_resolution == "max_pixels"):
+            return block
+        og_h, og_w = image_data["bgr"]["og"].shape[:2]
+
+        def upsample(key: str, arr: NDArray[Any]) -> NDArray[Any]:
+            if arr.shape[:2] == (og_h, og_w):
+                return arr
+            if circular and key == "map":
+                return transforms.resize_hue(arr, (og_w, og_h))
+            return cv2.resize(arr, (og_w, og_h), interpolation=cv2.INTER_LINEAR)
+
+        return {key: upsample(key, arr) for key, arr in block.items()}
+
+    def build_cue_blocks(
+        self,
+        cue_maps: Dict[str, NDArray[Any]],
+        image_data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, CueBlock]:
+        """
+        Wrap each cue map with its optional density and salience.
+
+        All cue maps are stacked into one (C, H, W) tensor and their densities
+        and saliences computed in a single batched pass.
+        image_data: when given, blocks are restored to the output resolution;
+            with a cache, blocks are read from / stored in it, and only the
+            missing ones are computed.
+        """
+        def restore(block: Dict[str, Any], circular: bool = False) -> Dict[str, Any]:
+            return block if image_data is None else self._restore_resolution(block, image_data, circular)
+
+        blocks: Dict[str, CueBlock] = {
+            name: restore({"map": cue_map}, name == "hue") for name, cue_map in cue_maps.items()  # type: ignore[misc]
+        }
+        if not (self.return_density or self.return_salience):
+            return blocks
+
+        tiled = self.tiled_analysis(image_data) if image_data is not None else None
+        if tiled is not None:
+            with StageProfiler.stage("color.blocks"):
+                for name, cue_map in cue_maps.items():
+                    blocks[name].update(self._tiled_block(tiled, cue_map))  # type: ignore[typeddict-item]
+            return blocks
+
+        pending = list(cue_maps)
+        if self.cache is not None and image_data is not None:
+            for name in cue_maps:
+                hit = self.cache.lookup(
+                    image_data, self._input_resolution(), f"color.blocks.{name}", self._block_params(name)
                 )
+                if hit is not None:
+                    blocks[name].update(hit)  # type: ignore[typeddict-item]
+                    pending.remove(name)
+        if not pending:
+            return blocks
+
+        with StageProfiler.stage("color.blocks"):
+            stack = stack_maps([cue_maps[name] for name in pending])
+            derived: Dict[str, NDArray[Any]] = {}
+            if self.return_density:
+                derived["density"] = compute_color_density_stack(stack, window_size=self.density_windows)
             if self.return_salience:
-                strength = cue_map.astype(np.float32)
-                density_for_sal = derived_block.get("density", strength)
-                derived_block["salience"] = compute_cue_salience(
-                    strength=strength,
-                    density=density_for_sal,
+                derived["salience"] = compute_cue_salience_stack(
+                    strength=stack,
+                    density=derived.get("density", stack),
                     strategy="product"
                 )
-            outputs["cues"][name] = derived_block
 
-        # 3. Combined fused outputs
+        for i, name in enumerate(pending):
+            arrays = restore({key: arr[i] for key, arr in derived.items()})
+            blocks[name].update(arrays)  # type: ignore[typeddict-item]
+            if self.cache is not None and image_data is not None:
+                self.cache.store(
+                    image_data, self._input_resolution(), f"color.blocks.{name}", self._block_params(name), arrays
+                )
+        return blocks
+
+    @StageProfiler.profiled("color.fusion")
+    def fuse(
+        self,
+        cue_maps: Dict[str, NDArray[Any]],
+        strategy: Optional[str] = None,
+        image_data: Optional[Dict[str, Any]] = None
+    ) -> CombinedBlock:
+        """
+        Fuse cue maps into the combined block.
+        strategy: overrides the configured salience_strategy when given.
+        image_data: when given, the block is restored to the output resolution
+            (and computed tile by tile when the image is tiled).
+        """
+        tiled = self.tiled_analysis(image_data) if image_data is not None else None
+        if tiled is not None:
+            strength = tiled.salience(cue_maps, strategy or self.salience_strategy, self.weights)
+            return {"strength": strength, **self._tiled_block(tiled, strength)}  # type: ignore[typeddict-item]
+
         final_sal: np.ndarray = compute_salience(
-            hue_contrast=derived["hue_contrast"],
-            saturation=raw_cues["saturation"],
-            rarity=raw_cues["rarity"],
-            luminance_contrast=derived["luminance_contrast"],
-            strategy=self.salience_strategy,
+            hue_contrast=cue_maps.get("hue_contrast"),
+            saturation=cue_maps.get("saturation"),
+            rarity=cue_maps.get("rarity"),
+            luminance_contrast=cue_maps.get("luminance_contrast"),
+            strategy=strategy or self.salience_strategy,
             weights=self.weights
         )
-        strength_map = final_sal.astype(np.float32)
-        outputs["combined"]["strength"] = strength_map
+        strength_map = final_sal.astype(np.float32, copy=False)
+        combined: CombinedBlock = {"strength": strength_map}
         if self.return_density:
-            outputs["combined"]["density"] = compute_color_density(
-                strength_map, window_size=self.density_window_size
+            combined["density"] = compute_color_density(
+                strength_map, window_size=self.density_windows
             )
         if self.return_salience:
-            density_for_sal = outputs["combined"].get("density", strength_map)
-            outputs["combined"]["salience"] = compute_cue_salience(
+            density_for_sal = combined.get("density", strength_map)
+            combined["salience"] = compute_cue_salience(
                 strength=strength_map,
                 density=density_for_sal,
                 strategy="product"
             )
-
-        # ─── DEBUG ─── print full nested output for inspection
-        print("=== ColorDetector.detect() STRUCTURE ===")
-        print_structure(outputs)
-        print("=== End STRUCTURE ===")
-        return outputs
\ No newline at end of file
+        if image_data is not None:
+            combined = self._restore_resolution(combined, image_data)  # type: ignore[assignment]
+        return combined
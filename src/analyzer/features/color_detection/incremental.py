@@ -0,0 +1,381 @@
+import cv2
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from numpy.typing import NDArray
+from loguru import logger
+from . import extractors, transforms
+from .intra_fusion import _cue_salience_into, combine_cues
+from .tiled import LUMINANCE_CONTRAST_HALO, SATURATION_HALO, gaussian_halo, pyramid_halo
+from src.analyzer.features.tiling import Tile, dirty_tiles, grow_tile, iter_tiles
+from src.analyzer.features.window_stats import IntegralImage, as_window_sizes
+from src.betteredit.analyzer.protocols.detection_protocols import DetectionResult
+from src.betteredit.config import ColorDetectionConfig, IncrementalConfig
+
+CUES = ("hue", "saturation", "luminance", "rarity", "hue_contrast", "luminance_contrast")
+FUSION_CUES = ("hue_contrast", "saturation", "rarity", "luminance_contrast")
+
+
+class _NormalizedMap:
+    """
+    A min/max normalized map and the value range of each of its tiles. Only
+    the normalized values are kept; raw values are recovered from the kept
+    range as lo + norm x (hi - lo + eps), exactly except where a region
+    normalized with a kept range was clipped, by at most tolerance x the
+    span. The range used for normalization is only replaced when the
+    measured one drifts away from it by more than a tolerance.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], eps: float = 1e-8):
+        self.norm = np.zeros(shape, dtype=np.float32)
+        self.eps = eps
+        self.tile_ranges: Dict[Tuple[int, int], Tuple[float, float]] = {}
+        self.lo: Optional[float] = None
+        self.hi: Optional[float] = None
+
+    def _raw(self, tile: Tile) -> NDArray[Any]:
+        raw = self.norm[tile.core].copy()
+        if self.lo is not None and self.hi is not None:
+            raw *= self.hi - self.lo + self.eps
+            raw += self.lo
+        return raw
+
+    def update(self, fresh: List[Tuple[Tile, NDArray[Any]]], touched: List[Tile], tolerance: float) -> bool:
+        """
+        Store the freshly computed raw values of some regions: measure the
+        touched tiles, then normalize the regions with the kept range, or
+        remap the whole map to the measured range if it moved by more than
+        tolerance x the kept span. Returns whether the whole map changed.
+        """
+        for tile in touched:
+            raw = self._raw(tile)
+            for region, values in fresh:
+                y0, y1 = max(tile.y0, region.y0), min(tile.y1, region.y1)
+                x0, x1 = max(tile.x0, region.x0), min(tile.x1, region.x1)
+                if y0 < y1 and x0 < x1:
+                    raw[y0 - tile.y0:y1 - tile.y0, x0 - tile.x0:x1 - tile.x0] = values[
+                        y0 - region.y0:y1 - region.y0, x0 - region.x0:x1 - region.x0
+                    ]
+            self.tile_ranges[(tile.y0, tile.x0)] = (float(raw.min()), float(raw.max()))
+
+        lo = min(r[0] for r in self.tile_ranges.values())
+        hi = max(r[1] for r in self.tile_ranges.values())
+        whole = (
+            self.lo is None or self.hi is None
+            or max(abs(lo - self.lo), abs(hi - self.hi)) > tolerance * (self.hi - self.lo)
+        )
+        if whole:
+            if self.lo is not None and self.hi is not None:
+                # norm' = (lo_old + norm x span_old - lo) / span
+                self.norm *= (self.hi - self.lo + self.eps) / (hi - lo + self.eps)
+                self.norm += (self.lo - lo) / (hi - lo + self.eps)
+            self.lo, self.hi = lo, hi
+        for region, values in fresh:
+            out = self.norm[region.core]
+            np.subtract(values, self.lo, out=out)
+            out /= (self.hi - self.lo + self.eps)
+            if not whole:
+                np.clip(out, 0.0, 1.0, out=out)
+        return whole
+
+
+class IncrementalColorAnalysis:
+    """
+    ColorDetector results for one image kept together with the intermediate
+    maps later stages read and the normalization range of each map, so that
+    an edited version of the image is re-analyzed by recomputing only what
+    the edit touched.
+
+    `update` diffs the new image against the previous one tile by tile
+    (`dirty_tiles`). Every stage (cue maps, their densities and saliences,
+    the fused block) is then recomputed only over the regions its inputs
+    changed in, grown by its filter radius and read from halo-extended
+    windows, so local results match a full recomputation. Global quantities
+    are kept unless the edit moves them by more than `tolerance`:
+    - min/max normalization ranges are tracked per tile; a map is only
+      renormalized as a whole when its range moves by more than tolerance
+      x its span, otherwise just the recomputed regions are (clipped to [0, 1]);
+    - the rarity model, as in TiledColorAnalysis, is fit on a stratified
+      pixel sample ('kmeans' and 'minibatch' behave like 'sampled') and
+      refit when more than tolerance of the sampled pixels changed; the
+      'histogram' engine updates its color counts exactly and swaps its
+      lookup table when an entry moves by more than tolerance x its range.
+    A whole-map change (new range or rarity model) propagates to every
+    later stage reading that map.
+
+    The returned arrays are the state's own and are updated in place by the
+    next `update`; copy them to keep a version.
+    """
+
+    def __init__(self, cfg: ColorDetectionConfig, incremental: Optional[IncrementalConfig] = None):
+        incremental = incremental or IncrementalConfig()
+        if cfg.contrast_method not in ("sobel", "local_std", "combined"):
+            logger.error("Unsupported contrast method: {}", cfg.contrast_method)
+            raise ValueError(f"Unsupported contrast method: {cfg.contrast_method}")
+        if cfg.rarity_engine not in transforms.RARITY_ENGINES:
+            logger.error("Unsupported rarity engine: {}", cfg.rarity_engine)
+            raise ValueError(f"Unsupported rarity engine: {cfg.rarity_engine}")
+        self.cfg = cfg
+        self.cues = tuple(name for name in CUES if cfg.cues is None or name in cfg.cues)
+        self.density_windows = as_window_sizes(cfg.density_window_sizes or cfg.density_window_size)
+        self.hue_halo = gaussian_halo(cfg.hue_contrast_sigma) + pyramid_halo(cfg.contrast_pyramid_level)
+        self.tile_size = incremental.tile_size
+        self.tolerance = incremental.tolerance
+        self.diff_threshold = incremental.diff_threshold
+
+        self.bgr: Optional[NDArray[Any]] = None
+        self.result: Optional[DetectionResult] = None
+        self._grid: List[Tile] = []
+        self._whole: List[Tile] = []
+        self._plain: Dict[str, NDArray[Any]] = {}
+        self._maps: Dict[str, _NormalizedMap] = {}
+        self._rarity_fn: Optional[Callable[[NDArray[Any]], NDArray[Any]]] = None
+        self._rarity_state: Any = None  # color counts (histogram) or the sampled pixels
+        self._rarity_lut: Optional[NDArray[Any]] = None
+
+    def update(self, bgr: NDArray[Any]) -> DetectionResult:
+        """
+        The ColorDetector result ('cues' and 'combined') for `bgr`. The first
+        call (or a change of image size) analyzes the whole image; later
+        calls recompute what changed since the previous one.
+        """
+        if self.bgr is None or self.result is None or self.bgr.shape != bgr.shape:
+            logger.debug("Incremental color analysis: full pass on {}x{}", bgr.shape[1], bgr.shape[0])
+            self._reset(bgr.shape[:2])
+            dirty, previous = self._whole, None
+        else:
+            dirty, previous = dirty_tiles(self.bgr, bgr, self.tile_size, self.diff_threshold), self.bgr
+            logger.debug("Incremental color analysis: {} of {} tiles dirty", len(dirty), len(self._grid))
+            if not dirty:
+                return self.result
+        self.bgr = bgr.copy()
+
+        changed = self._cue_maps(dirty, previous)
+        cues = {}
+        for name in self.cues:
+            cue_map = self._plain[name] if name in self._plain else self._maps[name].norm
+            cues[name] = {"map": cue_map, **self._block(name, cue_map, changed[name])}
+
+        fused = [name for name in FUSION_CUES if name in self.cues]
+
+        def combine(*windows: NDArray[Any]) -> NDArray[Any]:
+            maps = dict(zip(fused, windows))
+            return combine_cues(
+                maps.get("hue_contrast"), maps.get("saturation"), maps.get("rarity"), maps.get("luminance_contrast"),
+                strategy=self.cfg.salience_strategy, weights=self.cfg.weights
+            )
+
+        strength_changed = self._local(
+            "strength", self._union(*(changed[name] for name in fused)), 0, combine,
+            *(cues[name]["map"] for name in fused), eps=1e-3
+        )
+        strength = self._maps["strength"].norm
+        self.result = {
+            "cues": cues,  # type: ignore[typeddict-item]
+            "combined": {"strength": strength, **self._block("combined", strength, strength_changed)}  # type: ignore[typeddict-item]
+        }
+        return self.result
+
+    def _reset(self, shape: Tuple[int, ...]) -> None:
+        h, w = shape[:2]
+        self._grid = list(iter_tiles(shape, self.tile_size))
+        self._whole = [Tile(0, h, 0, w, 0, h, 0, w)]
+        self._plain = {name: np.zeros(shape, dtype=np.float32) for name in ("hue", "saturation", "luminance")}
+        self._maps = {}
+        self._rarity_fn = None
+        self._rarity_state = None
+        self._rarity_lut = None
+
+    def _grow(self, regions: List[Tile], halo: int) -> List[Tile]:
+        assert self.bgr is not None
+        if regions is self._whole:
+            return regions
+        return [grow_tile(region, halo, 0, self.bgr.shape) for region in regions]
+
+    def _union(self, *region_lists: List[Tile]) -> List[Tile]:
+        if any(regions is self._whole for regions in region_lists):
+            return self._whole
+        return [region for regions in region_lists for region in regions]
+
+    def _touched(self, regions: List[Tile]) -> List[Tile]:
+        """The grid tiles whose core intersects one of the regions."""
+        if regions is self._whole:
+            return self._grid
+        return [
+            tile for tile in self._grid
+            if any(
+                tile.y0 < r.y1 and r.y0 < tile.y1 and tile.x0 < r.x1 and r.x0 < tile.x1
+                for r in regions
+            )
+        ]
+
+    def _local(
+        self,
+        name: str,
+        changed: List[Tile],
+        halo: int,
+        fn: Callable[..., NDArray[Any]],
+        *sources: NDArray[Any],
+        eps: float = 1e-8
+    ) -> List[Tile]:
+        """
+        Recompute the raw map `name` = fn(*sources) wherever the sources'
+        `changed` regions reach through a filter of radius `halo`, and
+        renormalize it. Returns the regions of the normalized map that changed.
+        """
+        assert self.bgr is not None
+        nmap = self._maps.get(name)
+        if nmap is None:
+            nmap = self._maps[name] = _NormalizedMap(self.bgr.shape[:2], eps)
+        regions = self._grow(changed, halo)
+        fresh = []
+        for region in regions:
+            tile = grow_tile(region, 0, halo, self.bgr.shape)
+            values = fn(*(source[tile.window] for source in sources))[tile.core_in_window]
+            # copied: filters may return workspace scratch the next region reuses
+            fresh.append((region, np.array(values, dtype=np.float32)))
+        return self._whole if nmap.update(fresh, self._touched(regions), self.tolerance) else regions
+
+    def _cue_maps(self, dirty: List[Tile], previous: Optional[NDArray[Any]]) -> Dict[str, List[Tile]]:
+        """Update the cue maps; returns the regions each one changed in."""
+        assert self.bgr is not None
+        saturation_changed = self._grow(dirty, SATURATION_HALO)
+        for region in saturation_changed:
+            tile = grow_tile(region, 0, SATURATION_HALO, self.bgr.shape)
+            window = np.ascontiguousarray(self.bgr[tile.window])
+            core = tile.core_in_window
+            hsv = cv2.cvtColor(window, cv2.COLOR_BGR2HSV)
+            self._plain["hue"][tile.core] = extractors.extract_hue_map(hsv[core])
+            self._plain["saturation"][tile.core] = extractors.extract_saturation_map(hsv)[core]
+            self._plain["luminance"][tile.core] = extractors.extract_luminance_map(
+                window[core], lab=cv2.cvtColor(np.ascontiguousarray(window[core]), cv2.COLOR_BGR2LAB)
+            )
+        changed = {"hue": dirty, "saturation": saturation_changed, "luminance": dirty}
+
+        if "rarity" in self.cues:
+            model_changed = self._update_rarity_model(previous, dirty)
+            changed["rarity"] = self._local(
+                "rarity", self._whole if model_changed else dirty, 0, self._raw_rarity, self.bgr
+            )
+        if "hue_contrast" in self.cues:
+            sigma, level = self.cfg.hue_contrast_sigma, self.cfg.contrast_pyramid_level
+            changed["hue_contrast"] = self._local(
+                "hue_contrast", dirty, self.hue_halo,
+                lambda window: transforms.hue_deviation(window, sigma, level), self._plain["hue"]
+            )
+        if "luminance_contrast" in self.cues:
+            changed["luminance_contrast"] = self._luminance_contrast(dirty)
+        return changed
+
+    def _luminance_contrast(self, dirty: List[Tile]) -> List[Tile]:
+        """Normalized contrast parts, then their normalized weighted sum."""
+        filters: Dict[str, Callable[[NDArray[Any]], NDArray[Any]]] = {
+            "sobel": transforms.sobel_magnitude,
+            "local_std": lambda window: transforms.local_std(window, 5)
+        }
+        if self.cfg.contrast_method == "combined":
+            parts = [("sobel", self.cfg.sobel_weight), ("local_std", 1 - self.cfg.sobel_weight)]
+        else:
+            parts = [(self.cfg.contrast_method, 1.0)]
+        parts_changed = [
+            self._local(
+                f"luminance_contrast.{part}", dirty, LUMINANCE_CONTRAST_HALO, filters[part], self._plain["luminance"]
+            )
+            for part, _ in parts
+        ]
+
+        def weighted_sum(*windows: NDArray[Any]) -> NDArray[Any]:
+            total = np.multiply(windows[0], parts[0][1], dtype=np.float32)
+            for window, (_, weight) in zip(windows[1:], parts[1:]):
+                total += np.multiply(window, weight, dtype=np.float32)
+            return total
+
+        return self._local(
+            "luminance_contrast", self._union(*parts_changed), 0, weighted_sum,
+            *(self._maps[f"luminance_contrast.{part}"].norm for part, _ in parts)
+        )
+
+    def _block(self, prefix: str, strength: NDArray[Any], changed: List[Tile]) -> Dict[str, NDArray[Any]]:
+        """Density and salience of one map, as in ColorDetector.build_cue_blocks, updated over `changed`."""
+        block: Dict[str, NDArray[Any]] = {}
+        density_changed = changed
+        if self.cfg.return_density:
+            def variance(size: int) -> Callable[[NDArray[Any]], NDArray[Any]]:
+                return lambda window: IntegralImage(np.asarray(window, dtype=np.float32), size).variance(size)
+
+            sizes = self.density_windows
+            if len(sizes) == 1:
+                density_changed = self._local(
+                    f"{prefix}.density", changed, sizes[0] // 2, variance(sizes[0]), strength
+                )
+            else:
+                scales_changed = [
+                    self._local(f"{prefix}.density.{size}", changed, size // 2, variance(size), strength)
+                    for size in sizes
+                ]
+                density_changed = self._local(
+                    f"{prefix}.density", self._union(*scales_changed), 0,
+                    lambda *windows: np.sum(windows, axis=0, dtype=np.float32),
+                    *(self._maps[f"{prefix}.density.{size}"].norm for size in sizes)
+                )
+            block["density"] = self._maps[f"{prefix}.density"].norm
+        if self.cfg.return_salience:
+            def salience(s: NDArray[Any], d: NDArray[Any]) -> NDArray[Any]:
+                return _cue_salience_into(s, d, "product", 1e-3, np.empty_like(s), np.empty_like(s))
+
+            self._local(
+                f"{prefix}.salience", self._union(changed, density_changed), 0, salience,
+                strength, block.get("density", strength), eps=1e-3
+            )
+            block["salience"] = self._maps[f"{prefix}.salience"].norm
+        return block
+
+    def _space_image(self, bgr: NDArray[Any]) -> NDArray[Any]:
+        return transforms.rarity_space_image(np.ascontiguousarray(bgr), self.cfg.rarity_space)
+
+    def _raw_rarity(self, window: NDArray[Any]) -> NDArray[Any]:
+        assert self._rarity_fn is not None
+        space_img = self._space_image(window)
+        return self._rarity_fn(space_img).reshape(space_img.shape[:2])
+
+    def _update_rarity_model(self, previous: Optional[NDArray[Any]], dirty: List[Tile]) -> bool:
+        """Refresh the rarity model from the new image; returns whether it was replaced."""
+        assert self.bgr is not None
+        bgr, space, bins = self.bgr, self.cfg.rarity_space, self.cfg.rarity_bins
+        if self.cfg.rarity_engine == "histogram":
+            size = transforms.color_code_count(space, bins)
+            if previous is None:
+                counts = np.bincount(transforms.color_codes(self._space_image(bgr), space, bins), minlength=size)
+            else:
+                counts = self._rarity_state
+                for tile in dirty:
+                    counts -= np.bincount(
+                        transforms.color_codes(self._space_image(previous[tile.core]), space, bins), minlength=size
+                    )
+                    counts += np.bincount(
+                        transforms.color_codes(self._space_image(bgr[tile.core]), space, bins), minlength=size
+                    )
+            self._rarity_state = counts
+            lut = transforms.histogram_lut(counts, space, bins)
+            current = self._rarity_lut
+            if current is not None and np.abs(lut - current).max() <= self.tolerance * float(np.ptp(current)):
+                return False
+            self._rarity_lut = lut
+            self._rarity_fn = lambda space_img: lut[transforms.color_codes(space_img, space, bins)]
+            return True
+
+        h, w = bgr.shape[:2]
+        ys, xs = np.divmod(
+            transforms.stratified_sample(
+                (h, w), self.cfg.rarity_sample_size, self.cfg.rarity_seed, min_count=self.cfg.rarity_k
+            ), w
+        )
+        pixels = np.ascontiguousarray(bgr[ys, xs]).reshape(-1, 1, 3)
+        if self._rarity_state is not None:
+            if np.any(pixels != self._rarity_state, axis=(1, 2)).mean() <= self.tolerance:
+                return False
+        self._rarity_state = pixels
+        self._rarity_fn = transforms.rarity_model(
+            self._space_image(pixels), space, self.cfg.rarity_k, "sampled",
+            seed=self.cfg.rarity_seed, sample_size=pixels.shape[0]
+        )
+        return True
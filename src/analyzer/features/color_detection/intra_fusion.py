@@ -2,13 +2,40 @@ import numpy as np
 from typing import Any, Dict, Optional
 from numpy.typing import NDArray
 from loguru import logger
+from src.analyzer.features.workspace import Workspace
+
+
+def _cue_salience_into(
+    s: NDArray[Any],
+    d: NDArray[Any],
+    strategy: str,
+    eps: float,
+    out: NDArray[Any],
+    tmp: NDArray[Any]
+) -> NDArray[Any]:
+    """Un-normalized cue salience of float32 s and d, written into out (tmp is scratch)."""
+    if strategy == "product":
+        np.add(s, eps, out=out)
+        np.subtract(1, d, out=tmp)
+        tmp += eps
+        out *= tmp
+    elif strategy == "ratio":
+        np.add(d, eps, out=tmp)
+        np.divide(s, tmp, out=out)
+    elif strategy == "difference":
+        np.subtract(s, d, out=out)
+    else:
+        logger.error("Unknown cue salience strategy: {}", strategy)
+        raise ValueError(f"Unknown cue salience strategy: {strategy}")
+    return out
 
 
 def compute_cue_salience(
     strength: NDArray[Any],
     density: NDArray[Any],
     strategy: str,
-    eps: float = 1e-3
+    eps: float = 1e-3,
+    out: Optional[NDArray[Any]] = None
 ) -> NDArray[Any]:
     """
     Compute salience for a single cue given its strength and local density.
@@ -17,32 +44,52 @@ def compute_cue_salience(
     - product:    sal = (strength + eps) * (1 - density + eps)
     - ratio:      sal = strength / (density + eps)
     - difference: sal = strength - density
+
+    out: optional float32 output array; temporaries come from the thread's Workspace.
     """
     logger.debug("compute_cue_salience called with strategy={}, eps={}", strategy, eps)
-    s = strength.astype(np.float32)
-    d = density.astype(np.float32)
-    if strategy == "product":
-        sal = (s + eps) * (1 - d + eps)
-    elif strategy == "ratio":
-        sal = s / (d + eps)
-    elif strategy == "difference":
-        sal = s - d
-    else:
-        logger.error("Unknown cue salience strategy: {}", strategy)
-        raise ValueError(f"Unknown cue salience strategy: {strategy}")
+    s = strength.astype(np.float32, copy=False)
+    d = density.astype(np.float32, copy=False)
+    if out is None:
+        out = np.empty(s.shape, dtype=np.float32)
+    sal_arr = _cue_salience_into(s, d, strategy, eps, out, Workspace.current().like("cue_salience.tmp", s))
 
-    # ensure array
-    sal_arr: NDArray[Any] = np.asarray(sal, dtype=np.float32)
     mn = float(sal_arr.min())
     mx = float(sal_arr.max())
-    sal_norm: NDArray[Any] = ((sal_arr - mn) / (mx - mn + eps)).astype(np.float32)
-    logger.debug("Cue salience computed: min={:.4f}, max={:.4f}", sal_norm.min(), sal_norm.max())
-    return sal_norm
+    sal_arr -= mn
+    sal_arr /= (mx - mn + eps)
+    logger.opt(lazy=True).debug(
+        "Cue salience computed: min={:.4f}, max={:.4f}", lambda: sal_arr.min(), lambda: sal_arr.max()
+    )
+    return sal_arr
 
 
-def compute_salience(
-    hue_contrast: NDArray[Any],
-    saturation: NDArray[Any],
+def compute_cue_salience_stack(
+    strength: NDArray[Any],
+    density: NDArray[Any],
+    strategy: str,
+    eps: float = 1e-3
+) -> NDArray[Any]:
+    """
+    Per-channel compute_cue_salience of (C, H, W) strength and density stacks,
+    in one batched pass with per-channel min/max normalization.
+    """
+    logger.debug("compute_cue_salience_stack called with strategy={}, channels={}", strategy, strength.shape[0])
+    s = strength.astype(np.float32, copy=False)
+    d = density.astype(np.float32, copy=False)
+    sal = np.empty(s.shape, dtype=np.float32)
+    _cue_salience_into(s, d, strategy, eps, sal, Workspace.current().like("cue_salience_stack.tmp", s))
+
+    mn = sal.min(axis=(1, 2), keepdims=True)
+    mx = sal.max(axis=(1, 2), keepdims=True)
+    sal -= mn
+    sal /= (mx - mn + eps)
+    return sal
+
+
+def combine_cues(
+    hue_contrast: Optional[NDArray[Any]],
+    saturation: Optional[NDArray[Any]],
     rarity: Optional[NDArray[Any]],
     luminance_contrast: Optional[NDArray[Any]],
     strategy: str,
@@ -50,62 +97,82 @@ def compute_salience(
     eps: float = 1e-3
 ) -> NDArray[Any]:
     """
-    Computes color-based visual salience using configurable strategy.
-    strategy: 'minimal', 'boosted', 'full', 'sum', or 'weighted'
+    Un-normalized color salience: the cue maps combined per pixel by
+    `strategy`. The maps are accumulated in, and returned as, a Workspace
+    buffer of the calling thread rather than stacked. Missing (None) cues
+    are left out; 'minimal', 'boosted' and 'full' need hue_contrast and saturation.
     """
-    logger.debug("compute_salience called with strategy={}, weights={}", strategy, weights)
-
     # safe weights dict
     wts: Dict[str, float] = weights or {}
-    # declare salience variable type
-    salience: NDArray[Any]
-
-    if strategy == "minimal":
-        salience = (hue_contrast + eps) * (saturation + eps)
+    parts = [m for m in (hue_contrast, saturation, rarity, luminance_contrast) if m is not None]
+    if not parts:
+        logger.error("No cue maps provided for color intra-fusion.")
+        raise ValueError("No cue maps provided for color intra-fusion.")
+    ws = Workspace.current()
+    salience = ws.like("salience.acc", parts[0])
+    tmp = ws.like("salience.tmp", parts[0])
 
-    elif strategy == "boosted":
-        salience = (hue_contrast + eps) * (saturation + eps)
-        if rarity is not None:
-            salience *= (1 + rarity)
-
-    elif strategy == "full":
-        salience = (hue_contrast + eps) * (saturation + eps)
-        if rarity is not None:
-            salience *= (1 + rarity)
-        if luminance_contrast is not None:
-            salience *= (1 + luminance_contrast)
+    if strategy in ("minimal", "boosted", "full"):
+        if hue_contrast is None or saturation is None:
+            logger.error("Strategy '{}' needs the hue_contrast and saturation cues", strategy)
+            raise ValueError(f"Strategy '{strategy}' needs the hue_contrast and saturation cues")
+        np.add(hue_contrast, eps, out=salience)
+        salience *= np.add(saturation, eps, out=tmp)
+        if strategy in ("boosted", "full") and rarity is not None:
+            salience *= np.add(rarity, 1, out=tmp)
+        if strategy == "full" and luminance_contrast is not None:
+            salience *= np.add(luminance_contrast, 1, out=tmp)
 
     elif strategy == "sum":
-        parts = [hue_contrast, saturation]
-        if rarity is not None:
-            parts.append(rarity)
-        if luminance_contrast is not None:
-            parts.append(luminance_contrast)
-        salience = np.mean(np.stack(parts, axis=0), axis=0)
+        salience[...] = parts[0]
+        for part in parts[1:]:
+            salience += part
+        salience /= len(parts)
 
     elif strategy == "weighted":
-        weighted_maps: list[NDArray[Any]] = []
+        salience[...] = 0.0
         total_w = 0.0
         for key, arr in [("hue", hue_contrast), ("sat", saturation), ("rarity", rarity), ("lum", luminance_contrast)]:
             if arr is not None:
                 w = wts.get(key, 0.0)
-                weighted_maps.append(w * arr)
+                salience += np.multiply(arr, w, out=tmp)
                 total_w += w
         if total_w <= 0.0:
             logger.error("All intra-fusion weights are zero.")
             raise ValueError("All intra-fusion weights are zero.")
-        # use numpy to sum arrays and ensure ndarray type
-        stacked = np.stack(weighted_maps, axis=0)
-        salience = np.sum(stacked, axis=0) / total_w
+        salience /= total_w
     else:
         logger.error("Unknown salience intra-fusion strategy: {}", strategy)
         raise ValueError(f"Unknown salience intra-fusion strategy: {strategy}")
+    return salience
 
-    # ensure ndarray output
-    sal_arr: NDArray[Any] = np.asarray(salience, dtype=np.float32)
-    mn = float(sal_arr.min())
-    mx = float(sal_arr.max())
-    sal_norm: NDArray[Any] = ((sal_arr - mn) / (mx - mn + eps)).astype(np.float32)
-    logger.debug("Color salience computed: min={:.4f}, max={:.4f}", sal_norm.min(), sal_norm.max())
-    return sal_norm
 
+def compute_salience(
+    hue_contrast: Optional[NDArray[Any]],
+    saturation: Optional[NDArray[Any]],
+    rarity: Optional[NDArray[Any]],
+    luminance_contrast: Optional[NDArray[Any]],
+    strategy: str,
+    weights: Optional[Dict[str, float]],
+    eps: float = 1e-3,
+    out: Optional[NDArray[Any]] = None
+) -> NDArray[Any]:
+    """
+    Computes color-based visual salience using configurable strategy.
+    strategy: 'minimal', 'boosted', 'full', 'sum', or 'weighted'
+    out: optional float32 output array; the maps are accumulated in the
+    thread's Workspace buffers rather than stacked.
+    """
+    logger.debug("compute_salience called with strategy={}, weights={}", strategy, weights)
+    salience = combine_cues(hue_contrast, saturation, rarity, luminance_contrast, strategy, weights, eps)
+
+    mn = float(salience.min())
+    mx = float(salience.max())
+    if out is None:
+        out = np.empty(salience.shape, dtype=np.float32)
+    np.subtract(salience, mn, out=out)
+    out /= (mx - mn + eps)
+    logger.opt(lazy=True).debug(
+        "Color salience computed: min={:.4f}, max={:.4f}", lambda: out.min(), lambda: out.max()
+    )
+    return out
@@ -0,0 +1,236 @@
+import cv2
+import numpy as np
+from typing import Any, Dict, Optional, Tuple
+from numpy.typing import NDArray
+from loguru import logger
+from . import extractors, transforms
+from .intra_fusion import _cue_salience_into, combine_cues
+from src.analyzer.features.tiling import ValueRange, disk_array, iter_tiles, map_tiles, normalize_tiled
+from src.analyzer.features.window_stats import IntegralImage, WindowSizes, as_window_sizes
+from src.analyzer.features.workspace import Workspace
+
+# Filter radii, i.e. the halo each tiled stage needs
+SATURATION_HALO = 2          # 5x5 GaussianBlur in extract_saturation_map
+LUMINANCE_CONTRAST_HALO = 2  # 3x3 Sobel and the 5x5 local standard deviation
+
+
+def gaussian_halo(sigma: float) -> int:
+    """Radius of scipy.ndimage.gaussian_filter's kernel (truncate=4.0)."""
+    return int(4.0 * sigma + 0.5)
+
+
+def pyramid_halo(level: int) -> int:
+    """Full-resolution reach of cv2.pyrDown and cv2.pyrUp's 5x5 kernels through `level` levels."""
+    return 2 * (2 ** (level + 1) - 2)
+
+
+class TiledColorAnalysis:
+    """
+    Color cue maps, their blocks and the fused salience of a BGR image
+    computed tile by tile into disk-backed arrays (`disk_array`), so memory
+    is bounded by tile_size rather than by the image.
+
+    Every stage reads halo-extended tile windows, so local filters see the
+    same neighbours as on the full image and results match the in-memory
+    ColorDetector up to float rounding. Global statistics use two passes:
+    min/max normalization measures its range while a stage writes its raw
+    values and rescales afterwards, and rarity centers (or the color
+    histogram) are fit in a first pass over a stratified pixel sample (or
+    every tile). The 'kmeans' and 'minibatch' rarity engines therefore
+    behave like 'sampled' here.
+    """
+
+    def __init__(self, tile_size: int, directory: Optional[str] = None):
+        self.tile_size = tile_size
+        self.directory = directory
+
+    def array(self, shape: Tuple[int, ...]) -> NDArray[Any]:
+        return disk_array(shape, np.float32, self.directory)
+
+    def raw_cues(
+        self,
+        bgr: NDArray[Any],
+        rarity_space: str,
+        rarity_k: int,
+        rarity_engine: str,
+        rarity_seed: int,
+        rarity_sample_size: int,
+        rarity_bins: int
+    ) -> Dict[str, NDArray[Any]]:
+        """Hue, saturation, luminance and rarity maps, in one tiled pass after the rarity model is fit."""
+        h, w = bgr.shape[:2]
+        logger.debug("Tiled color cues: {}x{} in {}px tiles", w, h, self.tile_size)
+        rarity_code = cv2.COLOR_BGR2LAB if rarity_space == "lab" else cv2.COLOR_BGR2HSV
+        rarity_model = self._rarity_model(
+            bgr, rarity_space, rarity_code, rarity_k, rarity_engine, rarity_seed, rarity_sample_size, rarity_bins
+        )
+
+        maps = {name: self.array((h, w)) for name in ("hue", "saturation", "luminance", "rarity")}
+        rarity_range = ValueRange()
+        for tile in iter_tiles((h, w), self.tile_size, SATURATION_HALO):
+            window = np.ascontiguousarray(bgr[tile.window])
+            core = tile.core_in_window
+            hsv = cv2.cvtColor(window, cv2.COLOR_BGR2HSV)
+            lab = cv2.cvtColor(window, cv2.COLOR_BGR2LAB)
+            maps["hue"][tile.core] = extractors.extract_hue_map(hsv[core])
+            maps["saturation"][tile.core] = extractors.extract_saturation_map(hsv)[core]
+            maps["luminance"][tile.core] = extractors.extract_luminance_map(window[core], lab=lab[core])
+
+            space_img = np.ascontiguousarray((lab if rarity_space == "lab" else hsv)[core])
+            rarity = rarity_model(space_img).reshape(space_img.shape[:2])
+            maps["rarity"][tile.core] = rarity
+            rarity_range.update(rarity)
+        normalize_tiled(maps["rarity"], rarity_range, self.tile_size)
+        return maps
+
+    def _rarity_model(
+        self,
+        bgr: NDArray[Any],
+        space: str,
+        code: int,
+        k: int,
+        engine: str,
+        seed: int,
+        sample_size: int,
+        bins: int
+    ) -> Any:
+        """First rarity pass: a function from a tile's rarity-space image to its raw rarity."""
+        h, w = bgr.shape[:2]
+        if engine == "histogram":
+            counts = np.zeros(transforms.color_code_count(space, bins), dtype=np.int64)
+            for tile in iter_tiles((h, w), self.tile_size):
+                space_img = cv2.cvtColor(np.ascontiguousarray(bgr[tile.core]), code)
+                counts += np.bincount(transforms.color_codes(space_img, space, bins), minlength=counts.size)
+            lut = transforms.histogram_lut(counts, space, bins)
+            return lambda space_img: lut[transforms.color_codes(space_img, space, bins)]
+
+        if engine not in transforms.RARITY_ENGINES:
+            logger.error("Unsupported rarity engine: {}", engine)
+            raise ValueError(f"Unsupported rarity engine: {engine}")
+        ys, xs = np.divmod(transforms.stratified_sample((h, w), sample_size, seed, min_count=k), w)
+        pixels = np.ascontiguousarray(bgr[ys, xs]).reshape(-1, 1, 3)
+        sample = transforms.rarity_features(pixels, space, space_img=cv2.cvtColor(pixels, code))
+        centers = transforms.kmeans_centers(sample, k, seed)
+        return lambda space_img: transforms.nearest_center_distances(
+            transforms.rarity_features(space_img, space, space_img=space_img), centers
+        )
+
+    def hue_contrast(self, hue: NDArray[Any], sigma: float, level: int = 0) -> NDArray[Any]:
+        """
+        Tiled compute_hue_contrast. With a pyramid level, each tile window
+        builds its own pyramid, so the result only approximates the
+        whole-image one near tile edges.
+        """
+        out = self.array(hue.shape)
+        value_range = ValueRange()
+        map_tiles(
+            lambda window: transforms.hue_deviation(window, sigma, level),
+            [hue], out, self.tile_size, gaussian_halo(sigma) + pyramid_halo(level), value_range
+        )
+        return normalize_tiled(out, value_range, self.tile_size)
+
+    def luminance_contrast(self, luminance: NDArray[Any], method: str, sobel_weight: float) -> NDArray[Any]:
+        """Tiled compute_luminance_contrast: normalized parts first, then their normalized weighted sum."""
+        def sobel(window: NDArray[Any]) -> NDArray[Any]:
+            return transforms.sobel_magnitude(window)
+
+        def std(window: NDArray[Any]) -> NDArray[Any]:
+            return transforms.local_std(window, 5)
+
+        if method == "sobel":
+            parts = [(sobel, 1.0)]
+        elif method == "local_std":
+            parts = [(std, 1.0)]
+        elif method == "combined":
+            parts = [(sobel, sobel_weight), (std, 1 - sobel_weight)]
+        else:
+            logger.error("Unsupported contrast method: {}", method)
+            raise ValueError(f"Unsupported contrast method: {method}")
+
+        normalized = []
+        for part, _ in parts:
+            arr, value_range = self.array(luminance.shape), ValueRange()
+            map_tiles(part, [luminance], arr, self.tile_size, LUMINANCE_CONTRAST_HALO, value_range)
+            normalized.append(normalize_tiled(arr, value_range, self.tile_size))
+
+        def weighted_sum(*windows: NDArray[Any]) -> NDArray[Any]:
+            result = np.multiply(windows[0], parts[0][1], dtype=np.float32)
+            for window, (_, weight) in zip(windows[1:], parts[1:]):
+                result += np.multiply(window, weight, dtype=np.float32)
+            return result
+
+        out = self.array(luminance.shape)
+        value_range = ValueRange()
+        map_tiles(weighted_sum, normalized, out, self.tile_size, 0, value_range)
+        return normalize_tiled(out, value_range, self.tile_size)
+
+    def density(self, arr: NDArray[Any], window_size: WindowSizes) -> NDArray[Any]:
+        """Tiled compute_color_density (one integral image per tile serves every scale)."""
+        sizes = as_window_sizes(window_size)
+        max_size = max(sizes)
+        scales = [self.array(arr.shape) for _ in sizes]
+        ranges = [ValueRange() for _ in sizes]
+        ws = Workspace.current()
+        for tile in iter_tiles(arr.shape, self.tile_size, max_size // 2):
+            table = IntegralImage(np.asarray(arr[tile.window], dtype=np.float32), max_size, workspace=ws)
+            for size, scale, value_range in zip(sizes, scales, ranges):
+                variance = table.variance(size)[tile.core_in_window]
+                scale[tile.core] = variance
+                value_range.update(variance)
+        for scale, value_range in zip(scales, ranges):
+            normalize_tiled(scale, value_range, self.tile_size)
+        if len(sizes) == 1:
+            return scales[0]
+
+        out = self.array(arr.shape)
+        value_range = ValueRange()
+
+        def total(*windows: NDArray[Any]) -> NDArray[Any]:
+            result = np.array(windows[0], dtype=np.float32)
+            for window in windows[1:]:
+                result += window
+            return result
+
+        map_tiles(total, scales, out, self.tile_size, 0, value_range)
+        return normalize_tiled(out, value_range, self.tile_size)
+
+    def cue_salience(
+        self,
+        strength: NDArray[Any],
+        density: NDArray[Any],
+        strategy: str = "product",
+        eps: float = 1e-3
+    ) -> NDArray[Any]:
+        """Tiled compute_cue_salience."""
+        def salience(s: NDArray[Any], d: NDArray[Any]) -> NDArray[Any]:
+            s = np.asarray(s, dtype=np.float32)
+            return _cue_salience_into(
+                s, np.asarray(d, dtype=np.float32), strategy, eps, np.empty_like(s), np.empty_like(s)
+            )
+
+        out = self.array(strength.shape)
+        value_range = ValueRange()
+        map_tiles(salience, [strength, density], out, self.tile_size, 0, value_range)
+        return normalize_tiled(out, value_range, self.tile_size, eps=eps)
+
+    def salience(
+        self,
+        cue_maps: Dict[str, NDArray[Any]],
+        strategy: str,
+        weights: Optional[Dict[str, float]],
+        eps: float = 1e-3
+    ) -> NDArray[Any]:
+        """Tiled compute_salience (of the fusion cues present in cue_maps)."""
+        names = [name for name in ("hue_contrast", "saturation", "rarity", "luminance_contrast") if name in cue_maps]
+        out = self.array(cue_maps[names[0]].shape)
+        value_range = ValueRange()
+
+        def combine(*windows: NDArray[Any]) -> NDArray[Any]:
+            maps = {name: np.asarray(window, dtype=np.float32) for name, window in zip(names, windows)}
+            return combine_cues(
+                maps.get("hue_contrast"), maps.get("saturation"), maps.get("rarity"), maps.get("luminance_contrast"),
+                strategy=strategy, weights=weights, eps=eps
+            )
+
+        map_tiles(combine, [cue_maps[name] for name in names], out, self.tile_size, 0, value_range)
+        return normalize_tiled(out, value_range, self.tile_size, eps=eps)
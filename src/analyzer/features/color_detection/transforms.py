@@ -1,76 +1,184 @@
 import numpy as np
 import cv2
-from scipy.ndimage import gaussian_filter, uniform_filter  # type: ignore[import-untyped]
-from sklearn.cluster import KMeans
-from typing import Any
+from scipy.ndimage import gaussian_filter  # type: ignore[import-untyped]
+from typing import Any, Callable, Optional, Tuple
 from numpy.typing import NDArray
 from loguru import logger
+from src.analyzer.features.workspace import Workspace
+from src.analyzer.features.window_stats import IntegralImage, WindowSizes, as_window_sizes
+from src.analyzer.pyramid import GaussianPyramid
 
 
-def normalize(arr: NDArray[Any]) -> NDArray[Any]:
-    """Normalize an array to [0,1] range with debug logging."""
+def normalize(arr: NDArray[Any], out: Optional[NDArray[Any]] = None) -> NDArray[Any]:
+    """
+    Normalize an array to [0,1] range with debug logging.
+    out: array to write into (may be `arr` itself); allocated when None.
+    """
     min_val, max_val = arr.min(), arr.max()
     logger.debug("normalize called: min={}, max={}", min_val, max_val)
-    return (arr - min_val) / (max_val - min_val + 1e-8)
+    if out is None:
+        out = np.empty(arr.shape, dtype=arr.dtype if np.issubdtype(arr.dtype, np.floating) else np.float64)
+    np.subtract(arr, min_val, out=out)
+    out /= (max_val - min_val + 1e-8)
+    return out
 
 
-def compute_hue_contrast(
+def normalize_stack(stack: NDArray[np.float32]) -> NDArray[np.float32]:
+    """Normalize each channel of a float32 (C, H, W) stack to [0,1] range, in place."""
+    min_val = stack.min(axis=(1, 2), keepdims=True)
+    max_val = stack.max(axis=(1, 2), keepdims=True)
+    stack -= min_val
+    stack /= (max_val - min_val + 1e-8)
+    return stack
+
+
+def hue_unit_vectors(hue: NDArray[Any]) -> Tuple[NDArray[Any], NDArray[Any]]:
+    """(sin, cos) of the hue angle, float32."""
+    angle = hue.astype(np.float32) * np.float32(2 * np.pi)
+    return np.sin(angle), np.cos(angle)
+
+
+def resize_hue(hue: NDArray[Any], size: Tuple[int, int]) -> NDArray[Any]:
+    """
+    cv2.resize of a [0, 1) hue map to size (w, h), interpolating its unit
+    vectors so values blend along the hue circle rather than across the
+    0/1 wrap (0.98 and 0.02 blend to 0.0, not 0.5).
+    """
+    sin, cos = hue_unit_vectors(hue)
+    sin = cv2.resize(sin, size, interpolation=cv2.INTER_LINEAR)
+    cos = cv2.resize(cos, size, interpolation=cv2.INTER_LINEAR)
+    out = np.arctan2(sin, cos)
+    out /= np.float32(2 * np.pi)
+    out %= 1.0
+    return out
+
+
+def hue_deviation(
     hue: NDArray[Any],
-    sigma: float
+    sigma: float,
+    level: int = 0,
+    pyramids: Optional[Tuple[GaussianPyramid, GaussianPyramid]] = None
 ) -> NDArray[Any]:
-    """Computes local hue contrast using angular difference with debug logging."""
-    logger.debug("compute_hue_contrast called with sigma={}", sigma)
-    hue = hue.astype(np.float32)
-    hue_sin = np.sin(2 * np.pi * hue)
-    hue_cos = np.cos(2 * np.pi * hue)
-
-    mean_sin = gaussian_filter(hue_sin, sigma=sigma)
-    mean_cos = gaussian_filter(hue_cos, sigma=sigma)
-    mean_angle = np.arctan2(mean_sin, mean_cos) / (2 * np.pi)
+    """
+    Un-normalized hue contrast: circular distance of each hue from the
+    Gaussian-weighted (sigma) circular mean hue around it. The result is a
+    Workspace buffer of the calling thread.
+
+    level: Gaussian pyramid level the circular mean is computed at. Level L
+        blurs the hue unit vectors' level-L images with sigma / 2^L and
+        expands the means back, at 1/4^L of the full-resolution cost
+        (clamped to the deepest level of the map).
+    pyramids: (sin, cos) pyramids of hue_unit_vectors(hue) to reuse; built
+        here when None.
+    """
+    ws = Workspace.current()
+    hue = hue.astype(np.float32, copy=False)
+    angle = ws.like("hue_contrast.angle", hue)
+    if level > 0:
+        if pyramids is None:
+            pyramids = tuple(GaussianPyramid(v) for v in hue_unit_vectors(hue))  # type: ignore[assignment]
+        sin_pyramid, cos_pyramid = pyramids  # type: ignore[misc]
+        level = min(level, sin_pyramid.max_level)
+        coarse_sigma = sigma / 2 ** level
+        mean_sin = sin_pyramid.expand(gaussian_filter(sin_pyramid.level(level), sigma=coarse_sigma), level)
+        mean_cos = cos_pyramid.expand(gaussian_filter(cos_pyramid.level(level), sigma=coarse_sigma), level)
+    else:
+        np.multiply(hue, 2 * np.pi, out=angle)
+        hue_sin = np.sin(angle, out=ws.like("hue_contrast.sin", hue))
+        hue_cos = np.cos(angle, out=ws.like("hue_contrast.cos", hue))
+        mean_sin = gaussian_filter(hue_sin, sigma=sigma, output=ws.like("hue_contrast.mean_sin", hue))
+        mean_cos = gaussian_filter(hue_cos, sigma=sigma, output=ws.like("hue_contrast.mean_cos", hue))
+    mean_angle = np.arctan2(mean_sin, mean_cos, out=angle)
+    mean_angle /= 2 * np.pi
     mean_angle %= 1.0
 
-    diff = np.abs(hue - mean_angle)
-    contrast = normalize(np.minimum(diff, 1.0 - diff))
+    diff = np.subtract(hue, mean_angle, out=ws.like("hue_contrast.sin", hue))
+    np.abs(diff, out=diff)
+    np.minimum(diff, np.subtract(1.0, diff, out=ws.like("hue_contrast.cos", hue)), out=diff)
+    return diff
+
+
+def compute_hue_contrast(
+    hue: NDArray[Any],
+    sigma: float,
+    out: Optional[NDArray[Any]] = None,
+    level: int = 0,
+    pyramids: Optional[Tuple[GaussianPyramid, GaussianPyramid]] = None
+) -> NDArray[Any]:
+    """
+    Computes local hue contrast using angular difference with debug logging.
+    Temporaries come from the thread's Workspace; out: optional float32 output array.
+    level, pyramids: compute the neighbourhood mean at a coarser pyramid level (see hue_deviation).
+    """
+    logger.debug("compute_hue_contrast called with sigma={}, level={}", sigma, level)
+    contrast = normalize(hue_deviation(hue, sigma, level, pyramids), out=out)
     logger.debug("Hue contrast computed: shape={}, dtype={}", contrast.shape, contrast.dtype)
     return contrast
 
 
+def sobel_magnitude(img: NDArray[Any], out: Optional[NDArray[Any]] = None) -> NDArray[Any]:
+    """Un-normalized 3x3 Sobel gradient magnitude (replicated border), float32."""
+    gx = cv2.Sobel(img, cv2.CV_32F, 1, 0, dst=out, ksize=3, borderType=cv2.BORDER_REPLICATE)
+    gy = cv2.Sobel(
+        img, cv2.CV_32F, 0, 1, dst=Workspace.current().like("sobel_magnitude.gy", img),
+        ksize=3, borderType=cv2.BORDER_REPLICATE
+    )
+    gx *= gx
+    gy *= gy
+    gx += gy
+    return np.sqrt(gx, out=gx)
+
+
+def local_std(img: NDArray[Any], size: int = 5, out: Optional[NDArray[Any]] = None) -> NDArray[Any]:
+    """Un-normalized standard deviation over the size x size window around each pixel, float32."""
+    ws = Workspace.current()
+    variance = IntegralImage(img, size, workspace=ws).variance(size, out=out)
+    return np.sqrt(variance, out=variance)
+
+
 def compute_luminance_contrast(
     luminance: NDArray[Any],
     method: str,
-    sobel_weight: float
+    sobel_weight: float,
+    gradient_magnitude: Optional[NDArray[Any]] = None,
+    out: Optional[NDArray[Any]] = None
 ) -> NDArray[Any]:
-    """Computes luminance contrast with debug logging."""
+    """
+    Computes luminance contrast with debug logging.
+    gradient_magnitude: the precomputed Sobel magnitude of `luminance`, if available.
+    Temporaries come from the thread's Workspace; out: optional float32 output array.
+    """
     logger.debug(
         "compute_luminance_contrast called with method={}, sobel_weight={}",
         method, sobel_weight
     )
-    
+    ws = Workspace.current()
+
     def sobel_contrast(img: NDArray[Any]) -> NDArray[Any]:
-        gx = cv2.Sobel(img, cv2.CV_32F, 1, 0, ksize=3)
-        gy = cv2.Sobel(img, cv2.CV_32F, 0, 1, ksize=3)
-        grad = np.sqrt(gx ** 2 + gy ** 2)
-        return normalize(grad)
+        into = ws.like("luminance_contrast.sobel", img)
+        if gradient_magnitude is not None:
+            return normalize(gradient_magnitude, out=into)
+        return normalize(sobel_magnitude(img, out=into), out=into)
 
     def std_contrast(img: NDArray[Any]) -> NDArray[Any]:
-        mean = uniform_filter(img, size=5)
-        sq_mean = uniform_filter(img ** 2, size=5)
-        stddev = np.sqrt(sq_mean - mean ** 2)
-        return normalize(stddev)
+        stddev = local_std(img, 5, out=ws.like("luminance_contrast.std", img))
+        return normalize(stddev, out=stddev)
 
     if method == "sobel":
         result = sobel_contrast(luminance)
     elif method == "local_std":
         result = std_contrast(luminance)
     elif method == "combined":
-        sob = sobel_contrast(luminance)
+        result = sobel_contrast(luminance)
+        result *= sobel_weight
         std = std_contrast(luminance)
-        result = sobel_weight * sob + (1 - sobel_weight) * std
+        std *= (1 - sobel_weight)
+        result += std
     else:
         logger.error("Unsupported contrast method: {}", method)
         raise ValueError(f"Unsupported contrast method: {method}")
 
-    contrast_norm = normalize(result)
+    contrast_norm = normalize(result, out=out)
     logger.debug(
         "Luminance contrast computed: shape={}, dtype={}",
         contrast_norm.shape, contrast_norm.dtype
@@ -78,47 +186,284 @@ def compute_luminance_contrast(
     return contrast_norm
 
 
-def compute_color_rarity(
+RARITY_ENGINES = ("kmeans", "sampled", "minibatch", "histogram")
+
+
+def rarity_space_image(img_bgr: NDArray[Any], space: str) -> NDArray[Any]:
+    """The LAB (space='lab') or HSV (space='hue') image rarity features are read from."""
+    if space == "lab":
+        return cv2.cvtColor(img_bgr, cv2.COLOR_BGR2LAB)
+    elif space == "hue":
+        return cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
+    logger.error("Unsupported color space: {}", space)
+    raise ValueError(f"Unsupported color space: {space}")
+
+
+def rarity_features(
     img_bgr: NDArray[Any],
     space: str,
-    k: int
+    space_img: Optional[NDArray[Any]] = None
 ) -> NDArray[Any]:
-    """Computes global color rarity based on distance from cluster centers with debug logging."""
-    logger.debug("compute_color_rarity called with space={}, k={}", space, k)
-    h, w = img_bgr.shape[:2]
+    """
+    Per-pixel 2D color features used for rarity: a*/b* (lab) or the hue unit circle (hue).
+    space_img: the precomputed rarity_space_image of img_bgr, if available.
+    """
+    if space_img is None:
+        space_img = rarity_space_image(img_bgr, space)
     if space == "lab":
-        img_space = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2LAB)
-        features = img_space[:, :, 1:3].reshape(-1, 2)
+        return space_img[:, :, 1:3].reshape(-1, 2)
     elif space == "hue":
-        img_hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
+        img_hsv = space_img
         hue = img_hsv[:, :, 0].astype(np.float32) / 180.0
         x = np.cos(2 * np.pi * hue)
         y = np.sin(2 * np.pi * hue)
-        features = np.stack([x, y], axis=-1).reshape(-1, 2)
+        return np.stack([x, y], axis=-1).reshape(-1, 2)
     else:
         logger.error("Unsupported color space: {}", space)
         raise ValueError(f"Unsupported color space: {space}")
 
-    kmeans = KMeans(n_clusters=k, n_init='auto')
-    labels = kmeans.fit_predict(features)
-    centers = kmeans.cluster_centers_
-    dists = np.linalg.norm(features - centers[labels], axis=1)
-    rarity = dists.reshape(h, w)
+
+def stratified_sample(shape: Tuple[int, int], sample_size: int, seed: int, min_count: int = 1) -> NDArray[Any]:
+    """
+    Flat pixel indices of a spatially stratified sample: the image is split
+    into a grid of roughly `sample_size` cells and one pixel is drawn per cell.
+    min_count: the grid is refined until it has at least this many cells
+    (e.g. k for k-means) or every pixel is drawn.
+    """
+    h, w = shape
+    step = max(1, int(np.ceil(np.sqrt(h * w / sample_size))))
+    while step > 1 and -(-h // step) * -(-w // step) < min_count:
+        step -= 1
+    rng = np.random.default_rng(seed)
+    ys = np.arange(0, h, step)
+    xs = np.arange(0, w, step)
+    ys = np.minimum(ys[:, None] + rng.integers(0, step, size=(ys.size, xs.size)), h - 1)
+    xs = np.minimum(xs[None, :] + rng.integers(0, step, size=(ys.shape[0], xs.size)), w - 1)
+    return (ys * w + xs).ravel()
+
+
+def nearest_center_distances(features: NDArray[Any], centers: NDArray[Any]) -> NDArray[Any]:
+    """Distance from every feature to its nearest center, one center at a time to bound memory."""
+    feats = features.astype(np.float32, copy=False)
+    best = np.full(feats.shape[0], np.inf, dtype=np.float32)
+    for center in centers.astype(np.float32):
+        diff = feats - center
+        np.minimum(best, np.einsum("ij,ij->i", diff, diff), out=best)
+    return np.sqrt(best)
+
+
+def kmeans_centers(sample: NDArray[Any], k: int, seed: int = 0) -> NDArray[Any]:
+    """k-means cluster centers of an already drawn feature sample."""
+    from sklearn.cluster import KMeans
+
+    return KMeans(n_clusters=k, n_init='auto', random_state=seed).fit(sample).cluster_centers_
+
+
+def fit_rarity_centers(
+    features: NDArray[Any],
+    shape: Tuple[int, int],
+    k: int,
+    engine: str,
+    seed: int = 0,
+    sample_size: int = 50_000
+) -> NDArray[Any]:
+    """Fit k color cluster centers with the sampled or minibatch engine."""
+    from sklearn.cluster import MiniBatchKMeans
+
+    if engine == "sampled":
+        return kmeans_centers(features[stratified_sample(shape, sample_size, seed, min_count=k)], k, seed)
+    elif engine == "minibatch":
+        model = MiniBatchKMeans(
+            n_clusters=k, n_init='auto', random_state=seed,
+            batch_size=min(4096, features.shape[0]), compute_labels=False
+        ).fit(features)
+    else:
+        logger.error("Unsupported rarity center engine: {}", engine)
+        raise ValueError(f"Unsupported rarity center engine: {engine}")
+    return model.cluster_centers_
+
+
+def histogram_rarity(
+    img_bgr: NDArray[Any],
+    space: str,
+    bins: int,
+    space_img: Optional[NDArray[Any]] = None
+) -> NDArray[Any]:
+    """
+    Rarity as self-information (-log p) of each pixel's quantized color,
+    read from a lookup table over a 2D a*b* histogram (lab) or a circular hue
+    histogram (hue). Runs in O(N) with no clustering.
+    """
+    if space_img is None:
+        space_img = rarity_space_image(img_bgr, space)
+    codes = color_codes(space_img, space, bins)
+    return histogram_lut(np.bincount(codes, minlength=color_code_count(space, bins)), space, bins)[codes]
+
+
+def color_code_count(space: str, bins: int) -> int:
+    """Number of distinct color_codes: bins² a*b* cells (lab) or bins hue sectors (hue)."""
+    if space == "lab":
+        return bins * bins
+    elif space == "hue":
+        return bins
+    logger.error("Unsupported color space: {}", space)
+    raise ValueError(f"Unsupported color space: {space}")
+
+
+def color_codes(space_img: NDArray[Any], space: str, bins: int) -> NDArray[Any]:
+    """Flat histogram bin of every pixel of a LAB (space='lab') or HSV (space='hue') image."""
+    if space == "lab":
+        ab = space_img[:, :, 1:3]
+        q = (ab.astype(np.int32) * bins) >> 8
+        return (q[:, :, 0] * bins + q[:, :, 1]).ravel()
+    elif space == "hue":
+        hue = space_img[:, :, 0]
+        return ((hue.astype(np.int32) * bins) // 180).ravel()
+    logger.error("Unsupported color space: {}", space)
+    raise ValueError(f"Unsupported color space: {space}")
+
+
+def histogram_lut(counts: NDArray[Any], space: str, bins: int) -> NDArray[Any]:
+    """Self-information -log p of every color code, from the (smoothed) code counts."""
+    hist = counts.astype(np.float32)
+    if space == "lab":
+        hist = cv2.GaussianBlur(hist.reshape(bins, bins), (3, 3), 0, borderType=cv2.BORDER_REPLICATE).ravel()
+    else:
+        # hue is circular: smooth across the 0/180 wrap-around
+        hist = 0.25 * np.roll(hist, 1) + 0.5 * hist + 0.25 * np.roll(hist, -1)
+    return -np.log(hist / hist.sum() + 1e-8).astype(np.float32)
+
+
+def rarity_model(
+    space_img: NDArray[Any],
+    space: str,
+    k: int,
+    engine: str = "kmeans",
+    seed: int = 0,
+    sample_size: int = 50_000,
+    bins: int = 32
+) -> Callable[[NDArray[Any]], NDArray[Any]]:
+    """
+    Fit a rarity engine on one LAB (space='lab') or HSV (space='hue') image
+    and return the function mapping pixels of that color space (any
+    H x W x 3 array, e.g. N x 1 x 3) to their flat raw, un-normalized rarity.
+    Lets the model be fit on a coarse image and evaluated on chosen pixels.
+    """
+    if engine == "histogram":
+        counts = np.bincount(color_codes(space_img, space, bins), minlength=color_code_count(space, bins))
+        lut = histogram_lut(counts, space, bins)
+        return lambda pixels: lut[color_codes(pixels, space, bins)]
+
+    features = rarity_features(space_img, space, space_img=space_img)
+    if engine == "kmeans":
+        centers = kmeans_centers(features, k, seed)
+    elif engine in ("sampled", "minibatch"):
+        centers = fit_rarity_centers(features, space_img.shape[:2], k, engine, seed, sample_size)
+    else:
+        logger.error("Unsupported rarity engine: {}", engine)
+        raise ValueError(f"Unsupported rarity engine: {engine}")
+    return lambda pixels: nearest_center_distances(rarity_features(pixels, space, space_img=pixels), centers)
+
+
+def compute_color_rarity(
+    img_bgr: NDArray[Any],
+    space: str,
+    k: int,
+    engine: str = "kmeans",
+    seed: int = 0,
+    sample_size: int = 50_000,
+    bins: int = 32,
+    space_img: Optional[NDArray[Any]] = None
+) -> NDArray[Any]:
+    """
+    Computes global color rarity with debug logging.
+    space_img: precomputed LAB (space='lab') or HSV (space='hue') image of
+    img_bgr, e.g. the preprocessed view, to skip the conversion.
+
+    engine:
+    - kmeans:    distance to the nearest of k centers fit on every pixel
+    - sampled:   centers fit on a stratified pixel sample, then a nearest-center pass
+    - minibatch: centers fit with mini-batch k-means, then a nearest-center pass
+    - histogram: self-information of the quantized color (bins per axis)
+    """
+    logger.debug("compute_color_rarity called with space={}, k={}, engine={}", space, k, engine)
+    h, w = img_bgr.shape[:2]
+
+    if engine == "histogram":
+        rarity = histogram_rarity(img_bgr, space, bins, space_img).reshape(h, w)
+    else:
+        features = rarity_features(img_bgr, space, space_img)
+        if engine == "kmeans":
+            from sklearn.cluster import KMeans
+
+            kmeans = KMeans(n_clusters=k, n_init='auto', random_state=seed)
+            labels = kmeans.fit_predict(features)
+            centers = kmeans.cluster_centers_
+            dists = np.linalg.norm(features - centers[labels], axis=1)
+        elif engine in ("sampled", "minibatch"):
+            centers = fit_rarity_centers(features, (h, w), k, engine, seed, sample_size)
+            dists = nearest_center_distances(features, centers)
+        else:
+            logger.error("Unsupported rarity engine: {}", engine)
+            raise ValueError(f"Unsupported rarity engine: {engine}")
+        rarity = dists.reshape(h, w)
+
     rarity_norm = normalize(rarity)
-    logger.debug("Color rarity computed: min={}, max={}", rarity_norm.min(), rarity_norm.max())
+    logger.opt(lazy=True).debug(
+        "Color rarity computed: min={}, max={}", lambda: rarity_norm.min(), lambda: rarity_norm.max()
+    )
     return rarity_norm
 
 
 def compute_color_density(
     arr: NDArray[Any],
-    window_size: int
+    window_size: WindowSizes,
+    out: Optional[NDArray[Any]] = None
 ) -> NDArray[Any]:
-    """Computes local variance density with debug logging."""
+    """
+    Computes local variance density with debug logging.
+    window_size: one window size, or several for multi-scale density (the
+        mean of the per-scale normalized densities); every scale reads the
+        same integral image.
+    out: optional float32 output array; temporaries come from the thread's Workspace.
+    """
     logger.debug("compute_color_density called with window_size={}", window_size)
-    img = arr.astype(np.float32)
-    mean = uniform_filter(img, size=window_size)
-    sq_mean = uniform_filter(img ** 2, size=window_size)
-    var = sq_mean - mean ** 2
-    density_norm = normalize(var)
+    ws = Workspace.current()
+    sizes = as_window_sizes(window_size)
+    img = arr.astype(np.float32, copy=False)
+    table = IntegralImage(img, max(sizes), workspace=ws)
+    if out is None:
+        out = np.empty(img.shape, dtype=np.float32)
+    if len(sizes) == 1:
+        density_norm = normalize(table.variance(sizes[0], out=out), out=out)
+    else:
+        scale = ws.like("color_density.scale", img)
+        out[...] = 0.0
+        for size in sizes:
+            out += normalize(table.variance(size, out=scale), out=scale)
+        density_norm = normalize(out, out=out)
     logger.debug("Color density computed: shape={}, dtype={}", density_norm.shape, density_norm.dtype)
-    return density_norm
\ No newline at end of file
+    return density_norm
+
+
+def compute_color_density_stack(
+    stack: NDArray[Any],
+    window_size: WindowSizes
+) -> NDArray[Any]:
+    """
+    compute_color_density of every channel of a (C, H, W) stack, into one
+    float32 stack. The integral images of all channels are built in one
+    batched pass and every scale reads them.
+    """
+    logger.debug("compute_color_density_stack called: channels={}, window_size={}", stack.shape[0], window_size)
+    ws = Workspace.current()
+    sizes = as_window_sizes(window_size)
+    table = IntegralImage(stack.astype(np.float32, copy=False), max(sizes), workspace=ws)
+    out = np.empty(stack.shape, dtype=np.float32)
+    if len(sizes) == 1:
+        return normalize_stack(table.variance(sizes[0], out=out))
+    scale = ws.like("color_density_stack.scale", out)
+    out[...] = 0.0
+    for size in sizes:
+        out += normalize_stack(table.variance(size, out=scale))
+    return normalize_stack(out)
@@ -1,12 +1,23 @@
 import numpy as np
-from typing import Any, Dict
+from functools import partial
+from typing import Any, Dict, Optional
+from numpy.typing import NDArray
 from .extractors import extract_canny, extract_piotr, extract_sobel, extract_laplacian
-from .transforms import compute_edge_density, compute_edge_salience
+from .transforms import (
+    compute_edge_density, compute_edge_salience, compute_edge_density_stack, compute_edge_salience_stack
+)
 from .intra_fusion import compute_fused_edge_map
+from src.analyzer.features.parallel import run_tasks
+from src.analyzer.features.stacking import stack_maps
+from src.analyzer.gradients import image_gradients
+from src.analyzer.preprocessing import CONTENT_RES, color_view, content_slices, pad_content
+from src.config.profiler import StageProfiler
+from src.analyzer.cache import FeatureCache
 from src.betteredit.analyzer.protocols.edge_detector_protocol import EdgeDetectorProtocol
-from src.betteredit.analyzer.protocols.detection_protocols import DetectionResult, CueBlock
-from src.analyzer.report.report_generator import print_structure
+from src.betteredit.analyzer.protocols.detection_protocols import DetectionResult, CueBlock, CombinedBlock
+from src.analyzer.report.report_generator import format_structure
 from src.betteredit.config import EdgeDetectionConfig, Settings
+from loguru import logger
 
 
 class EdgeDetector(EdgeDetectorProtocol):
@@ -14,93 +25,226 @@ class EdgeDetector(EdgeDetectorProtocol):
     Unified EdgeDetector supporting multiple methods and intra-fusion.
     Returns a DetectionResult with `cues` and `combined` blocks.
     """
-    def __init__(self, cfg: EdgeDetectionConfig):
+    def __init__(self, cfg: EdgeDetectionConfig, cache: Optional[FeatureCache] = None):
         """
         cfg: validated EdgeDetectionConfig from Pydantic.
+        cache: optional on-disk cache for edge maps and their blocks.
         """
         self.methods             = cfg.methods
         self.canny_sigma         = cfg.canny_sigma
         self.sobel_ksize         = cfg.sobel_ksize
         self.laplacian_ksize     = cfg.laplacian_ksize
         self.piotr_model_path    = cfg.piotr_model_path
+        self.piotr_model_sha256  = cfg.piotr_model_sha256
+        self.piotr_offline       = cfg.piotr_offline
         self.return_density      = cfg.return_density
         self.return_salience     = cfg.return_salience
         self.salience_strategy   = cfg.salience_strategy
         self.density_window_size = cfg.density_window_size
+        self.density_windows     = cfg.density_window_sizes or cfg.density_window_size
+        self.crop_padding        = cfg.crop_padding
         self.intra_fusion_strategy     = cfg.intra_fusion_strategy
         self.intra_fusion_weights      = cfg.intra_fusion_weights
+        self.max_workers               = cfg.max_workers
+        self.cache                     = cache
 
 
     def detect(self, image_data: Dict[str, Any]) -> DetectionResult:
-        # Initialize nested outputs
-        outputs: DetectionResult = {"cues": {}, "combined": {}}
-        norm_maps: Dict[str, np.ndarray] = {}
+        edge_maps = self.compute_cues(image_data)
+        outputs: DetectionResult = {
+            "cues": self.build_cue_blocks(edge_maps, image_data),
+            "combined": self.fuse(edge_maps, image_data=image_data)
+        }
 
-        # Per-method cue blocks
-        for method in self.methods:
-            edge_map = self._run_extractor(method, image_data)
-            block: CueBlock = {"map": edge_map}
+        logger.opt(lazy=True).debug("EdgeDetector.detect() structure:\n{}", lambda: format_structure(outputs))
+        return outputs
 
-            if self.return_density:
-                density = compute_edge_density(edge_map, window_size=self.density_window_size)
-                block["density"] = density
 
+    def compute_cues(self, image_data: Dict[str, Any]) -> Dict[str, NDArray[Any]]:
+        """
+        Run every configured extractor once, keyed by method name. Maps cover
+        the `input_view`: only the letterboxed content when cropping.
+        """
+        return run_tasks(
+            {method: partial(self._cached_extractor, method, image_data) for method in self.methods},
+            self.max_workers,
+            stage="edge"
+        )
+
+
+    def build_cue_blocks(
+        self,
+        edge_maps: Dict[str, NDArray[Any]],
+        image_data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, CueBlock]:
+        """
+        Wrap each edge map with its optional density and salience.
+
+        All maps are stacked into one (C, H, W) tensor and their densities and
+        saliences computed in a single batched pass.
+        image_data: when given, blocks are restored to the padded frame; with
+            a cache, blocks are read from / stored in it, and only the missing
+            ones are computed.
+        """
+        blocks: Dict[str, CueBlock] = {method: {"map": edge_map} for method, edge_map in edge_maps.items()}
+        if not (self.return_density or self.return_salience):
+            return self._restore_padding(blocks, image_data)
+
+        pending = list(edge_maps)
+        if self.cache is not None and image_data is not None:
+            for method in edge_maps:
+                hit = self.cache.lookup(image_data, "padded", f"edge.blocks.{method}", self._block_params(method))
+                if hit is not None:
+                    blocks[method].update(hit)  # type: ignore[typeddict-item]
+                    pending.remove(method)
+        if not pending:
+            return self._restore_padding(blocks, image_data)
+
+        with StageProfiler.stage("edge.blocks"):
+            stack = stack_maps([edge_maps[method] for method in pending])
+            derived: Dict[str, NDArray[Any]] = {}
+            if self.return_density:
+                derived["density"] = compute_edge_density_stack(stack, window_size=self.density_windows)
             if self.return_salience:
-                strength = edge_map.astype(np.float32)
-                density_for_sal = block.get("density", strength)
-                sal = compute_edge_salience(
-                    edge_strength=strength,
-                    edge_density=density_for_sal,
+                derived["salience"] = compute_edge_salience_stack(
+                    strength_stack=stack,
+                    density_stack=derived.get("density", stack),
                     strategy=self.salience_strategy
                 )
-                block["salience"] = sal
 
-            outputs["cues"][method] = block
-            norm_maps[method] = edge_map
+        for i, method in enumerate(pending):
+            arrays = {key: arr[i] for key, arr in derived.items()}
+            blocks[method].update(arrays)  # type: ignore[typeddict-item]
+            if self.cache is not None and image_data is not None:
+                self.cache.store(image_data, "padded", f"edge.blocks.{method}", self._block_params(method), arrays)
+        return self._restore_padding(blocks, image_data)
 
-        # Combined fused outputs
+    def input_view(self, image_data: Dict[str, Any]) -> str:
+        """
+        View key the extractors read: "padded", or CONTENT_RES (the padded
+        image cropped to its content) when crop_padding is set and the image
+        was letterboxed. Cropping skips the dead border, keeps its black edge
+        out of the maps, and keeps the padding out of every normalization.
+        """
+        if self.crop_padding and content_slices(image_data) is not None:
+            return CONTENT_RES
+        return "padded"
+
+    def _restore_padding(self, blocks: Dict[str, Any], image_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Pad cropped blocks (name -> arrays) back to the padded frame with zeros."""
+        if image_data is None or self.input_view(image_data) != CONTENT_RES:
+            return blocks
+        padding = image_data["padding"]
+        return {
+            name: {key: pad_content(arr, padding) for key, arr in block.items()}
+            for name, block in blocks.items()
+        }
+
+
+    @StageProfiler.profiled("edge.fusion")
+    def fuse(
+        self,
+        edge_maps: Dict[str, NDArray[Any]],
+        strategy: Optional[str] = None,
+        image_data: Optional[Dict[str, Any]] = None
+    ) -> CombinedBlock:
+        """
+        Fuse edge maps into the combined block.
+        strategy: overrides the configured intra_fusion_strategy when given.
+        image_data: when given, the block is restored to the padded frame.
+        """
         fused_map = compute_fused_edge_map(
-            canny=norm_maps.get("canny"),
-            sobel=norm_maps.get("sobel"),
-            laplacian=norm_maps.get("laplacian"),
-            piotr=norm_maps.get("piotr"),
-            strategy=self.intra_fusion_strategy,
+            canny=edge_maps.get("canny"),
+            sobel=edge_maps.get("sobel"),
+            laplacian=edge_maps.get("laplacian"),
+            piotr=edge_maps.get("piotr"),
+            strategy=strategy or self.intra_fusion_strategy,
             weights=self.intra_fusion_weights
         )
-        outputs["combined"]["strength"] = fused_map
+        combined: CombinedBlock = {"strength": fused_map}
 
         if self.return_density:
-            fused_density = compute_edge_density(fused_map, window_size=self.density_window_size)
-            outputs["combined"]["density"] = fused_density
+            fused_density = compute_edge_density(fused_map, window_size=self.density_windows)
+            combined["density"] = fused_density
 
         if self.return_salience:
-            strength = fused_map.astype(np.float32)
-            density_for_sal = outputs["combined"].get("density", strength)
+            strength = fused_map.astype(np.float32, copy=False)
+            density_for_sal = combined.get("density", strength)
             fused_sal = compute_edge_salience(
                 edge_strength=strength,
                 edge_density=density_for_sal,
                 strategy=self.salience_strategy
             )
-            outputs["combined"]["salience"] = fused_sal
+            combined["salience"] = fused_sal
+        return self._restore_padding({"combined": combined}, image_data)["combined"]
+
+
+    def _method_params(self, method: str) -> Dict[str, Any]:
+        """The config fields an edge method's raw map depends on (its cache key)."""
+        params: Dict[str, Any] = {"method": method, "crop_padding": self.crop_padding}
+        if method == "canny":
+            params["sigma"] = self.canny_sigma
+        elif method == "sobel":
+            params["ksize"] = self.sobel_ksize
+        elif method == "laplacian":
+            params["ksize"] = self.laplacian_ksize
+        elif method == "piotr":
+            params.update(model_path=self.piotr_model_path, model_sha256=self.piotr_model_sha256)
+        return params
 
-        # ─── DEBUG ─── print full nested output for inspection
-        print("=== EdgeDetector.detect() STRUCTURE ===")
-        print_structure(outputs)
-        print("=== End STRUCTURE ===")
-        return outputs
+
+    def _block_params(self, method: str) -> Dict[str, Any]:
+        """The config fields an edge method's density and salience depend on."""
+        return {
+            **self._method_params(method),
+            "return_density": self.return_density,
+            "return_salience": self.return_salience,
+            "salience_strategy": self.salience_strategy,
+            "density_window_size": self.density_windows
+        }
+
+
+    def _cached_extractor(self, method: str, image_data: Dict[str, Any]) -> np.ndarray:
+        if self.cache is None:
+            return self._run_extractor(method, image_data)
+        return self.cache.fetch(
+            image_data, "padded", f"edge.{method}", self._method_params(method),
+            lambda: {"map": self._run_extractor(method, image_data)}
+        )["map"]
 
 
     def _run_extractor(self, method: str, image_data: Dict[str, Any]) -> np.ndarray:
+        res = self.input_view(image_data)
+        gradients = image_gradients(image_data, "gray", res)
         if method == "canny":
-            return extract_canny(image_data["rgb"]["padded"], sigma=self.canny_sigma)
+            return extract_canny(
+                color_view(image_data, "rgb", res),
+                sigma=self.canny_sigma,
+                gray=gradients.channel,
+                derivatives=gradients.derivatives(3) if gradients.channel.dtype == np.uint8 else None
+            )
 
         elif method == "sobel":
-            return extract_sobel(image_data["gray"]["padded"], ksize=self.sobel_ksize)
+            return extract_sobel(
+                gradients.channel,
+                ksize=self.sobel_ksize,
+                magnitude=gradients.magnitude(self.sobel_ksize)
+            )
 
         elif method == "laplacian":
-            return extract_laplacian(image_data["gray"]["padded"], ksize=self.laplacian_ksize)
+            return extract_laplacian(
+                gradients.channel,
+                ksize=self.laplacian_ksize,
+                blurred=gradients.blurred(3, 1.0)
+            )
 
         elif method == "piotr":
-            return extract_piotr(image_data["rgb"]["padded"], model_path=self.piotr_model_path)
+            return extract_piotr(
+                color_view(image_data, "rgb", res),
+                model_path=self.piotr_model_path,
+                model_sha256=self.piotr_model_sha256,
+                offline=self.piotr_offline,
+                gray=gradients.channel
+            )
         else:
-            raise ValueError(f"Unsupported edge detection method: {method}")
\ No newline at end of file
+            raise ValueError(f"Unsupported edge detection method: {method}")
@@ -9,7 +9,9 @@ def normalize_edge_map(arr: np.ndarray, percentile_clip: float) -> np.ndarray:
     logger.debug("normalize_edge_map called with percentile_clip={}", percentile_clip)
     high = np.percentile(arr, percentile_clip)
     normalized = np.clip(arr / (high + 1e-5), 0, 1)
-    logger.debug("Edge map normalized: min={}, max={}", normalized.min(), normalized.max())
+    logger.opt(lazy=True).debug(
+        "Edge map normalized: min={}, max={}", lambda: normalized.min(), lambda: normalized.max()
+    )
     return normalized
 
 
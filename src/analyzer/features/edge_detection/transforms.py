@@ -1,35 +1,117 @@
 import numpy as np
-from scipy.ndimage import uniform_filter  # type: ignore[import-untyped]
-from typing import Any
+from typing import Any, Optional
 from numpy.typing import NDArray
 from loguru import logger
+from src.analyzer.features.workspace import Workspace
+from src.analyzer.features.window_stats import IntegralImage, WindowSizes, as_window_sizes
 
 
-def normalize(arr: NDArray[Any]) -> NDArray[Any]:
-    """Normalize an array to [0,1] range."""
+def normalize(arr: NDArray[Any], out: Optional[NDArray[Any]] = None) -> NDArray[Any]:
+    """
+    Normalize an array to [0,1] range.
+    out: array to write into (may be `arr` itself); allocated when None.
+    """
     min_val = arr.min()
     max_val = arr.max()
     logger.debug("Normalizing array: min={}, max={}", min_val, max_val)
-    return (arr - min_val) / (max_val - min_val + 1e-8)
+    if out is None:
+        out = np.empty(arr.shape, dtype=arr.dtype if np.issubdtype(arr.dtype, np.floating) else np.float64)
+    np.subtract(arr, min_val, out=out)
+    out /= (max_val - min_val + 1e-8)
+    return out
+
+
+def normalize_stack(stack: NDArray[Any]) -> NDArray[Any]:
+    """Normalize each channel of a (C, H, W) stack to [0,1] range, in place when float32."""
+    min_val = stack.min(axis=(1, 2), keepdims=True)
+    max_val = stack.max(axis=(1, 2), keepdims=True)
+    logger.debug("Normalizing stack of {} channels", stack.shape[0])
+    out = stack if stack.dtype == np.float32 else stack.astype(np.float32)
+    out -= min_val
+    out /= (max_val - min_val + 1e-8)
+    return out
+
+
+def compute_edge_density_stack(edge_stack: NDArray[Any], window_size: WindowSizes) -> NDArray[Any]:
+    """
+    compute_edge_density of every channel of a (C, H, W) stack of edge maps,
+    into one float32 stack, from integral images built in one batched pass.
+    """
+    logger.debug("compute_edge_density_stack called: channels={}, window_size={}", edge_stack.shape[0], window_size)
+    ws = Workspace.current()
+    sizes = as_window_sizes(window_size)
+    binary = np.greater(edge_stack, 0, out=ws.like("edge_density_stack.binary", edge_stack, np.bool_)).view(np.uint8)
+    table = IntegralImage(binary, max(sizes), squares=False, workspace=ws)
+    out = np.empty(edge_stack.shape, dtype=np.float32)
+    if len(sizes) == 1:
+        return normalize_stack(table.mean(sizes[0], out=out))
+    scale = ws.like("edge_density_stack.scale", out)
+    out[...] = 0.0
+    for size in sizes:
+        out += normalize_stack(table.mean(size, out=scale))
+    return normalize_stack(out)
+
+
+def compute_edge_salience_stack(
+    strength_stack: NDArray[Any],
+    density_stack: NDArray[Any],
+    strategy: str
+) -> NDArray[Any]:
+    """Per-channel compute_edge_salience of (C, H, W) strength and density stacks."""
+    logger.debug("compute_edge_salience_stack called with strategy={}", strategy)
+    ws = Workspace.current()
+    s = ws.like("edge_salience_stack.strength", strength_stack)
+    d = ws.like("edge_salience_stack.density", density_stack)
+    s[...] = strength_stack
+    d[...] = density_stack
+    normalize_stack(s)
+    normalize_stack(d)
 
+    if strategy == "product":
+        s += 1e-3
+        d += 1e-3
+        s *= d
+    elif strategy == "sum":
+        s += d
+        s /= 2.0
+    else:
+        logger.error("Unsupported edge salience strategy: {}", strategy)
+        raise ValueError(f"Unsupported edge salience intra-fusion strategy: {strategy}")
+    return normalize_stack(s.copy())
 
-def compute_edge_density(edge_map: NDArray[Any], window_size: int) -> NDArray[Any]:
+
+def compute_edge_density(
+    edge_map: NDArray[Any],
+    window_size: WindowSizes,
+    out: Optional[NDArray[Any]] = None
+) -> NDArray[Any]:
     """
     Computes edge density over local regions.
     Inputs:
         - edge_map: binary or probabilistic edge map (0–255 or 0–1)
-        - window_size: size of the square window for local density (from config)
+        - window_size: size of the square window for local density (from config),
+          or several sizes for multi-scale density (the mean of the per-scale
+          normalized densities, all read from one integral image)
+        - out: optional float32 output array; temporaries come from the
+          thread's Workspace
     Returns:
         - density map (float32, normalized [0, 1])
     """
     logger.debug("compute_edge_density called with window_size={}", window_size)
-    # Ensure float representation
-    if edge_map.dtype != np.float32:
-        edge_map = edge_map.astype(np.float32)
-
-    binary_map = (edge_map > 0).astype(np.float32)
-    density = uniform_filter(binary_map, size=window_size)
-    density_norm = normalize(density)
+    ws = Workspace.current()
+    sizes = as_window_sizes(window_size)
+    binary_map = np.greater(edge_map, 0, out=ws.like("edge_density.binary", edge_map, np.bool_)).view(np.uint8)
+    table = IntegralImage(binary_map, max(sizes), squares=False, workspace=ws)
+    if out is None:
+        out = np.empty(edge_map.shape, dtype=np.float32)
+    if len(sizes) == 1:
+        density_norm = normalize(table.mean(sizes[0], out=out), out=out)
+    else:
+        scale = ws.like("edge_density.scale", edge_map)
+        out[...] = 0.0
+        for size in sizes:
+            out += normalize(table.mean(size, out=scale), out=scale)
+        density_norm = normalize(out, out=out)
     logger.debug("Edge density computed: shape={}, dtype={}", density_norm.shape, density_norm.dtype)
     return density_norm
 
@@ -37,26 +119,32 @@ def compute_edge_density(edge_map: NDArray[Any], window_size: int) -> NDArray[An
 def compute_edge_salience(
     edge_strength: NDArray[Any],
     edge_density: NDArray[Any],
-    strategy: str
+    strategy: str,
+    out: Optional[NDArray[Any]] = None
 ) -> NDArray[Any]:
     """
     Combines edge strength and density into a salience map.
     strategy:
         - "product": salience = (strength+eps) × (density+eps)
         - "sum":     salience = (strength + density) / 2
+    out: optional float32 output array; temporaries come from the thread's Workspace.
     """
     logger.debug("compute_edge_salience called with strategy={}", strategy)
-    s = normalize(edge_strength)
-    d = normalize(edge_density)
+    ws = Workspace.current()
+    s = normalize(edge_strength, out=ws.like("edge_salience.strength", edge_strength))
+    d = normalize(edge_density, out=ws.like("edge_salience.density", edge_density))
 
     if strategy == "product":
-        salience = (s + 1e-3) * (d + 1e-3)
+        s += 1e-3
+        d += 1e-3
+        s *= d
     elif strategy == "sum":
-        salience = (s + d) / 2.0
+        s += d
+        s /= 2.0
     else:
         logger.error("Unsupported edge salience strategy: {}", strategy)
         raise ValueError(f"Unsupported edge salience intra-fusion strategy: {strategy}")
 
-    sal_norm = normalize(salience)
+    sal_norm = normalize(s, out=out)
     logger.debug("Edge salience computed: shape={}, dtype={}", sal_norm.shape, sal_norm.dtype)
-    return sal_norm
\ No newline at end of file
+    return sal_norm
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+from src.config.profiler import StageProfiler
+from src.analyzer.features.workspace import Workspace
+
+T = TypeVar("T")
+
+
+def run_tasks(
+    tasks: Dict[str, Callable[[], T]],
+    max_workers: int,
+    stage: Optional[str] = None
+) -> Dict[str, T]:
+    """
+    Run independent tasks and return their results keyed like `tasks`.
+
+    With max_workers <= 1 tasks run serially in insertion order; otherwise they
+    run on a thread pool (NumPy/OpenCV/SciPy release the GIL for most of their
+    work). Either way the result dict keeps the insertion order of `tasks`, and
+    the first failing task in that order re-raises its exception. Pooled
+    tasks lease a Workspace by stage and name (see `Workspace.lease`), so
+    scratch buffers are reused across calls although every call starts new
+    threads.
+
+    stage: when given and profiling is enabled, each task is timed as
+    StageProfiler stage "<stage>.<name>".
+    """
+    if stage is not None and StageProfiler.enabled():
+        tasks = {name: _staged(f"{stage}.{name}", task) for name, task in tasks.items()}
+
+    if max_workers <= 1 or len(tasks) <= 1:
+        return {name: task() for name, task in tasks.items()}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as pool:
+        futures = {name: pool.submit(_leased, f"{stage}.{name}" if stage else name, task) for name, task in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _leased(key: str, task: Callable[[], T]) -> T:
+    with Workspace.lease(key):
+        return task()
+
+
+def _staged(name: str, task: Callable[[], T]) -> Callable[[], T]:
+    def run() -> T:
+        with StageProfiler.stage(name):
+            return task()
+    return run
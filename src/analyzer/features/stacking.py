@@ -0,0 +1,18 @@
+import numpy as np
+from typing import Any, Sequence
+from numpy.typing import NDArray
+
+
+def stack_maps(maps: Sequence[NDArray[Any]]) -> NDArray[Any]:
+    """
+    Copy same-shape 2D maps into one contiguous (C, H, W) float32 tensor,
+    converting each map as it is copied (no per-map float32 temporaries).
+    """
+    shapes = {m.shape for m in maps}
+    if len(shapes) != 1:
+        raise ValueError(f"Cannot stack maps of different shapes: {sorted(shapes)}")
+    stack = np.empty((len(maps), *maps[0].shape), dtype=np.float32)
+    for i, m in enumerate(maps):
+        stack[i] = m
+    return stack
+
@@ -0,0 +1,150 @@
+import cv2
+import tempfile
+import numpy as np
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from numpy.typing import DTypeLike, NDArray
+
+
+class Tile(NamedTuple):
+    """
+    One tile of a tiled pass. A tile writes its core rectangle
+    [y0, y1) x [x0, x1) and reads its window: the core grown by the halo on
+    every side and clipped to the image, [hy0, hy1) x [hx0, hx1).
+    """
+    y0: int
+    y1: int
+    x0: int
+    x1: int
+    hy0: int
+    hy1: int
+    hx0: int
+    hx1: int
+
+    @property
+    def core(self) -> Tuple[slice, slice]:
+        return slice(self.y0, self.y1), slice(self.x0, self.x1)
+
+    @property
+    def window(self) -> Tuple[slice, slice]:
+        return slice(self.hy0, self.hy1), slice(self.hx0, self.hx1)
+
+    @property
+    def core_in_window(self) -> Tuple[slice, slice]:
+        """The core, relative to the window."""
+        return (
+            slice(self.y0 - self.hy0, self.y1 - self.hy0),
+            slice(self.x0 - self.hx0, self.x1 - self.hx0)
+        )
+
+
+def iter_tiles(shape: Tuple[int, ...], tile_size: int, halo: int = 0) -> Iterator[Tile]:
+    """
+    Row-major tiles of tile_size x tile_size covering an image of `shape`.
+
+    halo: must be at least the radius of every filter the pass applies, so a
+    filter reads the same neighbours in a tile window as in the full image.
+    Windows are clipped at the image border, where filters fall back to
+    their own border handling exactly as they do on the full image.
+    """
+    if tile_size < 1 or halo < 0:
+        raise ValueError(f"Invalid tiling: tile_size={tile_size}, halo={halo}")
+    h, w = shape[:2]
+    for y0 in range(0, h, tile_size):
+        y1 = min(y0 + tile_size, h)
+        for x0 in range(0, w, tile_size):
+            x1 = min(x0 + tile_size, w)
+            yield Tile(y0, y1, x0, x1, max(0, y0 - halo), min(h, y1 + halo), max(0, x0 - halo), min(w, x1 + halo))
+
+
+def grow_tile(tile: Tile, margin: int, halo: int, shape: Tuple[int, ...]) -> Tile:
+    """
+    The tile with its core grown by `margin` on every side and a window
+    `halo` beyond that, both clipped to an image of `shape`.
+    """
+    h, w = shape[:2]
+    y0, y1 = max(0, tile.y0 - margin), min(h, tile.y1 + margin)
+    x0, x1 = max(0, tile.x0 - margin), min(w, tile.x1 + margin)
+    return Tile(y0, y1, x0, x1, max(0, y0 - halo), min(h, y1 + halo), max(0, x0 - halo), min(w, x1 + halo))
+
+
+def dirty_tiles(old: NDArray[Any], new: NDArray[Any], tile_size: int, threshold: int = 0) -> List[Tile]:
+    """
+    The tiles (without halo) where two same-shape images differ: some pixel
+    channel changed by more than `threshold`.
+    """
+    if old.shape != new.shape:
+        raise ValueError(f"Cannot diff images of shapes {old.shape} and {new.shape}")
+    return [
+        tile for tile in iter_tiles(old.shape, tile_size)
+        if (cv2.absdiff(old[tile.core], new[tile.core]) > threshold).any()
+    ]
+
+
+def disk_array(
+    shape: Tuple[int, ...],
+    dtype: DTypeLike = np.float32,
+    directory: Optional[str] = None
+) -> NDArray[Any]:
+    """
+    Zero-filled array backed by an anonymous temporary file in `directory`
+    (the system temp dir when None) instead of RAM. The file has no name on
+    disk and its space is released once the array is garbage collected.
+    """
+    return np.memmap(tempfile.TemporaryFile(dir=directory), dtype=dtype, mode="w+", shape=tuple(shape))
+
+
+class ValueRange:
+    """
+    Running min/max over the tiles written by a pass, the first half of a
+    two-pass min/max normalization (see `normalize_tiled`).
+    """
+
+    def __init__(self) -> None:
+        self.lo: Any = None
+        self.hi: Any = None
+
+    def update(self, values: NDArray[Any]) -> None:
+        lo, hi = values.min(), values.max()
+        self.lo = lo if self.lo is None else min(self.lo, lo)
+        self.hi = hi if self.hi is None else max(self.hi, hi)
+
+
+def map_tiles(
+    fn: Callable[..., NDArray[Any]],
+    sources: Sequence[NDArray[Any]],
+    out: NDArray[Any],
+    tile_size: int,
+    halo: int = 0,
+    value_range: Optional[ValueRange] = None
+) -> NDArray[Any]:
+    """
+    One tiled pass: for every tile, fn(*windows) is called on the sources'
+    tile windows and the core of its result is written into out.
+
+    fn: maps same-shape source windows to a result of the window's shape.
+    value_range: updated with every written core, for normalization.
+    """
+    for tile in iter_tiles(out.shape, tile_size, halo):
+        core = fn(*(src[tile.window] for src in sources))[tile.core_in_window]
+        out[tile.core] = core
+        if value_range is not None:
+            value_range.update(core)
+    return out
+
+
+def normalize_tiled(
+    arr: NDArray[Any],
+    value_range: ValueRange,
+    tile_size: int,
+    eps: float = 1e-8
+) -> NDArray[Any]:
+    """
+    Second pass of a two-pass min/max normalization: rescale arr in place,
+    tile by tile, with the range measured while it was written.
+    """
+    scale = value_range.hi - value_range.lo + eps
+    for tile in iter_tiles(arr.shape, tile_size):
+        core = arr[tile.core]
+        core -= value_range.lo
+        core /= scale
+    return arr
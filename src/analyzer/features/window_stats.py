@@ -0,0 +1,143 @@
+import cv2
+import numpy as np
+from typing import Any, Optional, Sequence, Tuple, Union
+from numpy.typing import NDArray
+from src.analyzer.features.workspace import Workspace
+
+WindowSizes = Union[int, Sequence[int]]
+
+
+def as_window_sizes(window_size: WindowSizes) -> Tuple[int, ...]:
+    """A single window size or a sequence of them, as a non-empty tuple."""
+    sizes = (window_size,) if isinstance(window_size, int) else tuple(window_size)
+    if not sizes or min(sizes) < 1:
+        raise ValueError(f"Window sizes must be positive integers, got {window_size!r}")
+    return sizes
+
+
+class IntegralImage:
+    """
+    Summed-area tables of a 2D map (and of its square) for O(1)-per-pixel
+    box statistics at any window size up to `max_size`. A (C, H, W) stack
+    gets one table per channel, built and queried in a single batched pass.
+
+    The map is reflect-padded by max_size // 2 before integration and sums
+    are accumulated in float64, so box means match
+    scipy.ndimage.uniform_filter(arr, size) (mode 'reflect') for every size,
+    and variances do not suffer from float32 cancellation. Every window size
+    reads the same tables, so multi-scale statistics cost one table build.
+
+    workspace: when given, the padded map, the tables and the float64 box
+    sums live in its scratch buffers. Only one such IntegralImage per
+    workspace may be in use at a time.
+    """
+
+    def __init__(
+        self,
+        arr: NDArray[Any],
+        max_size: int,
+        squares: bool = True,
+        workspace: Optional[Workspace] = None
+    ):
+        if arr.ndim not in (2, 3):
+            raise ValueError(f"IntegralImage expects a 2D map or (C, H, W) stack, got shape {arr.shape}")
+        self.shape = arr.shape
+        self.max_size = max_size
+        self.pad = max_size // 2
+        self.workspace = workspace
+        src = arr if arr.dtype in (np.uint8, np.float32, np.float64) else arr.astype(np.float32)
+        if arr.ndim == 3:
+            self.sum, self.sq_sum = self._stack_tables(src, squares)
+            return
+        h, w = arr.shape
+        padded_shape = (h + 2 * self.pad, w + 2 * self.pad)
+        table_shape = (padded_shape[0] + 1, padded_shape[1] + 1)
+        padded = cv2.copyMakeBorder(
+            src, self.pad, self.pad, self.pad, self.pad, cv2.BORDER_REFLECT,
+            dst=self._scratch("integral.padded", padded_shape, src.dtype)
+        )
+        total = self._scratch("integral.sum", table_shape, np.float64)
+        if squares:
+            self.sum, self.sq_sum = cv2.integral2(
+                padded, sum=total, sqsum=self._scratch("integral.sq_sum", table_shape, np.float64),
+                sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F
+            )
+        else:
+            self.sum, self.sq_sum = cv2.integral(padded, sum=total, sdepth=cv2.CV_64F), None
+
+    def _stack_tables(
+        self, src: NDArray[Any], squares: bool
+    ) -> Tuple[NDArray[Any], Optional[NDArray[Any]]]:
+        # numpy's 'symmetric' padding is cv2.BORDER_REFLECT (edge pixel repeated)
+        c, h, w = src.shape
+        p = self.pad
+        padded = np.pad(src, ((0, 0), (p, p), (p, p)), mode="symmetric").astype(np.float64, copy=False)
+        table_shape = (c, h + 2 * p + 1, w + 2 * p + 1)
+
+        def integrate(values: NDArray[Any], name: str) -> NDArray[Any]:
+            table = self._scratch(name, table_shape, np.float64)
+            if table is None:
+                table = np.empty(table_shape, dtype=np.float64)
+            table[:, 0, :] = 0.0
+            table[:, :, 0] = 0.0
+            inner = table[:, 1:, 1:]
+            np.cumsum(values, axis=1, out=inner)
+            np.cumsum(inner, axis=2, out=inner)
+            return table
+
+        total = integrate(padded, "integral.sum")
+        if not squares:
+            return total, None
+        return total, integrate(np.square(padded), "integral.sq_sum")
+
+    def _scratch(self, name: str, shape: Tuple[int, ...], dtype: Any) -> Optional[NDArray[Any]]:
+        return None if self.workspace is None else self.workspace.buffer(name, shape, dtype)
+
+    def _box(self, table: NDArray[Any], size: int, name: str = "integral.box") -> NDArray[Any]:
+        if not 1 <= size <= self.max_size:
+            raise ValueError(f"Window size {size} outside [1, {self.max_size}]")
+        h, w = self.shape[-2:]
+        # window of output pixel i covers [i - size // 2, i + size - size // 2)
+        r0 = self.pad - size // 2
+        r1 = r0 + size
+        out = np.subtract(
+            table[..., r1:r1 + h, r1:r1 + w], table[..., r0:r0 + h, r1:r1 + w],
+            out=self._scratch(name, self.shape, np.float64)
+        )
+        out -= table[..., r1:r1 + h, r0:r0 + w]
+        out += table[..., r0:r0 + h, r0:r0 + w]
+        return out
+
+    def box_sum(self, size: int) -> NDArray[Any]:
+        """Sum over the size x size window around every pixel, float64."""
+        return self._box(self.sum, size)
+
+    def count(self, size: int) -> NDArray[Any]:
+        """Nonzero pixels per window, for a 0/1 mask."""
+        return np.rint(self.box_sum(size)).astype(np.int64)
+
+    def mean(self, size: int, out: Optional[NDArray[Any]] = None) -> NDArray[Any]:
+        """Box mean, float32 (written into `out` when given)."""
+        total = self.box_sum(size)
+        total /= size * size
+        if out is None:
+            return total.astype(np.float32)
+        out[...] = total
+        return out
+
+    def variance(self, size: int, out: Optional[NDArray[Any]] = None) -> NDArray[Any]:
+        """Box variance E[x²] - E[x]², float32 (clipped at 0; written into `out` when given)."""
+        if self.sq_sum is None:
+            raise ValueError("IntegralImage was built without squares")
+        area = size * size
+        mean = self.box_sum(size)
+        mean /= area
+        var = self._box(self.sq_sum, size, name="integral.sq_box")
+        var /= area
+        mean *= mean
+        var -= mean
+        np.maximum(var, 0.0, out=var)
+        if out is None:
+            return var.astype(np.float32)
+        out[...] = var
+        return out
@@ -0,0 +1,153 @@
+import threading
+import weakref
+import numpy as np
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Tuple
+from numpy.typing import DTypeLike, NDArray
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+
+class Workspace:
+    """
+    Arena of preallocated scratch buffers keyed by (name, shape, dtype).
+
+    Transform functions take their full-frame temporaries from the current
+    thread's workspace instead of allocating them per call, so a long batch
+    run reuses the same few buffers image after image. Buffers hold garbage
+    on return and are overwritten by the next caller asking for the same
+    name: they must never be returned or stored. Outputs are allocated
+    normally, or written into a caller-provided `out=` array.
+
+    Each thread (detector worker) has its own workspace, see `current()`.
+    Pool threads are short-lived, so run_tasks workers `lease()` an idle
+    workspace per task name instead; a task's buffers survive from one pool
+    to the next. All workspaces share one budget, `Workspace.max_bytes`:
+    when an allocation takes the arena past it (e.g. a batch of differently
+    sized images), idle workspaces are dropped, least recently returned
+    first, then the allocating workspace's least recently used buffers.
+    Long-running callers `release_idle()` between images.
+    max_bytes: optional cap on this workspace alone, below the arena budget.
+    """
+
+    max_bytes: int = DEFAULT_MAX_BYTES
+    _local = threading.local()
+    _idle: "OrderedDict[str, List[Workspace]]" = OrderedDict()
+    _idle_lock = threading.Lock()
+    _all: "weakref.WeakSet[Workspace]" = weakref.WeakSet()
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.cap = max_bytes
+        self._buffers: "OrderedDict[Tuple[str, Tuple[int, ...], str], NDArray[Any]]" = OrderedDict()
+        self._nbytes = 0
+        with Workspace._idle_lock:
+            Workspace._all.add(self)
+
+    @classmethod
+    def configure(cls, max_bytes: int) -> None:
+        """Set the byte budget shared by every workspace of the process."""
+        cls.max_bytes = max_bytes
+
+    @classmethod
+    def arena_bytes(cls) -> int:
+        """Bytes held by all live workspaces, thread-local and idle."""
+        with cls._idle_lock:
+            return sum(workspace._nbytes for workspace in cls._all)
+
+    @classmethod
+    def release_idle(cls) -> int:
+        """
+        Drop every idle leased workspace and clear the calling thread's own
+        buffers; returns the bytes released. Workspaces leased by running
+        tasks are untouched.
+        """
+        with cls._idle_lock:
+            idle = [workspace for workspaces in cls._idle.values() for workspace in workspaces]
+            cls._idle.clear()
+        own: Optional[Workspace] = getattr(cls._local, "workspace", None)
+        if own is not None:
+            idle.append(own)
+        released = sum(workspace._nbytes for workspace in idle)
+        for workspace in idle:
+            workspace.clear()
+        return released
+
+    @classmethod
+    def current(cls) -> "Workspace":
+        """The calling thread's workspace, created on first use."""
+        workspace: Optional[Workspace] = getattr(cls._local, "workspace", None)
+        if workspace is None:
+            workspace = cls._local.workspace = cls()
+        return workspace
+
+    @classmethod
+    @contextmanager
+    def lease(cls, key: str = "") -> Iterator["Workspace"]:
+        """
+        Make an idle workspace last leased under `key` (a new one when none is
+        idle) the calling thread's `current()` until the block exits, then
+        return it to the idle pool for the next task with that key.
+        """
+        with cls._idle_lock:
+            idle = cls._idle.get(key)
+            workspace = idle.pop() if idle else None
+        if workspace is None:
+            workspace = cls()
+        previous = getattr(cls._local, "workspace", None)
+        cls._local.workspace = workspace
+        try:
+            yield workspace
+        finally:
+            cls._local.workspace = previous
+            with cls._idle_lock:
+                cls._idle.setdefault(key, []).append(workspace)
+                cls._idle.move_to_end(key)
+
+    def buffer(self, name: str, shape: Tuple[int, ...], dtype: DTypeLike = np.float32) -> NDArray[Any]:
+        """An uninitialized scratch array; the same array for every call with these arguments."""
+        key = (name, tuple(shape), np.dtype(dtype).str)
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = np.empty(shape, dtype=dtype)
+            self._buffers[key] = buf
+            self._nbytes += buf.nbytes
+            self._evict()
+        self._buffers.move_to_end(key)
+        return buf
+
+    def like(self, name: str, arr: NDArray[Any], dtype: DTypeLike = np.float32) -> NDArray[Any]:
+        """Scratch buffer with arr's shape."""
+        return self.buffer(name, arr.shape, dtype)
+
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def clear(self) -> None:
+        self._buffers.clear()
+        self._nbytes = 0
+
+    def _evict(self) -> None:
+        if self.cap is not None:
+            self._drop_lru(self.cap)
+        over = Workspace.arena_bytes() - Workspace.max_bytes
+        if over <= 0:
+            return
+        with Workspace._idle_lock:
+            while over > 0 and Workspace._idle:
+                key = next(iter(Workspace._idle))
+                workspaces = Workspace._idle[key]
+                if workspaces:
+                    workspace = workspaces.pop(0)
+                    over -= workspace._nbytes
+                    workspace.clear()
+                if not workspaces:
+                    del Workspace._idle[key]
+        if over > 0:
+            self._drop_lru(self._nbytes - over)
+
+    def _drop_lru(self, limit: int) -> None:
+        """Drop least recently used buffers until at most `limit` bytes remain (keeping the newest)."""
+        while self._nbytes > limit and len(self._buffers) > 1:
+            _, buf = self._buffers.popitem(last=False)
+            self._nbytes -= buf.nbytes
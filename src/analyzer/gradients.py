@@ -0,0 +1,92 @@
+import cv2
+import threading
+import numpy as np
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from numpy.typing import NDArray
+from src.analyzer.preprocessing import color_view
+
+# Canny computes its derivatives with a replicated border; using the same
+# border everywhere lets its derivatives be shared with the Sobel consumers.
+GRADIENT_BORDER = cv2.BORDER_REPLICATE
+
+_GRADIENTS_LOCK = threading.Lock()
+
+
+class Gradients:
+    """
+    Derivatives of one single-channel image, each computed on first use and
+    memoized: Sobel dx/dy, gradient magnitude and orientation per kernel
+    size, and Gaussian-blurred copies.
+
+    uint8 channels with ksize=3 get exact int16 derivatives, the form
+    cv2.Canny accepts; anything else gets float32 derivatives.
+    """
+
+    def __init__(self, channel: NDArray[Any]):
+        self.channel = channel
+        self._results: Dict[Hashable, Any] = {}
+        self._lock = threading.RLock()
+
+    def _memo(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key not in self._results:
+                self._results[key] = compute()
+            return self._results[key]
+
+    def derivatives(self, ksize: int = 3) -> Tuple[NDArray[Any], NDArray[Any]]:
+        """Sobel (dx, dy)."""
+        def compute() -> Tuple[NDArray[Any], NDArray[Any]]:
+            ddepth = cv2.CV_16S if self.channel.dtype == np.uint8 and ksize == 3 else cv2.CV_32F
+            dx = cv2.Sobel(self.channel, ddepth, 1, 0, ksize=ksize, borderType=GRADIENT_BORDER)
+            dy = cv2.Sobel(self.channel, ddepth, 0, 1, ksize=ksize, borderType=GRADIENT_BORDER)
+            return dx, dy
+        return self._memo(("derivatives", ksize), compute)
+
+    def float_derivatives(self, ksize: int = 3) -> Tuple[NDArray[Any], NDArray[Any]]:
+        """Sobel (dx, dy) as float32."""
+        def compute() -> Tuple[NDArray[Any], NDArray[Any]]:
+            dx, dy = self.derivatives(ksize)
+            return dx.astype(np.float32, copy=False), dy.astype(np.float32, copy=False)
+        return self._memo(("float_derivatives", ksize), compute)
+
+    def magnitude(self, ksize: int = 3) -> NDArray[Any]:
+        """Gradient magnitude sqrt(dx² + dy²), float32."""
+        def compute() -> NDArray[Any]:
+            dx, dy = self.float_derivatives(ksize)
+            return np.sqrt(dx ** 2 + dy ** 2)
+        return self._memo(("magnitude", ksize), compute)
+
+    def orientation(self, ksize: int = 3) -> NDArray[Any]:
+        """Gradient direction in radians, [0, 2π), float32."""
+        def compute() -> NDArray[Any]:
+            dx, dy = self.float_derivatives(ksize)
+            return cv2.phase(dx, dy)
+        return self._memo(("orientation", ksize), compute)
+
+    def blurred(self, size: int, sigma: float) -> NDArray[Any]:
+        """Gaussian-blurred channel (size x size kernel)."""
+        return self._memo(
+            ("blurred", size, sigma),
+            lambda: cv2.GaussianBlur(self.channel, (size, size), sigmaX=sigma)
+        )
+
+
+def image_gradients(
+    image_data: Dict[str, Any],
+    source: str,
+    res: str,
+    channel: Optional[Callable[[], NDArray[Any]]] = None
+) -> Gradients:
+    """
+    The shared Gradients of one channel of this image, created on first use
+    and kept in image_data["gradients"] so every detector reuses them.
+
+    source, res: name the channel, e.g. ("gray", "padded").
+    channel: builds the channel; defaults to the `source` color view at `res`.
+    """
+    key = f"{source}:{res}"
+    with _GRADIENTS_LOCK:
+        store = image_data.setdefault("gradients", {})
+        if key not in store:
+            store[key] = Gradients(channel() if channel is not None else color_view(image_data, source, res))
+        return store[key]
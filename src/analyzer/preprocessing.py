@@ -1,8 +1,18 @@
 import cv2
+import threading
 import numpy as np
 from PIL import Image, ExifTags
-from typing import Dict, Any, Tuple
+from typing import Callable, Dict, Any, Iterator, MutableMapping, Optional, Tuple
 from src.config.design_registry import DesignRegistry
+from src.analyzer.cache import file_content_hash
+from src.analyzer.features.tiling import disk_array
+
+COLOR_SPACES = ("rgb", "bgr", "gray", "hsv", "lab")
+# View key of the padded image cropped to its letterboxed content (see content_slices)
+CONTENT_RES = "padded_content"
+DISK_COPY_ROWS = 256
+# Bytes per pixel of the raw layouts whose rows can be decoded band by band
+_RAW_PIXEL_BYTES = {"L": 1, "RGB": 3, "BGR": 3, "RGBA": 4, "RGBX": 4, "BGRA": 4, "BGRX": 4}
 
 
 def normalize_uint8(img: np.ndarray) -> np.ndarray:
@@ -15,10 +25,255 @@ def normalize_lab(lab_img: np.ndarray) -> np.ndarray:
     b = (lab_img[:, :, 2].astype(np.float32) - 128) / 127.0
     return np.stack([l, a, b], axis=-1).astype(np.float32)
 
+
+class LazyViews(MutableMapping[str, np.ndarray]):
+    """
+    Mapping of view name (e.g. "og", "padded_normalized") to image array that
+    materializes each view on first access and memoizes it.
+
+    Views may be assigned directly, which stores them as already materialized.
+    Factories run outside the lock, so threads can materialize different views
+    concurrently; two threads racing for the same view may both build it, and
+    the first stored copy is the one every reader gets.
+    """
+    def __init__(self, factories: Dict[str, Callable[[], np.ndarray]]):
+        self._factories = dict(factories)
+        self._cache: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        value = self._factories[key]()
+        with self._lock:
+            return self._cache.setdefault(key, value)
+
+    def __setitem__(self, key: str, value: np.ndarray) -> None:
+        with self._lock:
+            self._cache[key] = value
+
+    def setdefault(self, key: str, default: np.ndarray) -> np.ndarray:
+        """Store `default` unless `key` is already materialized; return the stored view."""
+        with self._lock:
+            return self._cache.setdefault(key, default)
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock:
+            if key not in self._factories and key not in self._cache:
+                raise KeyError(key)
+            self._factories.pop(key, None)
+            self._cache.pop(key, None)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._factories
+        yield from (k for k in list(self._cache) if k not in self._factories)
+
+    def __len__(self) -> int:
+        return len(self._factories.keys() | self._cache.keys())
+
+    def is_materialized(self, key: str) -> bool:
+        return key in self._cache
+
+    def __repr__(self) -> str:
+        return f"LazyViews(keys={list(self)}, materialized={list(self._cache)})"
+
+
+def _space_factories(
+    res: str,
+    view: Callable[[str, str], np.ndarray]
+) -> Dict[str, Dict[str, Callable[[], np.ndarray]]]:
+    """
+    Factories for every color space at one resolution ("og" or "padded"),
+    derived from that resolution's RGB view. BGR is a zero-copy,
+    channel-reversed view of RGB.
+    """
+    norm = f"{res}_normalized"
+    return {
+        "rgb": {
+            norm: lambda: normalize_uint8(view("rgb", res))
+        },
+        "bgr": {
+            res: lambda: view("rgb", res)[..., ::-1],
+            norm: lambda: view("rgb", norm)[..., ::-1]
+        },
+        "gray": {
+            res: lambda: cv2.cvtColor(view("rgb", res), cv2.COLOR_RGB2GRAY),
+            norm: lambda: normalize_uint8(view("gray", res))
+        },
+        "hsv": {
+            res: lambda: cv2.cvtColor(view("rgb", res), cv2.COLOR_RGB2HSV),
+            norm: lambda: normalize_uint8(view("hsv", res))
+        },
+        "lab": {
+            res: lambda: cv2.cvtColor(view("rgb", res), cv2.COLOR_RGB2LAB),
+            norm: lambda: normalize_lab(view("lab", res))
+        }
+    }
+
+
+# (source space, target space) -> cv2 conversion code, for views not built by preprocessing
+_CONVERSIONS = {
+    ("bgr", "rgb"): cv2.COLOR_BGR2RGB,
+    ("bgr", "gray"): cv2.COLOR_BGR2GRAY,
+    ("bgr", "hsv"): cv2.COLOR_BGR2HSV,
+    ("bgr", "lab"): cv2.COLOR_BGR2LAB,
+    ("rgb", "bgr"): cv2.COLOR_RGB2BGR,
+    ("rgb", "gray"): cv2.COLOR_RGB2GRAY,
+    ("rgb", "hsv"): cv2.COLOR_RGB2HSV,
+    ("rgb", "lab"): cv2.COLOR_RGB2LAB,
+}
+
+
+def content_slices(image_data: Dict[str, Any]) -> Optional[Tuple[slice, slice]]:
+    """
+    Rows and columns of the padded image holding the letterboxed content,
+    from image_data["padding"]; None when nothing was padded.
+    """
+    padding = image_data.get("padding")
+    if not padding or not any(padding.values()):
+        return None
+    return (
+        slice(padding["top"], -padding["bottom"] or None),
+        slice(padding["left"], -padding["right"] or None)
+    )
+
+
+def pad_content(arr: np.ndarray, padding: Dict[str, int], value: float = 0) -> np.ndarray:
+    """Place a map computed on the content rectangle back into the padded frame, filling the border with `value`."""
+    pad_width = [(padding["top"], padding["bottom"]), (padding["left"], padding["right"])]
+    pad_width += [(0, 0)] * (arr.ndim - 2)
+    return np.pad(arr, pad_width, mode="constant", constant_values=value)
+
+
+def color_view(image_data: Dict[str, Any], space: str, res: str) -> np.ndarray:
+    """
+    The `space` image at resolution `res`, converted at most once per image.
+
+    Views built by `preprocess_image` are materialized (and memoized) by their
+    LazyViews. Anything else, e.g. a downsampled analysis resolution or a
+    plain-dict image_data, is converted from the BGR or RGB view at `res` and
+    stored back into image_data[space][res] for later callers. The
+    CONTENT_RES view is a zero-copy crop of the padded view.
+
+    Conversions run unlocked; a view computed concurrently by two threads is
+    stored once (dict.setdefault is atomic) and both get the stored copy.
+    """
+    views = image_data.get(space)
+    if views is not None and res in views:
+        return views[res]
+
+    if res == CONTENT_RES:
+        rect = content_slices(image_data)
+        if rect is None:
+            raise KeyError(f"No padding recorded to derive '{res}' from")
+        content = color_view(image_data, space, "padded")[rect]
+        return image_data.setdefault(space, {}).setdefault(res, content)
+
+    for source in ("bgr", "rgb"):
+        source_views = image_data.get(source)
+        if source != space and source_views is not None and res in source_views:
+            converted = cv2.cvtColor(source_views[res], _CONVERSIONS[(source, space)])
+            return image_data.setdefault(space, {}).setdefault(res, converted)
+    raise KeyError(f"No '{res}' view to derive '{space}' from")
+
+
+def _apply_orientation(image_pil: Image.Image, orientation: Any) -> Image.Image:
+    if orientation == 3:
+        return image_pil.rotate(180, expand=True)
+    elif orientation == 6:
+        return image_pil.rotate(270, expand=True)
+    elif orientation == 8:
+        return image_pil.rotate(90, expand=True)
+    return image_pil
+
+
+def _load_full_rgb(image_path: str, orientation: Any) -> np.ndarray:
+    """Decode the full-resolution, orientation-corrected RGB image."""
+    with Image.open(image_path) as image_pil:
+        return np.array(_apply_orientation(image_pil, orientation).convert("RGB"))
+
+
+def _raw_layout(image_pil: Image.Image) -> Optional[Tuple[str, int, int, int]]:
+    """
+    (rawmode, offset, stride, ystep) of an uncompressed single-tile image
+    (PPM, BMP, uncompressed TIFF), whose rows can be read from the file at
+    computed offsets; None for any other layout.
+    """
+    if len(image_pil.tile) != 1:
+        return None
+    codec, extents, offset, args = image_pil.tile[0][:4]
+    width, height = image_pil.size
+    if codec != "raw" or tuple(extents) != (0, 0, width, height):
+        return None
+    rawmode, stride, ystep = (args, 0, 1) if isinstance(args, str) else (tuple(args) + (0, 1))[:3]
+    if not stride:
+        if rawmode not in _RAW_PIXEL_BYTES:
+            return None
+        stride = width * _RAW_PIXEL_BYTES[rawmode]
+    if ystep not in (1, -1):
+        return None
+    return rawmode, offset, stride, ystep
+
+
+def _load_full_rgb_to_disk(image_path: str, orientation: Any, directory: Optional[str]) -> np.ndarray:
+    """
+    Decode the full-resolution, orientation-corrected RGB image into a
+    disk-backed array, DISK_COPY_ROWS rows at a time.
+
+    Uncompressed layouts are read band by band straight from the file, so
+    memory stays bounded by one band. Compressed formats (JPEG, PNG,
+    compressed TIFF) decode sequentially: Pillow holds the decoded frame in
+    its own buffer while the bands are copied out, but no full-size NumPy
+    copy is made.
+    """
+    with Image.open(image_path) as image_pil:
+        layout = _raw_layout(image_pil)
+        if layout is not None and orientation not in (3, 6, 8):
+            rawmode, offset, stride, ystep = layout
+            width, height = image_pil.size
+            rgb = disk_array((height, width, 3), np.uint8, directory)
+            with open(image_path, "rb") as f:
+                for y0 in range(0, height, DISK_COPY_ROWS):
+                    y1 = min(y0 + DISK_COPY_ROWS, height)
+                    # bottom-up layouts (ystep -1) store the band's last row first
+                    f.seek(offset + (y0 if ystep == 1 else height - y1) * stride)
+                    band = Image.frombuffer(
+                        image_pil.mode, (width, y1 - y0), f.read(stride * (y1 - y0)), "raw", rawmode, stride, ystep
+                    )
+                    rgb[y0:y1] = np.asarray(band.convert("RGB"))
+            return rgb
+
+        image_rgb = _apply_orientation(image_pil, orientation).convert("RGB")
+        width, height = image_rgb.size
+        rgb = disk_array((height, width, 3), np.uint8, directory)
+        for y0 in range(0, height, DISK_COPY_ROWS):
+            y1 = min(y0 + DISK_COPY_ROWS, height)
+            rgb[y0:y1] = np.asarray(image_rgb.crop((0, y0, width, y1)))
+        image_rgb.close()
+    return rgb
+
+
 def preprocess_image(
     image_path: str,
-    target_size: Tuple[int, int]
+    target_size: Tuple[int, int],
+    draft_decode: bool = False,
+    cache_keys: bool = False,
+    disk_min_pixels: Optional[int] = None,
+    disk_dir: Optional[str] = None
 ) -> Dict[str, Any]:
+    """
+    draft_decode: for JPEGs much larger than target_size, let the decoder
+    return a DCT-scaled (1/2, 1/4 or 1/8) image for the padded path. The
+    full-resolution original is then decoded again if an "og" view is used,
+    so enable it only when no detector reads one (see pipeline.draft_decode).
+    Otherwise the padded view is downscaled from the single full decode.
+    cache_keys: hash the file contents and add `cache_keys` ({"og", "padded"})
+    identifying each resolution's pixels for the on-disk feature cache.
+    disk_min_pixels: originals with at least this many pixels get a
+    disk-backed "og" view (see `disk_array`, in disk_dir) for tiled analysis.
+    """
     # Register preprocessing start
     DesignRegistry.register(
         module="Preprocessing",
@@ -41,29 +296,50 @@ def preprocess_image(
         for tag, value in exif_data.items():
             decoded = ExifTags.TAGS.get(tag, tag)
             exif[decoded] = value
-
-        # Orientation correction
         orientation = exif.get("Orientation", None)
-        if orientation == 3:
-            image_pil = image_pil.rotate(180, expand=True)
-        elif orientation == 6:
-            image_pil = image_pil.rotate(270, expand=True)
-        elif orientation == 8:
-            image_pil = image_pil.rotate(90, expand=True)
-
-    # Original aspect
-    og_width, og_height = image_pil.size
-    original_aspect = og_width / og_height
 
-    # Convert to RGB
-    original_rgb = np.array(image_pil.convert("RGB"))
-    original_rgb_normalized = normalize_uint8(original_rgb)
+    # Original aspect (after orientation correction)
+    raw_width, raw_height = image_pil.size
+    transposed = orientation in (6, 8)
+    og_width, og_height = (raw_height, raw_width) if transposed else (raw_width, raw_height)
+    original_aspect = og_width / og_height
 
-    # Resize to target size with padding
     target_w, target_h = target_size
     scale = min(target_w / og_width, target_h / og_height)
     new_w, new_h = int(og_width * scale), int(og_height * scale)
-    resized = cv2.resize(original_rgb, (new_w, new_h), interpolation=cv2.INTER_AREA)
+
+    # Reduced-resolution decode: the JPEG decoder picks the largest DCT
+    # scale whose output is still at least the requested size.
+    decode_scale = 1.0
+    if draft_decode and image_pil.format == "JPEG" and scale < 0.5:
+        requested = (new_h, new_w) if transposed else (new_w, new_h)
+        image_pil.draft("RGB", requested)
+        decode_scale = image_pil.size[0] / raw_width
+
+    disk_backed = disk_min_pixels is not None and og_width * og_height >= disk_min_pixels
+    if disk_backed and decode_scale == 1.0:
+        # Decode once, into the disk-backed original; the padded view is
+        # downscaled from it without a full-resolution copy in memory.
+        image_pil.close()
+        decoded_rgb = _load_full_rgb_to_disk(image_path, orientation, disk_dir)
+    else:
+        # Orientation correction and conversion to RGB
+        image_pil = _apply_orientation(image_pil, orientation)
+        decoded_rgb = np.array(image_pil.convert("RGB"))
+        image_pil.close()
+
+    if disk_backed and decode_scale < 1.0:
+        def original_rgb() -> np.ndarray:
+            return _load_full_rgb_to_disk(image_path, orientation, disk_dir)
+    elif decode_scale < 1.0:
+        def original_rgb() -> np.ndarray:
+            return _load_full_rgb(image_path, orientation)
+    else:
+        def original_rgb() -> np.ndarray:
+            return decoded_rgb
+
+    # Resize to target size with padding
+    resized = cv2.resize(decoded_rgb, (new_w, new_h), interpolation=cv2.INTER_AREA)
 
     pad_vert = target_h - new_h
     pad_horz = target_w - new_w
@@ -74,49 +350,21 @@ def preprocess_image(
         resized, pad_top, pad_bottom, pad_left, pad_right,
         borderType=cv2.BORDER_CONSTANT, value=[0, 0, 0]
     )
-    padded_rgb_normalized = normalize_uint8(padded_rgb)
-
-    # Generate all image spaces (original and padded)
-    def generate_space_views(rgb_img, is_padded=False):
-        gray = cv2.cvtColor(rgb_img, cv2.COLOR_RGB2GRAY)
-        hsv = cv2.cvtColor(rgb_img, cv2.COLOR_RGB2HSV)
-        lab = cv2.cvtColor(rgb_img, cv2.COLOR_RGB2LAB)
-        bgr = cv2.cvtColor(rgb_img, cv2.COLOR_RGB2BGR)
-
-        return {
-            "rgb": {
-                "padded" if is_padded else "og": rgb_img,
-                "padded_normalized" if is_padded else "og_normalized": normalize_uint8(rgb_img)
-            },
-            "bgr": {
-                "padded" if is_padded else "og": bgr,
-                "padded_normalized" if is_padded else "og_normalized": normalize_uint8(bgr)
-            },
-            "gray": {
-                "padded" if is_padded else "og": gray,
-                "padded_normalized" if is_padded else "og_normalized": normalize_uint8(gray)
-            },
-            "hsv": {
-                "padded" if is_padded else "og": hsv,
-                "padded_normalized" if is_padded else "og_normalized": normalize_uint8(hsv)
-            },
-            "lab": {
-                "padded" if is_padded else "og": lab,
-                "padded_normalized" if is_padded else "og_normalized": normalize_lab(lab)
-            }
-        }
 
-    original_spaces = generate_space_views(original_rgb, is_padded=False)
-    padded_spaces = generate_space_views(padded_rgb, is_padded=True)
+    # All other image spaces (original and padded) are built lazily on first access
+    merged: Dict[str, LazyViews] = {}
+
+    def view(space: str, key: str) -> np.ndarray:
+        return merged[space][key]
 
-    # Merge all modalities by space
-    merged = {
-        "rgb": {**original_spaces["rgb"], **padded_spaces["rgb"]},
-        "bgr": {**original_spaces["bgr"], **padded_spaces["bgr"]},
-        "gray": {**original_spaces["gray"], **padded_spaces["gray"]},
-        "hsv": {**original_spaces["hsv"], **padded_spaces["hsv"]},
-        "lab": {**original_spaces["lab"], **padded_spaces["lab"]},
+    factories: Dict[str, Dict[str, Callable[[], np.ndarray]]] = {
+        "rgb": {"og": original_rgb, "padded": lambda: padded_rgb}
     }
+    for res in ("og", "padded"):
+        for space, space_factories in _space_factories(res, view).items():
+            factories.setdefault(space, {}).update(space_factories)
+    for space in COLOR_SPACES:
+        merged[space] = LazyViews(factories[space])
 
     result = {
         "exif": exif,
@@ -129,6 +377,12 @@ def preprocess_image(
         },
         **merged
     }
+    if cache_keys:
+        content_hash = file_content_hash(image_path)
+        result["cache_keys"] = {
+            "og": content_hash,
+            "padded": f"{content_hash}:{target_w}x{target_h}:{decode_scale:.6f}"
+        }
     
     # Register preprocessing completion with essential info
     DesignRegistry.register(
@@ -140,6 +394,8 @@ def preprocess_image(
             "original_size": [og_width, og_height],
             "target_size": target_size,
             "scale_factor": scale,
+            "decode_scale": decode_scale,
+            "disk_backed_original": disk_backed,
             "padding_applied": {
                 "top": pad_top,
                 "bottom": pad_bottom,
@@ -147,6 +403,7 @@ def preprocess_image(
                 "right": pad_right
             },
             "color_spaces_generated": list(merged.keys()),
+            "lazy_views": True,
             "exif_keys": list(exif.keys()) if exif else [],
             "orientation_corrected": orientation is not None and orientation in [3, 6, 8]
         }
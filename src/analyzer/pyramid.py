@@ -0,0 +1,74 @@
+import cv2
+import threading
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional
+from numpy.typing import NDArray
+from src.analyzer.preprocessing import color_view
+
+_PYRAMIDS_LOCK = threading.Lock()
+
+
+class GaussianPyramid:
+    """
+    Gaussian pyramid of one image or map. Level 0 is the image itself; level
+    i + 1 is cv2.pyrDown of level i (5x5 Gaussian, then every other row and
+    column). Levels are built on first use and memoized.
+
+    Filtering level L with sigma / 2^L and expanding the result back
+    approximates filtering level 0 with sigma at 1/4^L of the pixels.
+    """
+
+    def __init__(self, image: NDArray[Any]):
+        self._levels: List[NDArray[Any]] = [image]
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self._levels[0].shape
+
+    @property
+    def max_level(self) -> int:
+        """Deepest level that is still at least 2 pixels on its short side."""
+        h, w = self.shape[:2]
+        return max(0, int(np.log2(max(1, min(h, w)))) - 1)
+
+    def level(self, i: int) -> NDArray[Any]:
+        if not 0 <= i <= self.max_level:
+            raise ValueError(f"Pyramid level {i} outside [0, {self.max_level}]")
+        with self._lock:
+            while len(self._levels) <= i:
+                self._levels.append(cv2.pyrDown(self._levels[-1]))
+            return self._levels[i]
+
+    def laplacian(self, i: int) -> NDArray[Any]:
+        """Band-pass level i: level i minus the expanded level i + 1, float32."""
+        fine = self.level(i).astype(np.float32)
+        return fine - self.expand(self.level(i + 1).astype(np.float32), i + 1, i)
+
+    def expand(self, arr: NDArray[Any], from_level: int, to_level: int = 0) -> NDArray[Any]:
+        """Upsample a level-`from_level` map to level `to_level`'s size with repeated cv2.pyrUp."""
+        for i in range(from_level - 1, to_level - 1, -1):
+            h, w = self.level(i).shape[:2]
+            arr = cv2.pyrUp(arr, dstsize=(w, h))
+        return arr
+
+
+def image_pyramid(
+    image_data: Dict[str, Any],
+    source: str,
+    res: str,
+    channel: Optional[Callable[[], NDArray[Any]]] = None
+) -> GaussianPyramid:
+    """
+    The shared GaussianPyramid of one channel of this image, created on first
+    use and kept in image_data["pyramids"] so every detector reuses its levels.
+
+    source, res: name the channel, e.g. ("gray", "padded").
+    channel: builds the channel; defaults to the `source` color view at `res`.
+    """
+    key = f"{source}:{res}"
+    with _PYRAMIDS_LOCK:
+        store = image_data.setdefault("pyramids", {})
+        if key not in store:
+            store[key] = GaussianPyramid(channel() if channel is not None else color_view(image_data, source, res))
+        return store[key]
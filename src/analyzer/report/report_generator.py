@@ -1,20 +1,34 @@
 # src/analyzer/report/report_generator.py
 
 import numpy as np
-import matplotlib.pyplot as plt
+import cv2
 import os
+import queue
 import shutil
 import logging
-from typing import Any, Mapping, Optional
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 from numpy.typing import NDArray
 
+VISUAL_BACKENDS = ("lut", "matplotlib")
 
-def print_structure(d: Mapping[str, Any], indent: int = 0) -> None:
+_LUT_CACHE: Dict[str, NDArray[np.uint8]] = {}
+_LUT_LOCK = threading.Lock()
+
+
+def format_structure(d: Mapping[str, Any], indent: int = 0) -> str:
+    """Nested keys of d as an indented outline."""
     prefix = " " * indent
+    lines = []
     for k, v in d.items():
-        print(f"{prefix}- {k}")
+        lines.append(f"{prefix}- {k}")
         if isinstance(v, dict):
-            print_structure(v, indent + 2)
+            lines.append(format_structure(v, indent + 2))
+    return "\n".join(line for line in lines if line)
+
+
+def print_structure(d: Mapping[str, Any], indent: int = 0) -> None:
+    print(format_structure(d, indent))
 
 
 def clear_outputs_dir(output_dir: str) -> None:
@@ -31,13 +45,139 @@ def clear_outputs_dir(output_dir: str) -> None:
             print(f"[WARNING] Failed to delete {file_path}: {e}")
 
 
+def colormap_lut(cmap: str) -> NDArray[np.uint8]:
+    """
+    Return the 256-entry BGR lookup table for a Matplotlib colormap.
+
+    Tables are sampled once per colormap name and cached for the process.
+    """
+    lut = _LUT_CACHE.get(cmap)
+    if lut is None:
+        with _LUT_LOCK:
+            lut = _LUT_CACHE.get(cmap)
+            if lut is None:
+                import matplotlib
+
+                rgba = matplotlib.colormaps[cmap](np.linspace(0.0, 1.0, 256))
+                lut = np.ascontiguousarray((rgba[:, 2::-1] * 255.0 + 0.5).astype(np.uint8))
+                _LUT_CACHE[cmap] = lut
+    return lut
+
+
+def render_visual_map(
+    feature_map: NDArray[Any],
+    *,
+    cmap: str = "gray",
+    title: str = ""
+) -> NDArray[np.uint8]:
+    """
+    Colorize a single-channel map into a BGR image without Matplotlib figures.
+
+    The map is min/max normalized like `imshow`'s default scaling, quantized to
+    8 bits and mapped through the colormap LUT. Non-finite values render as 0.
+
+    Parameters:
+        feature_map (np.ndarray): The 2D array to visualize.
+        cmap (str): Matplotlib colormap name.
+        title (str): Optional caption drawn in a band above the image.
+
+    Returns:
+        np.ndarray: uint8 BGR image of shape (H, W, 3), or (H + band, W, 3) with a title.
+    """
+    values = np.asarray(feature_map, dtype=np.float32)
+    finite = np.isfinite(values)
+    if finite.all():
+        lo, hi = float(values.min()), float(values.max())
+    elif finite.any():
+        lo, hi = float(values[finite].min()), float(values[finite].max())
+        values = np.where(finite, values, lo)
+    else:
+        lo, hi = 0.0, 0.0
+        values = np.zeros_like(values)
+
+    scale = 255.0 / (hi - lo) if hi > lo else 0.0
+    index = np.clip((values - lo) * scale + 0.5, 0, 255).astype(np.uint8)
+    image = colormap_lut(cmap)[index]
+
+    if title:
+        band = max(18, image.shape[0] // 16)
+        canvas = np.full((image.shape[0] + band, image.shape[1], 3), 255, dtype=np.uint8)
+        canvas[band:] = image
+        font_scale = band / 36.0
+        cv2.putText(
+            canvas, title, (4, int(band * 0.75)), cv2.FONT_HERSHEY_SIMPLEX,
+            font_scale, (0, 0, 0), 1, cv2.LINE_AA
+        )
+        image = canvas
+    return image
+
+
+class VisualWriter:
+    """
+    Background thread that encodes and writes rendered maps to disk.
+
+    Callers render on their own thread and hand the image to `submit`; PNG
+    encoding and file I/O then overlap with the next computation. Use as a
+    context manager, or call `close()` to drain the queue and join the thread.
+    `close()` re-raises the first exception raised by a write.
+    """
+
+    def __init__(self, max_pending: int = 64):
+        self._queue: "queue.Queue[Optional[Tuple[str, NDArray[np.uint8]]]]" = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="visual-writer", daemon=True)
+        self._closed = False
+        self._exception: Optional[BaseException] = None
+        self.errors: List[Tuple[str, str]] = []
+        self._thread.start()
+
+    def submit(self, output_path: str, image: NDArray[np.uint8]) -> None:
+        if self._closed:
+            raise RuntimeError("VisualWriter is closed")
+        self._queue.put((output_path, image))
+
+    def close(self, raise_errors: bool = True) -> None:
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+        if raise_errors and self._exception is not None:
+            exception, self._exception = self._exception, None
+            raise exception
+
+    def __enter__(self) -> "VisualWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        # an exception already propagating out of the block takes precedence
+        self.close(raise_errors=exc_type is None)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            output_path, image = item
+            try:
+                if not cv2.imwrite(output_path, image):
+                    raise IOError(f"cv2.imwrite failed for {output_path}")
+                print(f"[SAVED] Visual map saved to: {output_path}")
+            except Exception as e:
+                self.errors.append((output_path, str(e)))
+                if self._exception is None:
+                    self._exception = e
+                print(f"[WARNING] Failed to write {output_path}: {e}")
+
+
 def save_visual_map(
     feature_map: Optional[NDArray[Any]],
     output_path: str,
     *,
     title: str = "",
     cmap: str = "gray",
-    save_visuals: bool = True
+    save_visuals: bool = True,
+    backend: str = "lut",
+    show_title: bool = False,
+    writer: Optional[VisualWriter] = None
 ) -> None:
     """
     Save a single-channel visual map as a PNG image.
@@ -48,13 +188,33 @@ def save_visual_map(
         title (str): Optional figure title.
         cmap (str): Matplotlib colormap to use.
         save_visuals (bool): If False, skip saving and print skipped message.
+        backend (str): "lut" writes the colormapped pixels directly at map resolution;
+            "matplotlib" renders a full figure with axes.
+        show_title (bool): Draw `title` above the image (the matplotlib backend always does).
+        writer (VisualWriter): Optional background writer; the LUT backend queues the
+            image there instead of writing synchronously.
     """
     if not save_visuals or feature_map is None:
         print(f"[SKIPPED] Skipping visual map for: {output_path}")
         return
 
+    if backend not in VISUAL_BACKENDS:
+        raise ValueError(f"Unknown visual backend '{backend}'. Valid: {VISUAL_BACKENDS}")
+
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
+    if backend == "lut":
+        image = render_visual_map(feature_map, cmap=cmap, title=title if show_title else "")
+        if writer is not None:
+            writer.submit(output_path, image)
+            return
+        if not cv2.imwrite(output_path, image):
+            raise IOError(f"cv2.imwrite failed for {output_path}")
+        print(f"[SAVED] Visual map saved to: {output_path}")
+        return
+
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(6, 6))
     plt.imshow(feature_map, cmap=cmap)
     if title:
@@ -68,6 +228,8 @@ def save_visual_map(
 
 
 def save_histogram(array, output_path, title):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(5, 3))
     plt.hist(array.flatten(), bins=100)
     plt.title(title)
@@ -4,41 +4,53 @@ betteredit CLI
 
 This module provides command-line interface for the betteredit,
 combining both single image analysis and benchmarking functionality.
+
+Heavy dependencies (NumPy, OpenCV, SciPy, scikit-learn, Matplotlib, Pydantic)
+are imported inside the command paths that use them, so `--help` and
+`check-config` start quickly. scripts/utils/import_time.py guards this.
 """
 
 import os
 import sys
-import yaml
 import uuid
+import glob
 import json
+import time
+import hashlib
 import argparse
-import numpy as np
 from loguru import logger
-from typing import Dict, Any, Tuple, Optional
+from typing import IO, TYPE_CHECKING, Dict, Any, List, Set, Tuple, Optional
 
 # Add project root to path
 BASEDIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 if BASEDIR not in sys.path:
     sys.path.insert(0, BASEDIR)
 
-from src.betteredit.config import Settings
-from src.pipeline import main as pipeline_main
 from src.config.design_registry import DesignRegistry
-from src.analyzer.preprocessing import preprocess_image
-from src.analyzer.features.base import FeatureExtractor
-from src.analyzer.report.report_generator import *
+
+if TYPE_CHECKING:
+    from src.betteredit.config import Settings
 
 # Default paths
 DEFAULT_CONFIG_PATH = os.path.join(BASEDIR, "src", "betteredit", "config", "settings.yaml")
 BENCHMARK_INPUT_DIR = os.path.join(BASEDIR, "benchmarking", "image_set")
 BENCHMARK_OUTPUT_DIR = os.path.join(BASEDIR, "outputs", "benchmarking")
+RARITY_BENCHMARK_OUTPUT_DIR = os.path.join(BASEDIR, "outputs", "benchmarking", "rarity")
 ANALYSIS_OUTPUT_DIR = os.path.join(BASEDIR, "outputs", "analysis")
+BATCH_OUTPUT_DIR = os.path.join(BASEDIR, "outputs", "batch")
+SERVER_OUTPUT_DIR = os.path.join(BASEDIR, "outputs", "server")
+# Request body limit of the analysis server; a base64 image is decoded in memory
+SERVER_MAX_BODY_BYTES = 64 * 1024 ** 2
+BATCH_JOURNAL_NAME = "batch_journal.jsonl"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
 STRATEGIES = ["minimal", "boosted", "full", "sum", "weighted"]
 
 
 class NumpyEncoder(json.JSONEncoder):
     """Custom JSON encoder to handle NumPy arrays and other non-serializable objects."""
     def default(self, obj):
+        import numpy as np
+
         if isinstance(obj, np.ndarray):
             return obj.tolist()
         elif isinstance(obj, np.integer):
@@ -69,10 +81,13 @@ def load_settings(
     config_path: Optional[str] = None,
     image_path: Optional[str] = None,
     output_dir: Optional[str] = None
-) -> Settings:
+) -> "Settings":
     """
     Load and merge settings from base config, user config, and CLI overrides.
     """
+    import yaml
+    from src.betteredit.config import Settings
+
     # Load base config
     if not os.path.isfile(DEFAULT_CONFIG_PATH):
         raise FileNotFoundError(f"Default config not found: {DEFAULT_CONFIG_PATH}")
@@ -106,22 +121,61 @@ def load_settings(
     return cfg
 
 
-def setup_logging():
-    """Configure logging for CLI operations."""
+def setup_logging(level: str = "INFO", json_log: Optional[str] = None):
+    """
+    Configure logging for CLI operations.
+
+    Sinks are enqueued, so worker threads hand records to a background
+    writer instead of blocking on stderr or disk. Debug statements in the
+    detectors are lazy and cost nothing below DEBUG.
+
+    level: stderr log level.
+    json_log: optional path of a JSON-lines log that records every level.
+    """
     logger.remove()
     logger.add(
         sys.stderr,
-        level="INFO",
-        format="{time:YYYY-MM-DD HH:mm:ss} [{level}] {message}"
+        level=level,
+        format="{time:YYYY-MM-DD HH:mm:ss} [{level}] {message}",
+        enqueue=True
     )
+    if json_log:
+        logger.add(json_log, level="DEBUG", serialize=True, enqueue=True)
     session_id = uuid.uuid4()
     bound_logger = logger.bind(session_id=session_id)
     globals()["logger"] = bound_logger
     return str(session_id)
 
 
-def process_single_image(cfg: Settings):
+def preload_models(cfg: "Settings") -> None:
+    """Load models up front when configured, so per-image latency reflects inference only."""
+    from src.dl_models.model_utils import ModelRegistry
+
+    edge_cfg = cfg.edge_detection
+    if edge_cfg.piotr_preload and "piotr" in edge_cfg.methods:
+        ModelRegistry.structured_edge_model(
+            edge_cfg.piotr_model_path,
+            sha256=edge_cfg.piotr_model_sha256,
+            offline=edge_cfg.piotr_offline
+        )
+        logger.info(f"Preloaded Piotr model: {edge_cfg.piotr_model_path}")
+
+
+def config_problems(cfg: "Settings") -> List[str]:
+    """Problems a valid config would still hit at run time (missing files)."""
+    problems = []
+    if not os.path.isfile(cfg.image_path):
+        problems.append(f"image_path does not exist: {cfg.image_path}")
+    edge_cfg = cfg.edge_detection
+    if "piotr" in edge_cfg.methods and edge_cfg.piotr_offline and not os.path.isfile(edge_cfg.piotr_model_path):
+        problems.append(f"piotr_offline is set but the model is missing: {edge_cfg.piotr_model_path}")
+    return problems
+
+
+def process_single_image(cfg: "Settings"):
     """Process a single image through the analysis pipeline."""
+    from src.pipeline import main as pipeline_main
+
     logger.info("Running analysis on: %s", cfg.image_path)
     
     # Sanity checks
@@ -139,70 +193,86 @@ def process_single_image(cfg: Settings):
     return results
 
 
-def process_benchmark_image(img_path: str, target_size: Tuple[int, int], cfg: Settings, output_dir: str):
+def process_benchmark_image(img_path: str, target_size: Tuple[int, int], cfg: "Settings", output_dir: str):
     """Process a single image for benchmarking across multiple strategies."""
+    from src.analyzer.cache import FeatureCache
+    from src.analyzer.preprocessing import preprocess_image
+    from src.analyzer.features.base import FeatureExtractor
+    from src.pipeline import draft_decode
+    from src.analyzer.report.report_generator import VisualWriter, log_stats, save_visual_map, summarize_stats
+
     img_name = os.path.splitext(os.path.basename(img_path))[0]
     logger.info(f"\n[IMAGE] Processing: {img_name}")
     
-    image_data = preprocess_image(img_path, target_size)
+    cache = FeatureCache.from_config(cfg.cache)
+    image_data = preprocess_image(
+        img_path, target_size, draft_decode=draft_decode(cfg), cache_keys=cache is not None
+    )
     report: Dict[str, Any] = {}
 
-    for strategy in STRATEGIES:
-        # Build per-strategy config objects
-        color_cfg = cfg.color_detection.model_copy(update={"salience_strategy": strategy})
-        edge_cfg = cfg.edge_detection
-
-        # Instantiate extractor
-        extractor = FeatureExtractor(
-            enable_color=True,
-            enable_edges=True,
-            enable_objects=False,
-            enable_saliency=False,
-            use_dl_models=False,
-            color_detector_config=color_cfg,
-            edge_detector_config=edge_cfg
-        )
-
-        # Run extraction
-        features = extractor.extract(image_data)
-        color = features.get("color", {})
-
-        # Register benchmark results
-        DesignRegistry.register(
-            module="Benchmarking",
-            component="Strategy Comparison",
-            concept="Strategy Run",
-            technique=strategy,
-            tuning_params={
-                "image_name": img_name,
-                "strategy": strategy,
-                "color_salience_strategy": color_cfg.salience_strategy,
-                "edge_intra_fusion_strategy": edge_cfg.intra_fusion_strategy,
-                "features_extracted": list(features.keys())
-            }
-        )
+    # Cue maps are strategy-independent: extract them once and only re-run
+    # color intra-fusion for each strategy.
+    color_cfg = cfg.color_detection
+    edge_cfg = cfg.edge_detection
+    extractor = FeatureExtractor(
+        enable_color=True,
+        enable_edges=True,
+        enable_objects=False,
+        enable_saliency=False,
+        use_dl_models=False,
+        color_detector_config=color_cfg,
+        edge_detector_config=edge_cfg,
+        max_workers=cfg.max_workers,
+        cache=cache
+    )
+    sweep = extractor.sweep(image_data, STRATEGIES)
+    writer = VisualWriter()
+    try:
+        for strategy in STRATEGIES:
+            features = sweep[strategy]
+            color = features.get("color", {})
+
+            # Register benchmark results
+            DesignRegistry.register(
+                module="Benchmarking",
+                component="Strategy Comparison",
+                concept="Strategy Run",
+                technique=strategy,
+                tuning_params={
+                    "image_name": img_name,
+                    "strategy": strategy,
+                    "color_salience_strategy": strategy,
+                    "edge_intra_fusion_strategy": edge_cfg.intra_fusion_strategy,
+                    "features_extracted": list(features.keys())
+                }
+            )
 
-        # Process results
-        report[strategy] = {}
-        for feature_name, feature_data in color.items():
-            if isinstance(feature_data, dict) and "map" in feature_data:
-                map_data = feature_data["map"]
-                if map_data is not None:
-                    stats = summarize_stats(map_data)
-                    report[strategy][feature_name] = stats
-                    log_stats(img_name, strategy, stats)
-
-                    # Save visualizations
-                    output_path = os.path.join(
-                        output_dir, f"{img_name}_{strategy}_{feature_name}.png"
-                    )
-                    save_visual_map(
-                        feature_map=map_data,
-                        output_path=output_path,
-                        title=f"{feature_name} ({strategy})",
-                        cmap="viridis",
-                        save_visuals=True
-                    )
+            # Process results
+            report[strategy] = {}
+            for feature_name, feature_data in color.items():
+                if isinstance(feature_data, dict) and "map" in feature_data:
+                    map_data = feature_data["map"]
+                    if map_data is not None:
+                        stats = summarize_stats(map_data)
+                        report[strategy][feature_name] = stats
+                        log_stats(img_name, strategy, stats)
+
+                        # Save visualizations
+                        output_path = os.path.join(
+                            output_dir, f"{img_name}_{strategy}_{feature_name}.png"
+                        )
+                        save_visual_map(
+                            feature_map=map_data,
+                            output_path=output_path,
+                            title=f"{feature_name} ({strategy})",
+                            cmap="viridis",
+                            save_visuals=True,
+                            backend=cfg.visual_backend,
+                            show_title=cfg.visual_titles,
+                            writer=writer
+                        )
+    finally:
+        writer.close()
 
     # Save report
     report_path = os.path.join(output_dir, f"{img_name}_benchmark_report.json")
@@ -211,7 +281,7 @@ def process_benchmark_image(img_path: str, target_size: Tuple[int, int], cfg: Se
     logger.info(f"[SAVED] Benchmark report: {report_path}")
 
 
-def run_benchmark(cfg: Settings, target_size: Tuple[int, int], input_dir: str, output_dir: str):
+def run_benchmark(cfg: "Settings", target_size: Tuple[int, int], input_dir: str, output_dir: str):
     """Run benchmarking across all images in the input directory."""
     logger.info(f"Starting benchmark with target size: {target_size}")
     
@@ -256,8 +326,287 @@ def run_benchmark(cfg: Settings, target_size: Tuple[int, int], input_dir: str, o
     logger.info("Benchmark completed successfully")
 
 
+def run_rarity_benchmark(
+    cfg: "Settings",
+    target_size: Tuple[int, int],
+    input_dir: str,
+    output_dir: str,
+    engines: Optional[Tuple[str, ...]] = None
+):
+    """
+    Compare rarity engines for speed and fidelity against the full-pixel
+    KMeans reference, on the configured color analysis resolution.
+    engines: defaults to every engine in RARITY_ENGINES.
+    """
+    import numpy as np
+    from src.analyzer.preprocessing import preprocess_image
+    from src.analyzer.features.color_detection.base import ColorDetector
+    from src.pipeline import draft_decode
+    from src.analyzer.features.color_detection.transforms import RARITY_ENGINES, compute_color_rarity
+
+    engines = engines or RARITY_ENGINES
+    logger.info(f"Starting rarity engine benchmark: {', '.join(engines)}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    color_cfg = cfg.color_detection
+    detector = ColorDetector(color_cfg)
+    ordered = ("kmeans",) + tuple(e for e in engines if e != "kmeans")
+    report: Dict[str, Any] = {"reference": "kmeans", "images": {}, "summary": {}}
+
+    for filename in sorted(os.listdir(input_dir)):
+        if not filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+            continue
+        img_name = os.path.splitext(filename)[0]
+        image_data = preprocess_image(
+            os.path.join(input_dir, filename), target_size, draft_decode=draft_decode(cfg)
+        )
+        bgr_img = detector.analysis_image(image_data)
+
+        reference: Optional["np.ndarray"] = None
+        results: Dict[str, Any] = {}
+        for engine in ordered:
+            start = time.perf_counter()
+            rarity = compute_color_rarity(
+                bgr_img,
+                space=color_cfg.rarity_space,
+                k=color_cfg.rarity_k,
+                engine=engine,
+                seed=color_cfg.rarity_seed,
+                sample_size=color_cfg.rarity_sample_size,
+                bins=color_cfg.rarity_bins
+            )
+            seconds = time.perf_counter() - start
+            if reference is None:
+                reference = rarity
+            results[engine] = {
+                "seconds": seconds,
+                "pearson": float(np.corrcoef(reference.ravel(), rarity.ravel())[0, 1]),
+                "mae": float(np.mean(np.abs(reference - rarity)))
+            }
+            logger.info(f"[RARITY] {img_name} | {engine}: {seconds:.3f}s, pearson={results[engine]['pearson']:.3f}")
+        report["images"][img_name] = results
+
+    for engine in ordered:
+        runs = [img[engine] for img in report["images"].values()]
+        if not runs:
+            continue
+        summary = {key: float(np.mean([run[key] for run in runs])) for key in ("seconds", "pearson", "mae")}
+        summary["speedup"] = report["summary"]["kmeans"]["seconds"] / summary["seconds"] if engine != "kmeans" else 1.0
+        report["summary"][engine] = summary
+        DesignRegistry.register(
+            module="Benchmarking",
+            component="Rarity Engines",
+            concept="Engine Comparison",
+            technique=engine,
+            tuning_params=summary
+        )
+
+    report_path = os.path.join(output_dir, "rarity_benchmark_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2, cls=NumpyEncoder)
+    logger.info(f"[SAVED] Rarity benchmark report: {report_path}")
+    return report
+
+
+def resolve_batch_items(source: str) -> List[Dict[str, Any]]:
+    """
+    Expand a batch source into items of the form {"image": path, "overrides": {...}}.
+
+    source may be:
+    - a directory: every image file directly inside it
+    - a glob pattern (e.g. "shoot/**/*.jpg")
+    - a JSONL manifest: one {"image": path, "overrides": {...}} object per line,
+      with relative image paths resolved against the manifest's directory
+    """
+    if os.path.isdir(source):
+        paths = sorted(
+            os.path.join(source, f) for f in os.listdir(source)
+            if f.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        return [{"image": os.path.abspath(p), "overrides": {}} for p in paths]
+
+    if os.path.isfile(source) and source.lower().endswith(".jsonl"):
+        base = os.path.dirname(os.path.abspath(source))
+        items = []
+        with open(source, "r") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "image" not in entry:
+                    raise ValueError(f"Manifest line {line_no} has no 'image' field: {source}")
+                items.append({
+                    "image": os.path.abspath(os.path.join(base, entry["image"])),
+                    "overrides": entry.get("overrides", {})
+                })
+        return items
+
+    paths = sorted(
+        p for p in glob.glob(source, recursive=True)
+        if p.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not paths:
+        raise FileNotFoundError(f"No images found for batch input: {source}")
+    return [{"image": os.path.abspath(p), "overrides": {}} for p in paths]
+
+
+def batch_item_id(item: Dict[str, Any]) -> str:
+    """Stable id of a batch item: its image path plus its config overrides."""
+    key = json.dumps({"image": item["image"], "overrides": item["overrides"]}, sort_keys=True)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+def read_batch_journal(journal_path: str) -> Set[str]:
+    """Ids of items that completed successfully in a previous run."""
+    completed: Set[str] = set()
+    if not os.path.isfile(journal_path):
+        return completed
+    with open(journal_path, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # a crash mid-write leaves at most one truncated trailing line
+                continue
+            if entry.get("status") == "ok":
+                completed.add(entry["id"])
+    return completed
+
+
+def open_batch_journal(journal_path: str) -> IO[str]:
+    """
+    Open the journal for appending. A truncated last line left by a crash
+    mid-write is cut off first, so the next entry starts on a line of its own.
+    """
+    if os.path.isfile(journal_path):
+        with open(journal_path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+    return open(journal_path, "a")
+
+
+def analyze_batch_item(item: Dict[str, Any], base_cfg: Dict[str, Any], output_dir: str) -> Dict[str, Any]:
+    """
+    Analyze one batch item in a worker process.
+    Returns a JSON-serializable summary; feature arrays stay on disk as visuals.
+    """
+    import numpy as np
+    from src.betteredit.config import Settings
+    from src.pipeline import run as pipeline_run
+    from src.analyzer.report.report_generator import summarize_stats
+    from src.analyzer.features.workspace import Workspace
+
+    start = time.perf_counter()
+    cfg_dict = deep_merge(base_cfg, item["overrides"])
+    cfg_dict["image_path"] = item["image"]
+    cfg_dict["output_dir"] = os.path.join(output_dir, item["name"])
+    summary: Dict[str, Any] = {"id": item["id"], "image": item["image"], "output_dir": cfg_dict["output_dir"]}
+
+    try:
+        cfg = Settings(**cfg_dict)
+        os.makedirs(cfg_dict["output_dir"], exist_ok=True)
+
+        # One registry per image: workers are reused across items
+        DesignRegistry.reset()
+        features = pipeline_run(cfg.image_path, tuple(cfg.target_size), cfg)
+        DesignRegistry.to_json(os.path.join(cfg_dict["output_dir"], "analysis_design_registry.json"))
+
+        summary["status"] = "ok"
+        summary["stats"] = {
+            section: summarize_stats(result["salience"])
+            for section, result in features.items()
+            if isinstance(result, dict) and isinstance(result.get("salience"), np.ndarray)
+        }
+    except Exception as e:
+        summary["status"] = "error"
+        summary["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        # the next item may have another size: do not pin this one's scratch buffers
+        Workspace.release_idle()
+
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def run_batch(
+    cfg: "Settings",
+    source: str,
+    output_dir: str,
+    workers: int = 1,
+    journal_path: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Analyze every image of a batch source across a process pool.
+
+    Results are appended to a JSONL journal as each image finishes; images
+    already journaled as "ok" are skipped, so an interrupted run resumes
+    where it stopped.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    journal_path = journal_path or os.path.join(output_dir, BATCH_JOURNAL_NAME)
+
+    items = resolve_batch_items(source)
+    names = [os.path.splitext(os.path.basename(item["image"]))[0] for item in items]
+    for item, name in zip(items, names):
+        item["id"] = batch_item_id(item)
+        # disambiguate repeated basenames (same file name or same image with overrides)
+        item["name"] = name if names.count(name) == 1 else f"{name}_{item['id']}"
+
+    completed = read_batch_journal(journal_path)
+    pending = [item for item in items if item["id"] not in completed]
+    logger.info(f"[BATCH] {len(items)} images, {len(items) - len(pending)} already done, {len(pending)} to process with {workers} workers")
+
+    DesignRegistry.register(
+        module="Batch",
+        component="Session",
+        concept="Batch Start",
+        technique="process_pool",
+        tuning_params={
+            "source": source,
+            "output_dir": output_dir,
+            "journal_path": journal_path,
+            "workers": workers,
+            "images_total": len(items),
+            "images_resumed": len(items) - len(pending)
+        }
+    )
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    base_cfg = cfg.model_dump()
+    results: List[Dict[str, Any]] = []
+    with open_batch_journal(journal_path) as journal, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(analyze_batch_item, item, base_cfg, output_dir) for item in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            journal.write(json.dumps(result, cls=NumpyEncoder) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+            results.append(result)
+            if result["status"] == "ok":
+                logger.info(f"[BATCH] {len(results)}/{len(pending)} done: {result['image']} ({result['seconds']:.2f}s)")
+            else:
+                logger.error(f"[BATCH] {len(results)}/{len(pending)} failed: {result['image']}: {result['error']}")
+
+    failed = sum(1 for r in results if r["status"] != "ok")
+    DesignRegistry.register(
+        module="Batch",
+        component="Session",
+        concept="Batch Complete",
+        technique="process_pool",
+        tuning_params={
+            "images_processed": len(results) - failed,
+            "images_failed": failed
+        }
+    )
+    return results
+
+
 def main():
     parser = argparse.ArgumentParser(description="betteredit CLI")
+    parser.add_argument("--log-level", required=False, default="INFO", type=str.upper, help="Console log level (e.g. DEBUG, INFO, WARNING).")
+    parser.add_argument("--log-json", required=False, help="Also write every log record, DEBUG included, as JSON lines to this path.")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     # Analyze command
@@ -281,10 +630,61 @@ def main():
     benchmark_parser.add_argument("--output-dir", required=False, default=BENCHMARK_OUTPUT_DIR, help="Directory to write outputs.")
     benchmark_parser.add_argument("--target-size", required=False, default="512,224", help="Target size as W,H (e.g., 512,224)")
 
+    # Batch analyze command
+    batch_parser = subparsers.add_parser(
+        "analyze-batch",
+        help="Analyze many images in parallel with resumable progress.",
+        description="Analyze a directory, glob or JSONL manifest of images across a process pool."
+    )
+    batch_parser.add_argument("--input", required=True, help="Directory, glob pattern, or JSONL manifest ({\"image\": ..., \"overrides\": {...}} per line).")
+    batch_parser.add_argument("--config", required=False, help="Path to YAML config file.")
+    batch_parser.add_argument("--output-dir", required=False, default=BATCH_OUTPUT_DIR, help="Directory to write per-image outputs.")
+    batch_parser.add_argument("--workers", required=False, type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+    batch_parser.add_argument("--journal", required=False, help=f"Progress journal path (default: <output-dir>/{BATCH_JOURNAL_NAME}).")
+
+    # Rarity engine benchmark command
+    rarity_parser = subparsers.add_parser(
+        "benchmark-rarity",
+        help="Compare color rarity engines for speed and fidelity.",
+        description="Benchmark color rarity engines against the full-pixel KMeans reference."
+    )
+    rarity_parser.add_argument("--input-dir", required=False, default=BENCHMARK_INPUT_DIR, help="Directory of images to benchmark.")
+    rarity_parser.add_argument("--config", required=False, help="Path to YAML config file.")
+    rarity_parser.add_argument("--output-dir", required=False, default=RARITY_BENCHMARK_OUTPUT_DIR, help="Directory to write outputs.")
+    rarity_parser.add_argument("--target-size", required=False, default="512,224", help="Target size as W,H (e.g., 512,224)")
+    rarity_parser.add_argument("--engines", required=False, help="Comma-separated rarity engines to compare (default: all).")
+
+    # Config check command
+    check_parser = subparsers.add_parser(
+        "check-config",
+        help="Validate a config without running any analysis.",
+        description="Merge and validate the settings, and report missing files they reference."
+    )
+    check_parser.add_argument("--config", required=False, help="Path to YAML config file.")
+    check_parser.add_argument("--image", required=False, help="Image path override to check.")
+    check_parser.add_argument("--show", action="store_true", help="Print the merged, validated settings as YAML.")
+
+    # Analysis server command
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Run a long-lived analysis server with warm models and caches.",
+        description="Serve POST /analyze over HTTP (TCP or Unix socket) with a bounded request queue."
+    )
+    serve_parser.add_argument("--config", required=False, help="Path to YAML config file.")
+    serve_parser.add_argument("--host", required=False, default="127.0.0.1", help="Host to bind (ignored with --socket).")
+    serve_parser.add_argument("--port", required=False, type=int, default=8765, help="TCP port to bind (ignored with --socket).")
+    serve_parser.add_argument("--socket", required=False, help="Unix socket path to listen on instead of TCP.")
+    serve_parser.add_argument("--workers", required=False, type=int, default=1, help="Number of analysis worker threads.")
+    serve_parser.add_argument("--queue-size", required=False, type=int, default=8, help="Maximum queued requests before answering 503.")
+    serve_parser.add_argument("--output-dir", required=False, default=SERVER_OUTPUT_DIR, help="Directory for per-request outputs.")
+    serve_parser.add_argument("--timeout", required=False, type=float, help="Seconds a request may wait for its result.")
+    serve_parser.add_argument("--input-root", required=False, help="Directory request image paths must lie in (default: working directory).")
+    serve_parser.add_argument("--max-body-bytes", required=False, type=int, default=SERVER_MAX_BODY_BYTES, help="Largest accepted request body; larger ones get 413.")
+
     args = parser.parse_args()
 
     # Setup logging and session
-    session_id = setup_logging()
+    session_id = setup_logging(args.log_level, args.log_json)
 
     try:
         if args.command == "analyze":
@@ -294,6 +694,7 @@ def main():
                 output_dir=args.output_dir
             )
             DesignRegistry.start_session(session_id, cfg.model_dump())
+            preload_models(cfg)
 
             # NEW: Set up analysis-specific output directories
             if args.output_dir:
@@ -349,8 +750,85 @@ def main():
                 output_dir=args.output_dir
             )
             DesignRegistry.start_session(session_id, cfg.model_dump())
+            preload_models(cfg)
             run_benchmark(cfg, target_size, args.input_dir, args.output_dir)
 
+        elif args.command == "analyze-batch":
+            if args.workers < 1:
+                logger.error(f"--workers must be >= 1, got: {args.workers}")
+                sys.exit(1)
+
+            cfg = load_settings(
+                config_path=args.config,
+                output_dir=args.output_dir
+            )
+            DesignRegistry.start_session(session_id, cfg.model_dump())
+            results = run_batch(cfg, args.input, args.output_dir, workers=args.workers, journal_path=args.journal)
+            DesignRegistry.to_json(os.path.join(args.output_dir, "batch_design_registry.json"))
+            if any(r["status"] != "ok" for r in results):
+                sys.exit(1)
+
+        elif args.command == "benchmark-rarity":
+            try:
+                w, h = map(int, args.target_size.split(","))
+                target_size = (w, h)
+            except ValueError:
+                logger.error("TARGET_SIZE must be 'W,H' format, got: %s", args.target_size)
+                sys.exit(1)
+
+            from src.analyzer.features.color_detection.transforms import RARITY_ENGINES
+
+            engines = tuple(e.strip() for e in (args.engines or ",".join(RARITY_ENGINES)).split(",") if e.strip())
+            unknown = [e for e in engines if e not in RARITY_ENGINES]
+            if unknown:
+                logger.error(f"Unknown rarity engines: {unknown}")
+                sys.exit(1)
+
+            cfg = load_settings(
+                config_path=args.config,
+                output_dir=args.output_dir
+            )
+            DesignRegistry.start_session(session_id, cfg.model_dump())
+            run_rarity_benchmark(cfg, target_size, args.input_dir, args.output_dir, engines)
+            DesignRegistry.to_json(os.path.join(args.output_dir, "rarity_benchmark_design_registry.json"))
+
+        elif args.command == "check-config":
+            cfg = load_settings(config_path=args.config, image_path=args.image)
+            problems = config_problems(cfg)
+            for problem in problems:
+                logger.warning(f"[CONFIG] {problem}")
+            if args.show:
+                import yaml
+
+                print(yaml.safe_dump(cfg.model_dump(), sort_keys=False), end="")
+            logger.info(f"[CONFIG] Settings are valid ({len(problems)} warnings)")
+
+        elif args.command == "serve":
+            if args.workers < 1 or args.queue_size < 1:
+                logger.error("--workers and --queue-size must be >= 1")
+                sys.exit(1)
+
+            # Imported here: the server module imports this one
+            from src.betteredit.server import serve
+
+            cfg = load_settings(
+                config_path=args.config,
+                output_dir=args.output_dir
+            )
+            DesignRegistry.start_session(session_id, cfg.model_dump())
+            serve(
+                cfg,
+                host=args.host,
+                port=args.port,
+                socket_path=args.socket,
+                workers=args.workers,
+                queue_size=args.queue_size,
+                output_dir=args.output_dir,
+                request_timeout=args.timeout,
+                input_root=args.input_root,
+                max_body_bytes=args.max_body_bytes
+            )
+
         else:
             parser.print_help()
             sys.exit(1)
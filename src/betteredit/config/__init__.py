@@ -1,3 +1,12 @@
 from .settings import *
 
-settings = Settings.load()
\ No newline at end of file
+# `settings` names the default Settings, loaded on first use rather than on
+# import; drop the submodule binding the import above left in its place
+del globals()["settings"]
+
+
+def __getattr__(name):
+    if name == "settings":
+        globals()["settings"] = Settings.load()
+        return globals()["settings"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,9 +1,9 @@
 # src/config/settings.py
 
+import os
 import yaml
-from typing import Dict, List, Optional, Tuple, Union
-from pydantic_settings import BaseSettings
-from pydantic import BaseModel, Field, field_validator
+from typing import Any, Dict, List, Optional, Tuple, Union
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 from pathlib import Path
 
 
@@ -13,12 +13,18 @@ class EdgeDetectionConfig(BaseModel):
     sobel_ksize: int = Field(..., ge=1, description="kernel size for Sobel filter")
     laplacian_ksize: int = Field(..., ge=1, description="kernel size for Laplacian filter")
     piotr_model_path: str
+    piotr_model_sha256: Optional[str] = Field(default=None, description="Expected SHA-256 of the Piotr model file")
+    piotr_offline: bool = Field(default=False, description="Never download the Piotr model; require it at piotr_model_path")
+    piotr_preload: bool = Field(default=False, description="Load the Piotr model at CLI startup")
     return_density: bool
     return_salience: bool
     salience_strategy: str
     density_window_size: int = Field(..., ge=1)
+    density_window_sizes: Optional[List[int]] = Field(default=None, description="Window sizes for multi-scale density, e.g. [8, 16, 32]; overrides density_window_size. All scales share one integral image")
+    crop_padding: bool = Field(default=True, description="Run extractors and density/salience on the letterboxed content only; padding reads as zero and is excluded from normalization")
     intra_fusion_strategy: str
     intra_fusion_weights: Dict[str, float]
+    max_workers: int = Field(default=1, ge=1, description="Threads for running edge methods concurrently (1 = serial)")
 
     @field_validator("intra_fusion_weights")
     @classmethod
@@ -27,6 +33,25 @@ class EdgeDetectionConfig(BaseModel):
             raise ValueError("intra_fusion_weights must sum to 1.0")
         return v
 
+    @field_validator("density_window_sizes")
+    @classmethod
+    def validate_density_window_sizes(cls, v):
+        if v is not None and (not v or min(v) < 1):
+            raise ValueError("density_window_sizes must be a non-empty list of positive integers")
+        return v
+
+
+class RoiRefinementConfig(BaseModel):
+    enabled: bool = Field(default=False, description="Coarse-to-fine rarity: fit the rarity model and fuse all cues at a coarse pyramid level, then recompute rarity at the analysis resolution only inside the most salient regions")
+    coarse_level: int = Field(default=2, ge=1, le=6, description="Gaussian pyramid level of the coarse pass (1/4^L of the pixels)")
+    salience_quantile: float = Field(default=0.9, ge=0, lt=1, description="Coarse salience quantile above which pixels are regions of interest (0.9 keeps the top 10%)")
+    margin: int = Field(default=0, ge=0, description="Pixels, at the analysis resolution, regions of interest are grown by (their upsampled edges are feathered either way)")
+
+
+# cues combine_cues fuses into the color salience, and their `weights` keys
+FUSION_WEIGHT_KEYS = {"hue_contrast": "hue", "saturation": "sat", "rarity": "rarity", "luminance_contrast": "lum"}
+FUSED_COLOR_CUES = tuple(FUSION_WEIGHT_KEYS)
+
 
 class ColorDetectionConfig(BaseModel):
     salience_strategy: str
@@ -34,11 +59,94 @@ class ColorDetectionConfig(BaseModel):
     sobel_weight: float = Field(..., ge=0, le=1)
     rarity_space: str
     rarity_k: int = Field(..., ge=1)
+    rarity_engine: str = Field(default="kmeans", description="Rarity engine: 'kmeans', 'sampled', 'minibatch' or 'histogram'")
+    rarity_seed: int = 0
+    rarity_sample_size: int = Field(default=50_000, ge=1, description="Stratified pixel sample size for the sampled engine")
+    rarity_bins: int = Field(default=32, ge=2, description="Bins per axis for the histogram engine")
     weights: Dict[str, float]
     return_density: bool = True
     return_salience: bool = True
     density_window_size: int = 16
+    density_window_sizes: Optional[List[int]] = Field(default=None, description="Window sizes for multi-scale density, e.g. [8, 16, 32]; overrides density_window_size. All scales share one integral image")
     hue_contrast_sigma: float = 1.0
+    contrast_pyramid_level: int = Field(default=0, ge=0, le=6, description="Gaussian pyramid level hue contrast's neighbourhood mean is computed at (0 = full resolution; level L blurs 1/4^L of the pixels and upsamples, a close approximation once hue_contrast_sigma >= 2^L)")
+    analysis_resolution: str = Field(default="original", description="Resolution color cues run at: 'original', 'padded' (target_size, aligned with edge maps) or 'max_pixels'")
+    analysis_max_pixels: int = Field(default=2_000_000, ge=1, description="Pixel budget for analysis_resolution='max_pixels'")
+    crop_padding: bool = Field(default=True, description="With analysis_resolution 'padded': compute cues on the letterboxed content only; padding reads as zero and is excluded from normalization")
+    upsample_to_original: bool = Field(default=False, description="Upsample 'max_pixels' outputs back to the original resolution")
+    max_workers: int = Field(default=1, ge=1, description="Threads for computing color cues concurrently (1 = serial)")
+    cues: Optional[List[str]] = Field(default=None, description="Cues to compute and fuse, e.g. ['saturation', 'luminance_contrast'] (all when unset); the 'minimal', 'boosted' and 'full' strategies need hue_contrast and saturation")
+    roi_refinement: RoiRefinementConfig = Field(default_factory=RoiRefinementConfig, description="Coarse-to-fine rarity (see RoiRefinementConfig)")
+
+    @field_validator("rarity_engine")
+    @classmethod
+    def validate_rarity_engine(cls, v):
+        if v not in ["kmeans", "sampled", "minibatch", "histogram"]:
+            raise ValueError("rarity_engine must be 'kmeans', 'sampled', 'minibatch' or 'histogram'")
+        return v
+
+    @field_validator("analysis_resolution")
+    @classmethod
+    def validate_analysis_resolution(cls, v):
+        if v not in ["original", "padded", "max_pixels"]:
+            raise ValueError("analysis_resolution must be 'original', 'padded' or 'max_pixels'")
+        return v
+
+    @field_validator("density_window_sizes")
+    @classmethod
+    def validate_density_window_sizes(cls, v):
+        if v is not None and (not v or min(v) < 1):
+            raise ValueError("density_window_sizes must be a non-empty list of positive integers")
+        return v
+
+    @field_validator("cues")
+    @classmethod
+    def validate_cues(cls, v):
+        allowed = ["hue", "saturation", "luminance", "rarity", "hue_contrast", "luminance_contrast"]
+        if v is not None and (not v or any(cue not in allowed for cue in v)):
+            raise ValueError(f"cues must be a non-empty list of {allowed}")
+        if v is not None and not set(v) & set(FUSED_COLOR_CUES):
+            raise ValueError(f"cues must include one of the fused cues {list(FUSED_COLOR_CUES)}")
+        return v
+
+    @model_validator(mode="after")
+    def check_rarity_sample_size(self):
+        if self.rarity_sample_size < self.rarity_k:
+            raise ValueError("rarity_sample_size must be at least rarity_k")
+        return self
+
+    @model_validator(mode="after")
+    def check_cues_fusable(self):
+        cues = FUSED_COLOR_CUES if self.cues is None else [cue for cue in FUSED_COLOR_CUES if cue in self.cues]
+        if self.salience_strategy in ("minimal", "boosted", "full") and not {"hue_contrast", "saturation"} <= set(cues):
+            raise ValueError(f"salience_strategy '{self.salience_strategy}' needs the hue_contrast and saturation cues")
+        if self.salience_strategy == "weighted" and sum(self.weights.get(FUSION_WEIGHT_KEYS[cue], 0.0) for cue in cues) <= 0:
+            raise ValueError(f"weights of the fused cues {list(cues)} must not all be zero")
+        return self
+
+
+class PreviewConfig(BaseModel):
+    target_scale: float = Field(default=0.25, gt=0, le=1, description="Preview target_size as a fraction of target_size")
+    edge_methods: List[str] = Field(default=["sobel"], description="Edge methods run for the preview (equally weighted)")
+    color_cues: List[str] = Field(default=["saturation", "luminance_contrast"], description="Color cues computed and fused (weighted) for the preview")
+
+    @field_validator("edge_methods")
+    @classmethod
+    def validate_edge_methods(cls, v):
+        allowed = ["canny", "sobel", "laplacian", "piotr"]
+        if not v or any(method not in allowed for method in v):
+            raise ValueError(f"edge_methods must be a non-empty list of {allowed}")
+        return v
+
+    @field_validator("color_cues")
+    @classmethod
+    def validate_color_cues(cls, v):
+        allowed = ["hue", "saturation", "luminance", "rarity", "hue_contrast", "luminance_contrast"]
+        if not v or any(cue not in allowed for cue in v):
+            raise ValueError(f"color_cues must be a non-empty list of {allowed}")
+        if not set(v) & set(FUSED_COLOR_CUES):
+            raise ValueError(f"color_cues must include one of the fused cues {list(FUSED_COLOR_CUES)}")
+        return v
 
 
 class NeuralInterFusionConfig(BaseModel):
@@ -61,19 +169,89 @@ class NeuralInterFusionConfig(BaseModel):
         return v
 
 
-class Settings(BaseSettings):
+class ProfilingConfig(BaseModel):
+    enabled: bool = Field(default=False, description="Record wall/CPU time per pipeline stage and cue")
+    trace_memory: bool = Field(default=False, description="Also record the process-wide peak of allocated bytes during each main-thread stage via tracemalloc (slows NumPy-heavy stages)")
+    chrome_trace: bool = Field(default=False, description="Write <output_dir>/<image>_trace.json in Chrome trace-event format")
+
+
+class CacheConfig(BaseModel):
+    enabled: bool = Field(default=False, description="Reuse cue maps and blocks from an on-disk cache keyed by image content and the config fields each stage depends on")
+    directory: str = Field(default="~/.cache/betteredit/features", description="Cache directory")
+    max_bytes: int = Field(default=2 * 1024 ** 3, ge=0, description="Size cap; least recently used entries are evicted above it")
+
+
+class TilingConfig(BaseModel):
+    enabled: bool = Field(default=False, description="Analyze large originals tile by tile into disk-backed arrays, bounding memory by tile size (color cues at analysis_resolution 'original')")
+    tile_size: int = Field(default=1024, ge=64, description="Tile edge length in pixels, excluding the filter halo")
+    min_pixels: int = Field(default=50_000_000, ge=1, description="Only originals with at least this many pixels are tiled")
+    directory: Optional[str] = Field(default=None, description="Directory for the disk-backed original and output arrays (system temp dir when unset)")
+
+
+class IncrementalConfig(BaseModel):
+    tile_size: int = Field(default=256, ge=16, description="Tile edge length in pixels for diffing an edited image against the previous version")
+    tolerance: float = Field(default=0.02, ge=0, description="Relative change a normalization range or the rarity model must exceed before it is recomputed")
+    diff_threshold: int = Field(default=0, ge=0, le=255, description="Per-channel pixel difference below which a tile counts as unchanged (raise for re-encoded JPEGs)")
+
+
+class Settings(BaseModel):
+    """
+    Top-level settings. Environment variables named like a field (any case)
+    fill the fields not given, as with pydantic-settings' BaseSettings;
+    pydantic_settings is imported only when one is set, since importing it
+    alone takes longer than a whole `check-config`.
+    """
+
+    model_config = ConfigDict(extra="forbid", validate_default=True)
+
     image_path: str
     target_size: Tuple[int, int]
     save_visuals: bool
     output_dir: Optional[str] = None
+    max_workers: int = Field(default=1, ge=1, description="Threads for running detectors concurrently (1 = serial)")
+    visual_backend: str = Field(default="lut", description="Map rendering backend: 'lut' (fast colormap lookup) or 'matplotlib' (figures with axes)")
+    visual_titles: bool = Field(default=False, description="Draw map titles on images rendered by the 'lut' backend")
 
     edge_detection: EdgeDetectionConfig
     color_detection: ColorDetectionConfig
     neural_inter_fusion: NeuralInterFusionConfig
+    profiling: ProfilingConfig = Field(default_factory=ProfilingConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    tiling: TilingConfig = Field(default_factory=TilingConfig)
+    preview: PreviewConfig = Field(default_factory=PreviewConfig)
+    incremental: IncrementalConfig = Field(default_factory=IncrementalConfig)
+
+    @field_validator("visual_backend")
+    @classmethod
+    def validate_visual_backend(cls, v):
+        if v not in ["lut", "matplotlib"]:
+            raise ValueError("visual_backend must be 'lut' or 'matplotlib'")
+        return v
+
+    @model_validator(mode="before")
+    @classmethod
+    def read_environment(cls, data: Any) -> Any:
+        if not isinstance(data, dict):
+            return data
+        names = set(cls.model_fields)
+        if not any(key.lower() in names for key in os.environ):
+            return data
+        from pydantic_settings import EnvSettingsSource
+        return _deep_update(EnvSettingsSource(cls)(), data)
 
     @classmethod
     def load(cls, path: Optional[Union[Path, str]] = None) -> "Settings":
         # Load all settings from single settings.yaml file
         main_cfg = Path(path or __file__).parent / "settings.yaml"
         main_data = yaml.safe_load(main_cfg.read_text())
-        return cls(**main_data)
\ No newline at end of file
+        return cls(**main_data)
+
+
+def _deep_update(base: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """base with update merged in; nested dicts are merged key by key, update wins."""
+    merged = dict(base)
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = _deep_update(merged[key], value)
+        merged[key] = value
+    return merged
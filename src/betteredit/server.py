@@ -0,0 +1,459 @@
+"""
+betteredit analysis server
+
+Long-running HTTP service that keeps imports, settings, models and feature
+extractors warm between requests:
+
+    python -m betteredit serve --port 8765
+    python -m betteredit serve --socket /tmp/betteredit.sock
+
+Endpoints:
+    GET  /health   -> {"status": "ok", "queued": n, "workers": n, "queue_size": n}
+    POST /analyze  -> analysis result (see AnalysisService.analyze)
+
+Requests are handled by a fixed pool of worker threads fed from a bounded
+queue; when the queue is full the server answers 503 with Retry-After instead
+of accepting unbounded work, and bodies above the size limit are answered 413
+before they are read. Client-supplied paths are confined to the input
+root (image_path) and the server output directory (output_dir).
+"""
+
+import os
+import json
+import uuid
+import queue
+import base64
+import socket
+import hashlib
+import tempfile
+import threading
+import socketserver
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from loguru import logger
+
+from src.betteredit.config import Settings
+from src.betteredit.cli import SERVER_MAX_BODY_BYTES, NumpyEncoder, deep_merge, preload_models
+from src.pipeline import run as pipeline_run
+from src.analyzer.cache import FeatureCache
+from src.analyzer.features.base import FeatureExtractor
+from src.analyzer.features.workspace import Workspace
+from src.analyzer.report.report_generator import summarize_stats
+from src.config.design_registry import DesignRegistry
+
+MAX_CACHED_EXTRACTORS = 8
+# Settings holding server-side paths, which requests may not override
+FIXED_SETTINGS = ("image_path", "output_dir", "cache")
+
+
+class QueueFull(Exception):
+    """Raised when the request queue is at capacity."""
+
+
+class PathOutsideRoot(PermissionError):
+    """Raised when a request names a path outside the directory it is confined to."""
+
+
+def resolve_under(root: str, path: str) -> str:
+    """
+    `path` (relative paths are taken relative to `root`) resolved with
+    symlinks followed; raises PathOutsideRoot unless it lies inside `root`.
+    """
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise PathOutsideRoot(f"Path outside {root}: {path}")
+    return resolved
+
+
+class ProfilingGate:
+    """
+    Shared/exclusive lock around pipeline runs. StageProfiler is process-wide
+    and every run configures and resets it, so a request with profiling
+    enabled runs alone; other requests run concurrently with each other.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+
+    def acquire(self, exclusive: bool) -> None:
+        with self._cond:
+            if exclusive:
+                self._cond.wait_for(lambda: not self._exclusive and self._shared == 0)
+                self._exclusive = True
+            else:
+                self._cond.wait_for(lambda: not self._exclusive)
+                self._shared += 1
+
+    def release(self, exclusive: bool) -> None:
+        with self._cond:
+            if exclusive:
+                self._exclusive = False
+            else:
+                self._shared -= 1
+            self._cond.notify_all()
+
+
+class AnalysisService:
+    """
+    Warm analysis state shared by all requests.
+
+    Holds the validated base configuration, one FeatureExtractor per distinct
+    detector configuration (LRU, MAX_CACHED_EXTRACTORS), the optional feature
+    cache, and the worker threads draining the request queue.
+    input_root: directory request image paths must lie in (default: the
+    working directory); output_dir confines request output directories.
+    """
+
+    def __init__(
+        self,
+        base_cfg: Settings,
+        workers: int = 1,
+        queue_size: int = 8,
+        output_dir: str = "outputs/server",
+        input_root: Optional[str] = None
+    ):
+        self.base_cfg = base_cfg
+        self.base_dict = base_cfg.model_dump()
+        self.workers = workers
+        self.queue_size = queue_size
+        self.output_dir = output_dir
+        self.input_root = input_root or os.getcwd()
+        self._profiling = ProfilingGate()
+        self.cache = FeatureCache.from_config(base_cfg.cache)
+        self._requests: "queue.Queue[Optional[Tuple[Dict[str, Any], Future]]]" = queue.Queue(maxsize=queue_size)
+        self._extractors: "OrderedDict[str, FeatureExtractor]" = OrderedDict()
+        self._extractor_lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"analysis-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self) -> None:
+        preload_models(self.base_cfg.model_copy(update={
+            "edge_detection": self.base_cfg.edge_detection.model_copy(update={"piotr_preload": True})
+        }))
+        self.extractor_for(self.base_cfg)
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        for _ in self._threads:
+            self._requests.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def queued(self) -> int:
+        return self._requests.qsize()
+
+    def submit(self, request: Dict[str, Any]) -> Future:
+        """Enqueue a request without blocking; raises QueueFull at capacity."""
+        future: Future = Future()
+        try:
+            self._requests.put_nowait((request, future))
+        except queue.Full:
+            raise QueueFull(f"request queue is full ({self.queue_size})")
+        return future
+
+    def extractor_for(self, cfg: Settings) -> FeatureExtractor:
+        """The warm FeatureExtractor for cfg's detector settings."""
+        key = hashlib.sha1(json.dumps({
+            "edge_detection": cfg.edge_detection.model_dump(),
+            "color_detection": cfg.color_detection.model_dump(),
+            "max_workers": cfg.max_workers,
+            "tiling": cfg.tiling.model_dump()
+        }, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        with self._extractor_lock:
+            extractor = self._extractors.get(key)
+            if extractor is not None:
+                self._extractors.move_to_end(key)
+                return extractor
+            extractor = FeatureExtractor(
+                enable_color=True,
+                enable_edges=True,
+                enable_objects=False,
+                enable_saliency=False,
+                use_dl_models=False,
+                color_detector_config=cfg.color_detection,
+                edge_detector_config=cfg.edge_detection,
+                max_workers=cfg.max_workers,
+                cache=self.cache,
+                tiling=cfg.tiling
+            )
+            self._extractors[key] = extractor
+            if len(self._extractors) > MAX_CACHED_EXTRACTORS:
+                self._extractors.popitem(last=False)
+            return extractor
+
+    def analyze(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run one request through the pipeline.
+
+        Request fields:
+            image_path (str) or image_base64 (str): the image to analyze; paths
+                are resolved under the input root
+            overrides (dict): config overrides, deep-merged into the base config
+                (except FIXED_SETTINGS and tiling.directory)
+            output_dir (str): where visuals go, under the server output
+                directory (default <server output>/<request id>)
+            include ("stats" | "maps"): per-map summary statistics (default), or
+                the full maps as nested lists
+
+        Returns {"id", "status": "ok", "output_dir", "features": {...}}.
+        """
+        request_id = request.get("id") or uuid.uuid4().hex[:12]
+        if not isinstance(request_id, str):
+            raise ValueError("id must be a string")
+        include = request.get("include", "stats")
+        if include not in ("stats", "maps"):
+            raise ValueError("include must be 'stats' or 'maps'")
+
+        overrides = request.get("overrides") or {}
+        fixed = [key for key in FIXED_SETTINGS if key in overrides]
+        if "directory" in (overrides.get("tiling") or {}):
+            fixed.append("tiling.directory")
+        if fixed:
+            raise PermissionError(f"Settings not overridable by requests: {', '.join(fixed)}")
+        cfg_dict = deep_merge(self.base_dict, overrides)
+        cfg_dict["output_dir"] = resolve_under(self.output_dir, request.get("output_dir") or request_id)
+
+        tmp_path = None
+        try:
+            if request.get("image_base64"):
+                fd, tmp_path = tempfile.mkstemp(prefix="betteredit-", suffix=".img")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(base64.b64decode(request["image_base64"]))
+                cfg_dict["image_path"] = tmp_path
+            elif request.get("image_path"):
+                cfg_dict["image_path"] = resolve_under(self.input_root, request["image_path"])
+            else:
+                raise ValueError("request needs 'image_path' or 'image_base64'")
+            if not os.path.isfile(cfg_dict["image_path"]):
+                raise FileNotFoundError(f"Image file not found: {cfg_dict['image_path']}")
+
+            cfg = Settings(**cfg_dict)
+            if cfg.save_visuals:
+                os.makedirs(cfg.output_dir, exist_ok=True)
+            exclusive = cfg.profiling.enabled
+            self._profiling.acquire(exclusive)
+            try:
+                features = pipeline_run(
+                    cfg.image_path, tuple(cfg.target_size), cfg, extractor=self.extractor_for(cfg)
+                )
+            finally:
+                self._profiling.release(exclusive)
+        finally:
+            if tmp_path is not None:
+                os.unlink(tmp_path)
+
+        return {
+            "id": request_id,
+            "status": "ok",
+            "output_dir": cfg.output_dir if cfg.save_visuals else None,
+            "features": self._serialize(features, include)
+        }
+
+    @staticmethod
+    def _serialize(features: Dict[str, Any], include: str) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for section, result in features.items():
+            if not isinstance(result, dict):
+                continue
+            out[section] = {}
+            for name, value in result.items():
+                if isinstance(value, dict):
+                    value = value.get("map")
+                if not isinstance(value, np.ndarray):
+                    continue
+                if include == "maps":
+                    out[section][name] = value
+                else:
+                    out[section][name] = {"shape": list(value.shape), **summarize_stats(value)}
+        return out
+
+    def _work(self) -> None:
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            request, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.analyze(request))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                Workspace.release_idle()
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    server: "AnalysisHTTPServer"
+
+    def do_GET(self) -> None:
+        if self.path != "/health":
+            self._send(404, {"status": "error", "error": f"Unknown path: {self.path}"})
+            return
+        service = self.server.service
+        self._send(200, {
+            "status": "ok",
+            "queued": service.queued(),
+            "workers": service.workers,
+            "queue_size": service.queue_size
+        })
+
+    def do_POST(self) -> None:
+        if self.path != "/analyze":
+            self._send(404, {"status": "error", "error": f"Unknown path: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            self._send(400, {"status": "error", "error": "Invalid request: bad Content-Length"})
+            return
+        if length < 0 or length > self.server.max_body_bytes:
+            # answered unread: the connection is closed after the response
+            self.close_connection = True
+            self._send(413, {"status": "error", "error": f"Request body must be 0 to {self.server.max_body_bytes} bytes"})
+            return
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("request body must be a JSON object")
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send(400, {"status": "error", "error": f"Invalid request: {e}"})
+            return
+
+        try:
+            future = self.server.service.submit(request)
+        except QueueFull as e:
+            self._send(503, {"status": "busy", "error": str(e)}, headers={"Retry-After": "1"})
+            return
+
+        try:
+            result = future.result(timeout=self.server.request_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            logger.error(f"[SERVE] Request timed out after {self.server.request_timeout}s")
+            self._send(504, {"status": "timeout", "error": f"Analysis exceeded {self.server.request_timeout}s"})
+            return
+        except PermissionError as e:
+            self._send(403, {"status": "error", "error": f"{type(e).__name__}: {e}"})
+            return
+        except (ValueError, FileNotFoundError) as e:
+            self._send(400, {"status": "error", "error": f"{type(e).__name__}: {e}"})
+            return
+        except Exception as e:
+            logger.error(f"[SERVE] Request failed: {type(e).__name__}: {e}")
+            self._send(500, {"status": "error", "error": f"{type(e).__name__}: {e}"})
+            return
+        self._send(200, result)
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(body, cls=NumpyEncoder).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def address_string(self) -> str:
+        # Unix-socket clients have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(f"[SERVE] {self.address_string()} {format % args}")
+
+
+class AnalysisHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Any,
+        service: AnalysisService,
+        request_timeout: Optional[float] = None,
+        max_body_bytes: int = SERVER_MAX_BODY_BYTES
+    ):
+        self.service = service
+        self.request_timeout = request_timeout
+        self.max_body_bytes = max_body_bytes
+        super().__init__(address, AnalysisRequestHandler)
+
+
+class UnixAnalysisHTTPServer(AnalysisHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self) -> None:
+        # HTTPServer.server_bind expects a (host, port) address
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def make_server(
+    service: AnalysisService,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Optional[str] = None,
+    request_timeout: Optional[float] = None,
+    max_body_bytes: int = SERVER_MAX_BODY_BYTES
+) -> AnalysisHTTPServer:
+    """Bind the HTTP server on a TCP port, or on a Unix socket when socket_path is given."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        return UnixAnalysisHTTPServer(socket_path, service, request_timeout, max_body_bytes)
+    return AnalysisHTTPServer((host, port), service, request_timeout, max_body_bytes)
+
+
+def serve(
+    cfg: Settings,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Optional[str] = None,
+    workers: int = 1,
+    queue_size: int = 8,
+    output_dir: str = "outputs/server",
+    request_timeout: Optional[float] = None,
+    input_root: Optional[str] = None,
+    max_body_bytes: int = SERVER_MAX_BODY_BYTES
+) -> None:
+    """Run the analysis server until interrupted."""
+    service = AnalysisService(
+        cfg, workers=workers, queue_size=queue_size, output_dir=output_dir, input_root=input_root
+    )
+    service.start()
+    httpd = make_server(service, host, port, socket_path, request_timeout, max_body_bytes)
+
+    DesignRegistry.register(
+        module="Server",
+        component="Session",
+        concept="Server Start",
+        technique="threaded_http",
+        tuning_params={
+            "address": socket_path or f"{host}:{port}",
+            "workers": workers,
+            "queue_size": queue_size,
+            "output_dir": output_dir,
+            "input_root": service.input_root,
+            "max_body_bytes": max_body_bytes
+        }
+    )
+    logger.info(f"[SERVE] Listening on {socket_path or f'http://{host}:{port}'} ({workers} workers, queue {queue_size})")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("[SERVE] Shutting down")
+    finally:
+        httpd.server_close()
+        service.stop()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -1,5 +1,4 @@
 import json
-import numpy as np
 from typing import Any, Dict
 from datetime import datetime
 
@@ -44,6 +43,11 @@ class DesignRegistry:
             tuning_params={"timestamp": datetime.utcnow().isoformat()}
         )
 
+    @classmethod
+    def reset(cls) -> None:
+        """Drop every registered entry, e.g. before analyzing the next image in a batch worker."""
+        cls._registry = {}
+
     @classmethod
     def register(
         cls,
@@ -77,6 +81,8 @@ class DesignRegistry:
         """
         Serialize the design registry to JSON, converting numpy arrays to lists.
         """
+        import numpy as np
+
         def default(o: Any):
             if isinstance(o, np.ndarray):
                 return o.tolist()
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import nullcontext
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from src.config.design_registry import DesignRegistry
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_DISABLED = nullcontext()
+
+
+class _Stage:
+    """Context manager recording one stage's wall time, CPU time and peak allocation."""
+
+    __slots__ = ("name", "args", "start_wall", "start_cpu", "start_mem", "child_peak", "traced")
+
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+        self.child_peak = 0
+        # tracemalloc's peak is process-wide: only main-thread stages reset and read it
+        self.traced = StageProfiler._trace_memory and threading.current_thread() is threading.main_thread()
+
+    def __enter__(self) -> "_Stage":
+        if self.traced:
+            self.start_mem = tracemalloc.get_traced_memory()[0]
+            stack = StageProfiler._memory_stack()
+            if stack:
+                # Fold the parent's peak so far into its frame before resetting the counter.
+                parent = stack[-1]
+                parent.child_peak = max(parent.child_peak, tracemalloc.get_traced_memory()[1])
+            stack.append(self)
+            tracemalloc.reset_peak()
+        self.start_cpu = time.thread_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.thread_time() - self.start_cpu
+        peak_bytes = None
+        if self.traced:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            peak_bytes = max(0, peak - self.start_mem)
+            stack = StageProfiler._memory_stack()
+            if stack and stack[-1] is self:
+                stack.pop()
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        StageProfiler._record(self.name, self.start_wall, wall, cpu, peak_bytes, self.args)
+
+
+class StageProfiler:
+    """
+    Process-wide stage timer.
+
+    Disabled by default; `stage()` then returns a shared no-op context and
+    `profiled` functions only pay for one attribute check. When enabled, each
+    stage records wall time (perf_counter), CPU time of the calling thread
+    (thread_time) and, with trace_memory, `process_peak_bytes`: the process-wide
+    high-water mark of traced allocations above the stage's starting point.
+    tracemalloc's counters are process-wide, so it is recorded for main-thread
+    stages only (None for stages on worker threads), and includes whatever the
+    stage's thread pool workers allocated meanwhile.
+    """
+    _enabled: bool = False
+    _trace_memory: bool = False
+    _started_tracemalloc: bool = False
+    _records: List[Dict[str, Any]] = []
+    _lock = threading.Lock()
+    _local = threading.local()
+    _epoch: float = time.perf_counter()
+
+    @classmethod
+    def configure(cls, enabled: bool, trace_memory: bool = False) -> None:
+        cls._enabled = enabled
+        cls._trace_memory = enabled and trace_memory
+        if cls._trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            cls._started_tracemalloc = True
+        elif not cls._trace_memory and cls._started_tracemalloc:
+            tracemalloc.stop()
+            cls._started_tracemalloc = False
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return cls._enabled
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls._records = []
+        cls._epoch = time.perf_counter()
+
+    @classmethod
+    def stage(cls, name: str, **args: Any):
+        """Context manager timing the enclosed block as stage `name`."""
+        if not cls._enabled:
+            return _DISABLED
+        return _Stage(name, args)
+
+    @classmethod
+    def profiled(cls, name: str) -> Callable[[F], F]:
+        """Decorator timing every call of the wrapped function as stage `name`."""
+        def decorator(fn: F) -> F:
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not cls._enabled:
+                    return fn(*args, **kwargs)
+                with _Stage(name, {}):
+                    return fn(*args, **kwargs)
+            return wrapper  # type: ignore[return-value]
+        return decorator
+
+    @classmethod
+    def records(cls) -> List[Dict[str, Any]]:
+        with cls._lock:
+            return list(cls._records)
+
+    @classmethod
+    def summary(cls) -> Dict[str, Dict[str, Any]]:
+        """Aggregate records per stage name, in first-seen order."""
+        stages: Dict[str, Dict[str, Any]] = {}
+        for rec in cls.records():
+            entry = stages.setdefault(rec["name"], {
+                "calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0, "max_wall_ms": 0.0, "process_peak_bytes": None
+            })
+            entry["calls"] += 1
+            entry["wall_ms"] += rec["wall_ms"]
+            entry["cpu_ms"] += rec["cpu_ms"]
+            entry["max_wall_ms"] = max(entry["max_wall_ms"], rec["wall_ms"])
+            if rec["process_peak_bytes"] is not None:
+                entry["process_peak_bytes"] = max(entry["process_peak_bytes"] or 0, rec["process_peak_bytes"])
+        for entry in stages.values():
+            entry["wall_ms"] = round(entry["wall_ms"], 3)
+            entry["cpu_ms"] = round(entry["cpu_ms"], 3)
+            entry["max_wall_ms"] = round(entry["max_wall_ms"], 3)
+        return stages
+
+    @classmethod
+    def to_registry(cls, component: str = "Stages") -> None:
+        """Register the per-stage summary under the 'Profiling' module."""
+        for name, entry in cls.summary().items():
+            DesignRegistry.register(
+                module="Profiling",
+                component=component,
+                concept=name,
+                technique="stage_timing",
+                tuning_params=entry
+            )
+
+    @classmethod
+    def to_chrome_trace(cls, path: str) -> None:
+        """Write records as Chrome trace-event JSON (load in chrome://tracing or Perfetto)."""
+        pid = os.getpid()
+        events = []
+        for rec in cls.records():
+            args = {"cpu_ms": rec["cpu_ms"], **rec["args"]}
+            if rec["process_peak_bytes"] is not None:
+                args["process_peak_bytes"] = rec["process_peak_bytes"]
+            events.append({
+                "name": rec["name"],
+                "cat": rec["name"].split(".", 1)[0],
+                "ph": "X",
+                "ts": round(rec["start_us"], 1),
+                "dur": round(rec["wall_ms"] * 1000.0, 1),
+                "pid": pid,
+                "tid": rec["tid"],
+                "args": args
+            })
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+        print(f"[SAVED] Profiling trace saved to: {path}")
+
+    @classmethod
+    def _record(
+        cls,
+        name: str,
+        start: float,
+        wall: float,
+        cpu: float,
+        peak_bytes: Optional[int],
+        args: Dict[str, Any]
+    ) -> None:
+        rec = {
+            "name": name,
+            "start_us": (start - cls._epoch) * 1e6,
+            "wall_ms": wall * 1000.0,
+            "cpu_ms": cpu * 1000.0,
+            "process_peak_bytes": peak_bytes,
+            "tid": threading.get_ident(),
+            "args": args
+        }
+        with cls._lock:
+            cls._records.append(rec)
+
+    @classmethod
+    def _memory_stack(cls) -> List[_Stage]:
+        stack = getattr(cls._local, "stack", None)
+        if stack is None:
+            stack = cls._local.stack = []
+        return stack
@@ -0,0 +1,115 @@
+# src/dl_models/model_utils.py
+
+"""
+Process-wide model registry.
+
+Models are loaded lazily on first use, at most once per process, and shared by
+every detector, image and strategy afterwards.
+"""
+
+import os
+import hashlib
+import threading
+import urllib.request
+from typing import Any, Dict, Optional, Set, Tuple
+from loguru import logger
+
+SED_MODEL_URL = "https://raw.githubusercontent.com/opencv/opencv_extra/master/testdata/cv/ximgproc/model.yml.gz"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_sha256(path: str, sha256: str) -> None:
+    """Raise ValueError unless the file at `path` has the given checksum."""
+    actual = file_sha256(path)
+    if actual != sha256.lower():
+        logger.error("Model checksum mismatch for '{}': expected {}, got {}", path, sha256, actual)
+        raise ValueError(f"Checksum mismatch for '{path}': expected {sha256}, got {actual}")
+
+
+class ModelRegistry:
+    _models: Dict[Tuple[str, str], Any] = {}
+    # (model path, sha256) pairs whose file has been verified
+    _verified: Set[Tuple[str, str]] = set()
+    _lock = threading.Lock()
+
+    @classmethod
+    def structured_edge_model(
+        cls,
+        model_path: str,
+        sha256: Optional[str] = None,
+        offline: bool = False
+    ) -> Any:
+        """
+        Return the shared Structured Edge Detection model for `model_path`.
+
+        sha256: expected checksum of the model file; a mismatch raises
+            ValueError. Each checksum is verified on its first use, even when
+            the model was already loaded without one.
+        offline: never download; a missing model file raises FileNotFoundError.
+        """
+        path = os.path.abspath(model_path)
+        digest = sha256.lower() if sha256 is not None else None
+        key = ("structured_edge", path)
+        model = cls._models.get(key)
+        if model is not None and (digest is None or (path, digest) in cls._verified):
+            return model
+
+        with cls._lock:
+            model = cls._models.get(key)
+            if model is None:
+                model = cls._load_structured_edge_model(model_path, digest, offline)
+                cls._models[key] = model
+            elif digest is not None and (path, digest) not in cls._verified:
+                verify_sha256(model_path, digest)
+            if digest is not None:
+                cls._verified.add((path, digest))
+        return model
+
+    @classmethod
+    def is_loaded(cls, model_path: str) -> bool:
+        return ("structured_edge", os.path.abspath(model_path)) in cls._models
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._models.clear()
+            cls._verified.clear()
+
+    @staticmethod
+    def _load_structured_edge_model(model_path: str, sha256: Optional[str], offline: bool) -> Any:
+        try:
+            from cv2 import ximgproc
+        except ImportError:
+            logger.error("cv2.ximgproc module not available.")
+            raise ImportError("cv2.ximgproc module not available. Ensure opencv-contrib-python is installed.")
+
+        if os.path.exists(model_path):
+            if sha256 is not None:
+                verify_sha256(model_path, sha256)
+        elif offline:
+            logger.error("Piotr model not found at '{}' and offline mode is enabled.", model_path)
+            raise FileNotFoundError(f"Piotr model not found at '{model_path}' (offline mode, no download).")
+        else:
+            logger.info("Piotr model not found at '{}'. Downloading...", model_path)
+            os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+            partial_path = f"{model_path}.part"
+            try:
+                urllib.request.urlretrieve(SED_MODEL_URL, partial_path)
+                # verified before it is moved into place, so a bad download is never reused
+                if sha256 is not None:
+                    verify_sha256(partial_path, sha256)
+                os.replace(partial_path, model_path)
+            finally:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+            logger.info("Piotr model downloaded successfully to '{}'.", model_path)
+
+        logger.info("Loading Piotr structured edge model from '{}'", model_path)
+        return ximgproc.createStructuredEdgeDetection(model_path)
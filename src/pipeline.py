@@ -2,31 +2,169 @@
 
 import os
 import numpy as np
+from typing import Any, Callable, Dict, Optional, Tuple
 from loguru import logger
-from src.betteredit.config import Settings
+from src.betteredit.config import ColorDetectionConfig, EdgeDetectionConfig, Settings
 from src.analyzer.preprocessing import preprocess_image
 from src.analyzer.features.base import FeatureExtractor
+from src.analyzer.features.color_detection.incremental import IncrementalColorAnalysis
+from src.analyzer.cache import FeatureCache
 from src.analyzer.features.color_detection import transforms as color_transforms
 from src.config.design_registry import DesignRegistry
-from src.analyzer.report.report_generator import clear_outputs_dir, save_visual_map
+from src.config.profiler import StageProfiler
+from src.analyzer.report.report_generator import VisualWriter, clear_outputs_dir, save_visual_map
 
 OUTPUT_DIR    = "outputs"
 REGISTRY_PATH = os.path.join(OUTPUT_DIR, "design_registry.json")
 
 
-def run(image_path: str, target_size: tuple, cfg: Settings):
+def draft_decode(cfg: Settings) -> bool:
+    """
+    Whether preprocessing may decode JPEGs at a reduced DCT scale: only when
+    color cues run at the padded resolution, so no original-resolution view
+    is read and the JPEG is decoded once.
+    """
+    return cfg.color_detection.analysis_resolution == "padded"
+
+
+def preview_extractor(cfg: Settings) -> FeatureExtractor:
+    """
+    A FeatureExtractor for cfg reduced to the cheap preview cues
+    (cfg.preview): the configured edge methods, equally weighted, and color
+    cues at the padded resolution fused with the 'weighted' strategy.
+    """
+    methods = cfg.preview.edge_methods
+    edge_cfg = EdgeDetectionConfig.model_validate({
+        **cfg.edge_detection.model_dump(),
+        "methods": methods,
+        "intra_fusion_weights": {method: 1.0 / len(methods) for method in methods}
+    })
+    color_cfg = ColorDetectionConfig.model_validate({
+        **cfg.color_detection.model_dump(),
+        "cues": cfg.preview.color_cues,
+        "salience_strategy": "weighted",
+        "analysis_resolution": "padded"
+    })
+    return FeatureExtractor(
+        enable_color=True,
+        enable_edges=True,
+        enable_objects=False,
+        enable_saliency=False,
+        use_dl_models=False,
+        color_detector_config=color_cfg,
+        edge_detector_config=edge_cfg,
+        max_workers=cfg.max_workers
+    )
+
+
+def preview(image_path: str, target_size: tuple, cfg: Settings) -> Dict[str, Any]:
+    """
+    Coarse features for immediate feedback: the preview cues (see
+    `preview_extractor`) on the image preprocessed at target_size scaled by
+    cfg.preview.target_scale. Same schema as `run`'s features, at the
+    smaller size.
+    """
+    scale = cfg.preview.target_scale
+    preview_size = (max(1, round(target_size[0] * scale)), max(1, round(target_size[1] * scale)))
+    image_data = preprocess_image(image_path, preview_size, draft_decode=True)
+    return preview_extractor(cfg).extract(image_data)
+
+
+def reanalyze(
+    image_path: str,
+    target_size: tuple,
+    cfg: Settings,
+    analysis: Optional[IncrementalColorAnalysis] = None,
+    extractor: Optional[FeatureExtractor] = None
+) -> Tuple[Dict[str, Any], IncrementalColorAnalysis]:
+    """
+    Incremental re-analysis of an edited image. Color features are updated
+    from `analysis`, the state returned by the previous call for an earlier
+    version of the image, recomputing only what the changed tiles reach
+    (cfg.incremental); without it the image is analyzed in full. Edge cues
+    run as usual at target_size.
+
+    The incremental rarity model is fit on a stratified pixel sample, so
+    with the 'kmeans' and 'minibatch' engines color rarity (and the fused
+    color salience) matches `run` with rarity_engine 'sampled', not `run`
+    itself. Originals large enough for tiling are analyzed in full, tile by
+    tile, as in `run`; the feature cache serves the edge cues.
+
+    Returns the features (same schema as `run`'s) and the state to pass
+    with the next version. The color arrays belong to the state and are
+    overwritten by the next call; copy them to keep a version.
+    """
+    if extractor is None:
+        extractor = FeatureExtractor(
+            enable_color=True,
+            enable_edges=True,
+            enable_objects=False,
+            enable_saliency=False,
+            use_dl_models=False,
+            color_detector_config=cfg.color_detection,
+            edge_detector_config=cfg.edge_detection,
+            max_workers=cfg.max_workers,
+            cache=FeatureCache.from_config(cfg.cache),
+            tiling=cfg.tiling
+        )
+    if analysis is None:
+        analysis = extractor.incremental_analysis(cfg.incremental)
+    image_data = preprocess_image(
+        image_path,
+        target_size,
+        draft_decode=draft_decode(cfg),
+        cache_keys=extractor.cache is not None,
+        disk_min_pixels=cfg.tiling.min_pixels if cfg.tiling.enabled else None,
+        disk_dir=cfg.tiling.directory
+    )
+    with StageProfiler.stage("reanalyze"):
+        features = extractor.extract_incremental(image_data, analysis)
+    return features, analysis
+
+
+def run(
+    image_path: str,
+    target_size: tuple,
+    cfg: Settings,
+    extractor: Optional[FeatureExtractor] = None,
+    on_preview: Optional[Callable[[Dict[str, Any]], None]] = None
+):
     """
     Core pipeline: preprocessing → feature extraction → visualization → registry.
+
+    extractor: a pre-built FeatureExtractor for cfg's detector settings (e.g. kept
+    warm by the analysis server); built from cfg when omitted.
+    on_preview: progressive mode. Called with the coarse `preview` features
+    before the full analysis starts; the full features are returned as usual.
     """
     logger.info(f"Starting analysis on: {image_path}")
     logger.info(f"Target resize: {target_size}")
 
     # Use config's output directory or default
     output_dir = cfg.output_dir if cfg.output_dir is not None else "outputs"
+    basename   = os.path.splitext(os.path.basename(image_path))[0]
+
+    StageProfiler.configure(cfg.profiling.enabled, trace_memory=cfg.profiling.trace_memory)
+    StageProfiler.reset()
+    cache = extractor.cache if extractor is not None else FeatureCache.from_config(cfg.cache)
+
+    if on_preview is not None:
+        logger.info("[PREVIEW] Computing coarse preview…")
+        with StageProfiler.stage("preview"):
+            preview_features = preview(image_path, target_size, cfg)
+        on_preview(preview_features)
 
     # Step 1: Preprocessing
     logger.info("[STEP 1] Preprocessing image…")
-    image_data = preprocess_image(image_path, target_size)
+    with StageProfiler.stage("preprocess"):
+        image_data = preprocess_image(
+            image_path,
+            target_size,
+            draft_decode=draft_decode(cfg),
+            cache_keys=cache is not None,
+            disk_min_pixels=cfg.tiling.min_pixels if cfg.tiling.enabled else None,
+            disk_dir=cfg.tiling.directory
+        )
     logger.info(f" - Original Aspect Ratio: {image_data['original_aspect_ratio']}")
     logger.info(f" - Applied Padding: {image_data['padding']}")
     logger.info(f" - EXIF keys: {list(image_data['exif'].keys()) if image_data['exif'] else 'None'}")
@@ -36,26 +174,32 @@ def run(image_path: str, target_size: tuple, cfg: Settings):
     edge_cfg  = cfg.edge_detection
     save_visuals = cfg.save_visuals
 
-    extractor = FeatureExtractor(
-        enable_color=True,
-        enable_edges=True,
-        enable_objects=False,
-        enable_saliency=False,
-        use_dl_models=False,
-        color_detector_config=color_cfg,
-        edge_detector_config=edge_cfg
-    )
+    if extractor is None:
+        extractor = FeatureExtractor(
+            enable_color=True,
+            enable_edges=True,
+            enable_objects=False,
+            enable_saliency=False,
+            use_dl_models=False,
+            color_detector_config=color_cfg,
+            edge_detector_config=edge_cfg,
+            max_workers=cfg.max_workers,
+            cache=cache,
+            tiling=cfg.tiling
+        )
 
-    features       = extractor.extract(image_data)
+    with StageProfiler.stage("extract"):
+        features = extractor.extract(image_data)
     color_features = features.get("color", {})
     edge_features  = features.get("edges", {})
-    basename       = os.path.splitext(os.path.basename(image_path))[0]
 
     # Get raw hue map
     hue_val = color_features.get("hue")
     hue_map = hue_val["map"] if isinstance(hue_val, dict) else hue_val
     if hue_map is not None and "hue_contrast" not in color_features:
-        color_features["hue_contrast"] = color_transforms.compute_hue_contrast(hue_map, color_cfg.hue_contrast_sigma)
+        color_features["hue_contrast"] = color_transforms.compute_hue_contrast(
+            hue_map, color_cfg.hue_contrast_sigma, level=color_cfg.contrast_pyramid_level
+        )
 
     # Get raw luminance map
     lum_val = color_features.get("luminance")
@@ -68,82 +212,97 @@ def run(image_path: str, target_size: tuple, cfg: Settings):
         )
 
     # Step 3: Visualization
-    # — Color cues & final salience —
-    for name, cmap in {
-        "hue": "twilight",
-        "saturation": "gray",
-        "luminance": "gray",
-        "hue_contrast": "hot",
-        "luminance_contrast": "hot",
-        "rarity": "plasma",
-        "salience": "inferno"
-    }.items():
-        output_path = os.path.join(
-            output_dir, "color_detection", f"{basename}_{name}.png"
-        )
-        title = name.replace("_", " ").title()
-
-        val = color_features.get(name)
-        feature_map = val["map"] if isinstance(val, dict) else val
-        save_visual_map(
-            feature_map=feature_map,
-            output_path=output_path,
-            title=title,
-            cmap=cmap,
-            save_visuals=save_visuals
-        )
+    # PNG encoding and disk writes run on a background thread while maps are rendered.
+    with StageProfiler.stage("visualization"):
+        writer = VisualWriter()
+        try:
+            # — Color cues & final salience —
+            for name, cmap in {
+                "hue": "twilight",
+                "saturation": "gray",
+                "luminance": "gray",
+                "hue_contrast": "hot",
+                "luminance_contrast": "hot",
+                "rarity": "plasma",
+                "salience": "inferno"
+            }.items():
+                output_path = os.path.join(
+                    output_dir, "color_detection", f"{basename}_{name}.png"
+                )
+                title = name.replace("_", " ").title()
 
-    # — Individual edge cues & salience —
-    key_map = {"edge_map": "map", "edge_density": "density", "edge_salience": "salience"}
-    edge_methods = [m for m in edge_features.keys() if isinstance(edge_features[m], dict)]
-    for method in edge_methods:
-        block = edge_features.get(method, {})
-        for name, cmap in {
-            "edge_map": "gray",
-            "edge_density": "hot",
-            "edge_salience": "inferno"
-        }.items():
-            output_path = os.path.join(
-                output_dir,
-                "edge_detection",
-                f"{basename}_{method}_{name}.png"
-            )
-            title = f"{name.replace('_', ' ').title()} ({method})"
-            feature_map = block.get(key_map[name])
-            save_visual_map(
-                feature_map=feature_map,
-                output_path=output_path,
-                title=title,
-                cmap=cmap,
-                save_visuals=save_visuals
-            )
-
-    # — Combined edge maps —
-    fused_map_keys = {
-        "edge_strength": "strength",
-        "edge_density": "density",
-        "edge_salience": "salience"
-    }
-    for name, cmap in {
-        "edge_strength": "gray",
-        "edge_density": "hot",
-        "edge_salience": "inferno"
-    }.items():
-        key = fused_map_keys[name]
-        feature_map = edge_features.get(key)
-        output_path = os.path.join(
-            output_dir,
-            "edge_detection",
-            f"{basename}_fused_{name}.png"
-        )
-        title = f"{name.replace('_', ' ').title()} (fused)"
-        save_visual_map(
-            feature_map=feature_map,
-            output_path=output_path,
-            title=title,
-            cmap=cmap,
-            save_visuals=save_visuals
-        )
+                val = color_features.get(name)
+                feature_map = val["map"] if isinstance(val, dict) else val
+                save_visual_map(
+                    feature_map=feature_map,
+                    output_path=output_path,
+                    title=title,
+                    cmap=cmap,
+                    save_visuals=save_visuals,
+                    backend=cfg.visual_backend,
+                    show_title=cfg.visual_titles,
+                    writer=writer
+                )
+
+            # — Individual edge cues & salience —
+            key_map = {"edge_map": "map", "edge_density": "density", "edge_salience": "salience"}
+            edge_methods = [m for m in edge_features.keys() if isinstance(edge_features[m], dict)]
+            for method in edge_methods:
+                block = edge_features.get(method, {})
+                for name, cmap in {
+                    "edge_map": "gray",
+                    "edge_density": "hot",
+                    "edge_salience": "inferno"
+                }.items():
+                    output_path = os.path.join(
+                        output_dir,
+                        "edge_detection",
+                        f"{basename}_{method}_{name}.png"
+                    )
+                    title = f"{name.replace('_', ' ').title()} ({method})"
+                    feature_map = block.get(key_map[name])
+                    save_visual_map(
+                        feature_map=feature_map,
+                        output_path=output_path,
+                        title=title,
+                        cmap=cmap,
+                        save_visuals=save_visuals,
+                        backend=cfg.visual_backend,
+                        show_title=cfg.visual_titles,
+                        writer=writer
+                    )
+
+            # — Combined edge maps —
+            fused_map_keys = {
+                "edge_strength": "strength",
+                "edge_density": "density",
+                "edge_salience": "salience"
+            }
+            for name, cmap in {
+                "edge_strength": "gray",
+                "edge_density": "hot",
+                "edge_salience": "inferno"
+            }.items():
+                key = fused_map_keys[name]
+                feature_map = edge_features.get(key)
+                output_path = os.path.join(
+                    output_dir,
+                    "edge_detection",
+                    f"{basename}_fused_{name}.png"
+                )
+                title = f"{name.replace('_', ' ').title()} (fused)"
+                save_visual_map(
+                    feature_map=feature_map,
+                    output_path=output_path,
+                    title=title,
+                    cmap=cmap,
+                    save_visuals=save_visuals,
+                    backend=cfg.visual_backend,
+                    show_title=cfg.visual_titles,
+                    writer=writer
+                )
+        finally:
+            writer.close()
 
 
     # Step 4: logger.info extracted feature summaries
@@ -177,6 +336,11 @@ def run(image_path: str, target_size: tuple, cfg: Settings):
             "save_visuals": save_visuals
         }
     )
+    if StageProfiler.enabled():
+        StageProfiler.to_registry()
+        if cfg.profiling.chrome_trace:
+            StageProfiler.to_chrome_trace(os.path.join(output_dir, f"{basename}_trace.json"))
+
     # DesignRegistry.pretty_print()
     # DesignRegistry.finish_session()
     # DesignRegistry.to_json(REGISTRY_PATH)
@@ -0,0 +1,85 @@
+import os
+import time
+import numpy as np
+import pytest
+from PIL import Image
+from src.betteredit.config import ColorDetectionConfig
+from src.analyzer.cache import FeatureCache
+from src.analyzer.preprocessing import preprocess_image
+from src.analyzer.features.color_detection import transforms
+from src.analyzer.features.color_detection.base import ColorDetector
+
+
+@pytest.fixture
+def color_cfg():
+    return ColorDetectionConfig(
+        salience_strategy="weighted",
+        contrast_method="combined",
+        sobel_weight=0.5,
+        rarity_space="lab",
+        rarity_k=4,
+        weights={"hue": 0.1, "sat": 0.3, "rarity": 0.2, "lum": 0.4},
+        return_density=True,
+        return_salience=True,
+        density_window_size=4
+    )
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    rng = np.random.default_rng(0)
+    path = tmp_path / "img.png"
+    Image.fromarray(rng.integers(0, 256, size=(24, 32, 3), dtype=np.uint8)).save(path)
+    return str(path)
+
+
+def test_put_get_roundtrip_is_memory_mapped(tmp_path):
+    cache = FeatureCache(str(tmp_path / "cache"))
+    key = FeatureCache.key("img", "edge.canny", {"sigma": 0.33})
+    assert cache.get(key) is None
+    arr = np.arange(12, dtype=np.float32).reshape(3, 4)
+    cache.put(key, {"map": arr})
+    hit = cache.get(key)
+    assert isinstance(hit["map"], np.memmap)
+    np.testing.assert_array_equal(hit["map"], arr)
+    assert FeatureCache.key("img", "edge.canny", {"sigma": 0.5}) != key
+
+
+def test_lru_eviction(tmp_path):
+    arr = np.zeros(1000, dtype=np.float64)  # ~8 KB per entry
+    cache = FeatureCache(str(tmp_path / "cache"), max_bytes=20_000)
+    keys = [FeatureCache.key("img", f"stage{i}", {}) for i in range(2)]
+    for key in keys:
+        cache.put(key, {"map": arr})
+    old = time.time() - 60
+    os.utime(cache._entry_path(keys[0]), (old, old))
+    os.utime(cache._entry_path(keys[1]), (old + 1, old + 1))
+    assert cache.get(keys[0]) is not None  # refreshes keys[0]
+
+    cache.put(FeatureCache.key("img", "stage2", {}), {"map": arr})
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.size_bytes() <= 20_000
+
+
+def test_color_cues_reused_when_only_weights_change(tmp_path, image_path, color_cfg, monkeypatch):
+    cache = FeatureCache(str(tmp_path / "cache"))
+    calls = []
+    original = transforms.compute_color_rarity
+    monkeypatch.setattr(transforms, "compute_color_rarity", lambda *a, **kw: calls.append(1) or original(*a, **kw))
+
+    image_data = preprocess_image(image_path, (16, 16), cache_keys=True)
+    first = ColorDetector(color_cfg, cache=cache).detect(image_data)
+
+    reweighted = color_cfg.model_copy(update={"weights": {"hue": 0.4, "sat": 0.2, "rarity": 0.2, "lum": 0.2}})
+    image_data = preprocess_image(image_path, (16, 16), cache_keys=True)
+    second = ColorDetector(reweighted, cache=cache).detect(image_data)
+    assert len(calls) == 1
+    assert not image_data["rgb"].is_materialized("og")
+    for name, block in first["cues"].items():
+        for key, arr in block.items():
+            np.testing.assert_array_equal(arr, second["cues"][name][key])
+
+    changed_k = color_cfg.model_copy(update={"rarity_k": 3})
+    ColorDetector(changed_k, cache=cache).detect(preprocess_image(image_path, (16, 16), cache_keys=True))
+    assert len(calls) == 2
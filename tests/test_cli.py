@@ -152,5 +152,94 @@ class TestCLI:
         assert isinstance(session_id, str)
         assert len(session_id) > 0
 
+    def test_setup_logging_json_sink(self, tmp_path):
+        """--log-json records DEBUG messages as JSON lines even at INFO console level."""
+        import json
+        from loguru import logger
+        from src.betteredit.cli import setup_logging
+        log_path = tmp_path / "run.jsonl"
+        setup_logging("INFO", str(log_path))
+        logger.debug("json sink check")
+        logger.complete()
+        logger.remove()
+        records = [json.loads(line) for line in log_path.read_text().splitlines()]
+        assert any(r["record"]["message"] == "json sink check" for r in records)
+        logger.add(sys.stderr)
+
+    def test_resolve_batch_items(self, tmp_path):
+        """Directories, globs and JSONL manifests all expand to batch items."""
+        from src.betteredit.cli import resolve_batch_items
+        for name in ["a.jpg", "b.png", "notes.txt"]:
+            (tmp_path / name).write_bytes(b"")
+
+        from_dir = resolve_batch_items(str(tmp_path))
+        assert [os.path.basename(i["image"]) for i in from_dir] == ["a.jpg", "b.png"]
+
+        from_glob = resolve_batch_items(str(tmp_path / "*.jpg"))
+        assert [os.path.basename(i["image"]) for i in from_glob] == ["a.jpg"]
+
+        manifest = tmp_path / "manifest.jsonl"
+        manifest.write_text(
+            '{"image": "a.jpg", "overrides": {"target_size": [64, 64]}}\n\n{"image": "b.png"}\n'
+        )
+        from_manifest = resolve_batch_items(str(manifest))
+        assert from_manifest[0]["image"] == str(tmp_path / "a.jpg")
+        assert from_manifest[0]["overrides"] == {"target_size": [64, 64]}
+        assert from_manifest[1]["overrides"] == {}
+
+    def test_batch_journal_resume(self, tmp_path):
+        """Only items journaled as ok count as done; a truncated last line is ignored."""
+        from src.betteredit.cli import batch_item_id, read_batch_journal
+        ok = {"image": "/x/a.jpg", "overrides": {}}
+        failed = {"image": "/x/b.jpg", "overrides": {}}
+        journal = tmp_path / "journal.jsonl"
+        journal.write_text(
+            f'{{"id": "{batch_item_id(ok)}", "status": "ok"}}\n'
+            f'{{"id": "{batch_item_id(failed)}", "status": "error"}}\n'
+            '{"id": "trunc'
+        )
+        assert read_batch_journal(str(journal)) == {batch_item_id(ok)}
+        # overrides are part of the identity
+        assert batch_item_id(ok) != batch_item_id({"image": "/x/a.jpg", "overrides": {"save_visuals": False}})
+
+    def test_batch_journal_append_after_truncated_line(self, tmp_path):
+        """Appending after a crash mid-write drops the partial line instead of corrupting the new entry."""
+        from src.betteredit.cli import open_batch_journal, read_batch_journal
+        journal = tmp_path / "journal.jsonl"
+        journal.write_text('{"id": "a", "status": "ok"}\n{"id": "trunc')
+        with open_batch_journal(str(journal)) as f:
+            f.write('{"id": "b", "status": "ok"}\n')
+        assert journal.read_text() == '{"id": "a", "status": "ok"}\n{"id": "b", "status": "ok"}\n'
+        assert read_batch_journal(str(journal)) == {"a", "b"}
+
+    def test_analyze_batch_help(self):
+        """Test that analyze-batch command help works."""
+        result = subprocess.run([sys.executable, CLI_PATH, 'analyze-batch', '--help'], capture_output=True, text=True)
+        assert result.returncode == 0
+        assert "--input" in result.stdout
+        assert "--workers" in result.stdout
+        assert "--journal" in result.stdout
+
+    def test_cli_import_is_lightweight(self):
+        """Importing the CLI must not pull in the heavy analysis dependencies."""
+        code = (
+            "import sys, src.betteredit.cli; "
+            "print(','.join(m for m in ('numpy', 'cv2', 'scipy', 'sklearn', 'matplotlib', 'torch') if m in sys.modules))"
+        )
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=BASEDIR)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == ""
+
+    def test_check_config(self, tmp_path):
+        """check-config validates without analysis and fails on invalid settings."""
+        result = subprocess.run([sys.executable, CLI_PATH, 'check-config', '--show'], capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        assert "color_detection:" in result.stdout
+
+        bad = tmp_path / "bad.yaml"
+        bad.write_text("color_detection:\n  rarity_engine: nope\n")
+        result = subprocess.run([sys.executable, CLI_PATH, 'check-config', '--config', str(bad)], capture_output=True, text=True)
+        assert result.returncode == 1
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
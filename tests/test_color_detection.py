@@ -1,6 +1,8 @@
+import sys
+import cv2
 import numpy as np
 import pytest
-from src.betteredit.config import ColorDetectionConfig
+from src.betteredit.config import ColorDetectionConfig, IncrementalConfig, RoiRefinementConfig
 from src.analyzer.features.color_detection.base import ColorDetector
 
 @pytest.fixture
@@ -29,4 +31,312 @@ def test_detect_color_outputs(dummy_cfg):
     expected = {"hue","saturation","luminance","rarity","hue_contrast","luminance_contrast"}
     assert set(result["cues"].keys()) >= expected
     # Combined block
-    assert "strength" in result["combined"]
\ No newline at end of file
+    assert "strength" in result["combined"]
+
+def test_sweep_shares_cues_across_strategies(dummy_cfg):
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, size=(16, 16, 3), dtype=np.uint8)
+    cd = ColorDetector(dummy_cfg)
+    strategies = ["minimal", "boosted", "full", "sum", "weighted"]
+    results = cd.sweep({"bgr": {"og": img}}, strategies)
+    assert list(results.keys()) == strategies
+    first = results[strategies[0]]["cues"]
+    cue_maps = {name: block["map"] for name, block in first.items()}
+    for strategy in strategies:
+        # cue blocks are computed once and shared
+        assert results[strategy]["cues"] is first
+        expected = cd.fuse(cue_maps, strategy=strategy)
+        np.testing.assert_allclose(results[strategy]["combined"]["strength"], expected["strength"])
+
+
+def test_analysis_resolution_padded(dummy_cfg):
+    og = np.zeros((40, 60, 3), dtype=np.uint8)
+    padded = np.zeros((16, 16, 3), dtype=np.uint8)
+    cfg = dummy_cfg.model_copy(update={"analysis_resolution": "padded"})
+    result = ColorDetector(cfg).detect({"bgr": {"og": og, "padded": padded}})
+    assert result["cues"]["hue"]["map"].shape == (16, 16)
+    assert result["combined"]["salience"].shape == (16, 16)
+
+
+def test_analysis_resolution_max_pixels(dummy_cfg):
+    rng = np.random.default_rng(0)
+    og = rng.integers(0, 256, size=(40, 60, 3), dtype=np.uint8)
+    cfg = dummy_cfg.model_copy(update={"analysis_resolution": "max_pixels", "analysis_max_pixels": 600})
+    result = ColorDetector(cfg).detect({"bgr": {"og": og}})
+    h, w = result["cues"]["rarity"]["map"].shape
+    assert h * w <= 600 and (h, w) == (20, 30)
+
+    cfg = cfg.model_copy(update={"upsample_to_original": True})
+    result = ColorDetector(cfg).detect({"bgr": {"og": og}})
+    assert result["cues"]["rarity"]["density"].shape == (40, 60)
+    assert result["combined"]["strength"].shape == (40, 60)
+
+
+def test_upsampled_hue_wraps_around_red(dummy_cfg):
+    hsv = np.full((40, 60, 3), 255, dtype=np.uint8)
+    hsv[..., 0] = np.where(np.arange(60) % 4 < 2, 178, 2)  # reds on both sides of hue 0/1
+    og = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    cfg = dummy_cfg.model_copy(update={
+        "analysis_resolution": "max_pixels", "analysis_max_pixels": 600, "upsample_to_original": True
+    })
+    hue = ColorDetector(cfg).detect({"bgr": {"og": og}})["cues"]["hue"]["map"]
+    assert hue.shape == (40, 60)
+    assert np.minimum(hue, 1 - hue).max() < 0.05
+
+
+def test_invalid_analysis_resolution_rejected():
+    with pytest.raises(ValueError):
+        ColorDetectionConfig(
+            salience_strategy="weighted",
+            contrast_method="combined",
+            sobel_weight=0.5,
+            rarity_space="lab",
+            rarity_k=4,
+            weights={"hue": 0.1, "sat": 0.3, "rarity": 0.2, "lum": 0.4},
+            analysis_resolution="half"
+        )
+
+
+@pytest.mark.parametrize("engine", ["kmeans", "sampled", "minibatch", "histogram"])
+@pytest.mark.parametrize("space", ["lab", "hue"])
+def test_rarity_engines_deterministic(engine, space):
+    from src.analyzer.features.color_detection.transforms import compute_color_rarity
+
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, size=(24, 32, 3), dtype=np.uint8)
+    first = compute_color_rarity(img, space=space, k=4, engine=engine, sample_size=200)
+    second = compute_color_rarity(img, space=space, k=4, engine=engine, sample_size=200)
+    assert first.shape == (24, 32)
+    assert first.min() >= 0.0 and first.max() <= 1.0
+    np.testing.assert_array_equal(first, second)
+
+
+def test_rarity_sample_covers_k():
+    from src.analyzer.features.color_detection.transforms import compute_color_rarity
+
+    with pytest.raises(ValueError):
+        ColorDetectionConfig(
+            salience_strategy="weighted",
+            contrast_method="combined",
+            sobel_weight=0.5,
+            rarity_space="lab",
+            rarity_k=8,
+            weights={"hue": 0.1, "sat": 0.3, "rarity": 0.2, "lum": 0.4},
+            rarity_sample_size=4
+        )
+    # a 10x10 image yields a 25-cell grid for sample_size 50; the grid is refined to fit k
+    img = np.random.default_rng(0).integers(0, 256, size=(10, 10, 3), dtype=np.uint8)
+    rarity = compute_color_rarity(img, space="lab", k=30, engine="sampled", sample_size=50)
+    assert rarity.shape == (10, 10)
+
+
+def test_histogram_rarity_highlights_rare_color():
+    from src.analyzer.features.color_detection.transforms import compute_color_rarity
+
+    img = np.zeros((20, 20, 3), dtype=np.uint8)
+    img[:] = (200, 40, 40)  # mostly blue (BGR)
+    img[8:10, 8:10] = (40, 40, 220)  # a small red patch
+    rarity = compute_color_rarity(img, space="lab", k=2, engine="histogram")
+    assert rarity[9, 9] > rarity[0, 0]
+
+
+def test_color_spaces_converted_once_per_view(dummy_cfg, monkeypatch):
+    import cv2
+
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, size=(40, 50, 3), dtype=np.uint8)
+    cfg = dummy_cfg.model_copy(update={"analysis_resolution": "max_pixels", "analysis_max_pixels": 500})
+    expected = ColorDetector(cfg).compute_cues({"bgr": {"og": img}})
+
+    conversions = []
+    original = cv2.cvtColor
+    monkeypatch.setattr(cv2, "cvtColor", lambda src, code: conversions.append(code) or original(src, code))
+    image_data = {"bgr": {"og": img}}
+    detector = ColorDetector(cfg)
+    cues = detector.compute_cues(image_data)
+    detector.compute_cues(image_data)
+
+    # one HSV and one LAB conversion of the downsampled view, shared by every cue
+    assert sorted(conversions) == sorted([cv2.COLOR_BGR2HSV, cv2.COLOR_BGR2LAB])
+    assert image_data["lab"]["max_pixels_500"].shape[:2] == image_data["bgr"]["max_pixels_500"].shape[:2]
+    for name, cue_map in expected.items():
+        np.testing.assert_array_equal(cue_map, cues[name])
+
+
+def test_stacked_blocks_match_per_cue(dummy_cfg):
+    from src.analyzer.features.color_detection.transforms import compute_color_density
+    from src.analyzer.features.color_detection.intra_fusion import compute_cue_salience
+
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, size=(24, 32, 3), dtype=np.uint8)
+    cd = ColorDetector(dummy_cfg)
+    cue_maps = cd.compute_cues({"bgr": {"og": img}})
+    blocks = cd.build_cue_blocks(cue_maps)
+
+    for name, cue_map in cue_maps.items():
+        density = compute_color_density(cue_map, window_size=4)
+        salience = compute_cue_salience(cue_map, density, strategy="product")
+        np.testing.assert_allclose(blocks[name]["density"], density, atol=1e-4)
+        np.testing.assert_allclose(blocks[name]["salience"], salience, atol=1e-4)
+
+
+def test_debug_output_is_lazy(dummy_cfg, monkeypatch, capsys):
+    from loguru import logger
+    import src.analyzer.features.color_detection.base as color_base
+
+    calls = []
+    monkeypatch.setattr(color_base, "format_structure", lambda d: calls.append(d) or "")
+    logger.remove()
+    handler = logger.add(lambda _: None, level="INFO")
+    try:
+        ColorDetector(dummy_cfg).detect({"bgr": {"og": np.zeros((8, 8, 3), dtype=np.uint8)}})
+    finally:
+        logger.remove(handler)
+        logger.add(sys.stderr)
+    assert calls == []
+    assert capsys.readouterr().out == ""
+
+
+@pytest.mark.parametrize("engine", ["sampled", "histogram"])
+def test_tiled_detect_matches_in_memory(dummy_cfg, engine):
+    import cv2
+    from src.betteredit.config import TilingConfig
+
+    img = np.random.default_rng(0).integers(0, 256, size=(90, 130, 3), dtype=np.uint8)
+    img = cv2.GaussianBlur(img, (9, 9), 0)
+    cfg = dummy_cfg.model_copy(update={"rarity_engine": engine, "density_window_sizes": [4, 9]})
+    tiling = TilingConfig(enabled=True, tile_size=64, min_pixels=1)
+    expected = ColorDetector(cfg).detect({"bgr": {"og": img}})
+    result = ColorDetector(cfg, tiling=tiling).detect({"bgr": {"og": img}})
+
+    assert isinstance(result["combined"]["strength"], np.memmap)
+    for name, block in expected["cues"].items():
+        for key, arr in block.items():
+            np.testing.assert_allclose(result["cues"][name][key], arr, atol=1e-5, err_msg=f"{name}.{key}")
+    for key, arr in expected["combined"].items():
+        np.testing.assert_allclose(result["combined"][key], arr, atol=1e-5, err_msg=key)
+
+    small = TilingConfig(enabled=True, tile_size=64, min_pixels=img.shape[0] * img.shape[1] + 1)
+    assert ColorDetector(cfg, tiling=small).tiled_analysis({"bgr": {"og": img}}) is None
+
+
+def test_padded_analysis_crops_letterbox(dummy_cfg):
+    import cv2
+
+    rng = np.random.default_rng(0)
+    content = cv2.GaussianBlur(rng.integers(0, 256, size=(16, 24, 3), dtype=np.uint8), (5, 5), 0)
+    padding = {"top": 0, "bottom": 0, "left": 5, "right": 3}
+    padded = cv2.copyMakeBorder(content, 0, 0, 5, 3, cv2.BORDER_CONSTANT, value=[0, 0, 0])
+    cfg = dummy_cfg.model_copy(update={"analysis_resolution": "padded", "rarity_engine": "histogram"})
+
+    result = ColorDetector(cfg).detect({"bgr": {"padded": padded}, "padding": padding})
+    direct = ColorDetector(cfg).detect({"bgr": {"padded": content}})
+    for name, block in result["cues"].items():
+        for key, arr in block.items():
+            assert arr.shape == padded.shape[:2]
+            assert not arr[:, :5].any() and not arr[:, -3:].any()
+            np.testing.assert_allclose(arr[:, 5:-3], direct["cues"][name][key], atol=1e-6)
+    np.testing.assert_allclose(result["combined"]["salience"][:, 5:-3], direct["combined"]["salience"], atol=1e-6)
+
+
+def test_cue_subset(dummy_cfg):
+    img = np.random.default_rng(0).integers(0, 256, size=(12, 16, 3), dtype=np.uint8)
+    cfg = dummy_cfg.model_copy(update={"cues": ["saturation", "luminance_contrast"]})
+    result = ColorDetector(cfg).detect({"bgr": {"og": img}})
+    assert set(result["cues"]) == {"saturation", "luminance_contrast"}
+
+    full = ColorDetector(dummy_cfg).detect({"bgr": {"og": img}})
+    np.testing.assert_allclose(
+        result["cues"]["luminance_contrast"]["map"], full["cues"]["luminance_contrast"]["map"], atol=1e-6
+    )
+    with pytest.raises(ValueError):
+        ColorDetector(cfg.model_copy(update={"salience_strategy": "minimal"})).detect({"bgr": {"og": img}})
+    with pytest.raises(ValueError):
+        ColorDetectionConfig(**{**dummy_cfg.model_dump(), "cues": ["edges"]})
+
+
+def test_contrast_pyramid_level_shares_hue_pyramids(dummy_cfg):
+    img = np.random.default_rng(0).integers(0, 256, size=(32, 40, 3), dtype=np.uint8)
+    cfg = dummy_cfg.model_copy(update={"contrast_pyramid_level": 1, "hue_contrast_sigma": 4.0})
+    image_data = {"bgr": {"og": img}}
+    result = ColorDetector(cfg).detect(image_data)
+    assert result["cues"]["hue_contrast"]["map"].shape == (32, 40)
+    assert set(image_data["pyramids"]) == {"hue_sin:og", "hue_cos:og"}
+    assert ColorDetector(cfg)._cue_params("hue_contrast")["pyramid_level"] == 1
+
+
+def test_roi_refinement_recomputes_salient_regions(dummy_cfg):
+    img = np.full((64, 64, 3), 90, dtype=np.uint8)
+    img[24:36, 28:40] = (20, 40, 230)
+    roi = RoiRefinementConfig(enabled=True, coarse_level=1, salience_quantile=0.9)
+    cfg = dummy_cfg.model_copy(update={"rarity_engine": "histogram", "rarity_bins": 8})
+    refined = ColorDetector(cfg.model_copy(update={"roi_refinement": roi})).compute_cues({"bgr": {"og": img}})
+    full = ColorDetector(cfg).compute_cues({"bgr": {"og": img}})
+    assert refined["rarity"].shape == (64, 64)
+    assert 0.0 <= refined["rarity"].min() and refined["rarity"].max() <= 1.0
+    # the rare patch is refined at full resolution and stays the rarest region
+    np.testing.assert_allclose(refined["rarity"][27:33, 31:37], full["rarity"][27:33, 31:37], atol=1e-2)
+    np.testing.assert_allclose(refined["saturation"], full["saturation"])
+    assert "roi_refinement" in ColorDetector(cfg.model_copy(update={"roi_refinement": roi}))._cue_params("rarity")
+
+    # with rarity as the only cue the regions come from the coarse rarity alone
+    rarity_only = cfg.model_copy(update={"cues": ["rarity"]})
+    detector = ColorDetector(rarity_only.model_copy(update={"roi_refinement": roi}))
+    assert detector.refine_rarity and detector.coarse_detector is None
+    calls = []
+    detector.refined_rarity = lambda data, res: calls.append(res) or ColorDetector.refined_rarity(detector, data, res)
+    alone = detector.compute_cues({"bgr": {"og": img}})["rarity"]
+    assert calls == ["og"]
+    np.testing.assert_allclose(alone[27:33, 31:37], full["rarity"][27:33, 31:37], atol=1e-2)
+
+
+def result_arrays(result):
+    out = {f"combined.{key}": arr for key, arr in result["combined"].items()}
+    for name, block in result["cues"].items():
+        out.update({f"{name}.{key}": arr for key, arr in block.items()})
+    return out
+
+
+@pytest.mark.parametrize("engine", ["sampled", "histogram", "kmeans"])
+def test_incremental_update_matches_full_analysis(dummy_cfg, engine):
+    rng = np.random.default_rng(0)
+    img = cv2.GaussianBlur(rng.integers(0, 256, size=(96, 128, 3), dtype=np.uint8), (7, 7), 0)
+    cfg = dummy_cfg.model_copy(update={"rarity_engine": engine, "rarity_bins": 8})
+    detector = ColorDetector(cfg)
+    # incremental kmeans fits its centers on the stratified sample, like 'sampled'
+    reference = ColorDetector(cfg.model_copy(update={"rarity_engine": "sampled"})) if engine == "kmeans" else detector
+    incremental = IncrementalConfig(tile_size=32, tolerance=0.0)
+
+    analysis = detector.incremental_analysis(incremental)
+    first = detector.detect_incremental({"bgr": {"og": img}}, analysis)
+    direct = result_arrays(reference.detect({"bgr": {"og": img}}))
+    assert "combined.salience" in direct and "rarity.density" in direct
+    for key, arr in result_arrays(first).items():
+        np.testing.assert_allclose(arr, direct[key], atol=1e-5, err_msg=key)
+
+    edited = img.copy()
+    edited[40:60, 70:90] = 255 - edited[40:60, 70:90]
+    updated = result_arrays(analysis.update(edited))
+    fresh = result_arrays(detector.incremental_analysis(incremental).update(edited))
+    assert updated.keys() == fresh.keys()
+    for key, arr in fresh.items():
+        np.testing.assert_allclose(updated[key], arr, atol=1e-5, err_msg=key)
+    # results are the state's arrays, updated in place instead of copied
+    assert first["cues"]["hue"]["map"] is updated["hue.map"]
+
+
+def test_incremental_default_tolerance_stays_close(dummy_cfg):
+    rng = np.random.default_rng(0)
+    img = cv2.GaussianBlur(rng.integers(0, 256, size=(192, 256, 3), dtype=np.uint8), (7, 7), 0)
+    detector = ColorDetector(dummy_cfg.model_copy(update={"rarity_engine": "histogram", "rarity_bins": 8}))
+    incremental = IncrementalConfig(tile_size=32)
+    analysis = detector.incremental_analysis(incremental)
+    analysis.update(img)
+    for _ in range(3):
+        y, x = rng.integers(0, 160), rng.integers(0, 210)
+        img = img.copy()
+        img[y:y + 24, x:x + 40] = 255 - img[y:y + 24, x:x + 40]
+        updated = result_arrays(analysis.update(img))
+        full = result_arrays(detector.detect({"bgr": {"og": img}}))
+        for key, arr in full.items():
+            np.testing.assert_allclose(updated[key], arr, atol=2 * incremental.tolerance, err_msg=key)
@@ -68,4 +68,39 @@ def test_invalid_intra_fusion_weights_rejected():
     bad = copy.deepcopy(VALID_YAML)
     bad["edge_detection"]["intra_fusion_weights"] = {"canny": 0.3, "sobel": 0.3}
     with pytest.raises(ValueError):
-        Settings(**bad)
\ No newline at end of file
+        Settings(**bad)
+
+def test_invalid_preview_lists_rejected():
+    for preview in (
+        {"edge_methods": []}, {"edge_methods": ["sobol"]}, {"color_cues": []}, {"color_cues": ["sat"]},
+        {"color_cues": ["luminance"]}, {"color_cues": ["hue"]}
+    ):
+        bad = copy.deepcopy(VALID_YAML)
+        bad["preview"] = preview
+        with pytest.raises(ValueError):
+            Settings(**bad)
+
+def test_unfusable_color_cues_rejected():
+    zero_rarity = {"hue": 0.5, "sat": 0.5, "rarity": 0.0, "lum": 0.0}
+
+    def color(strategy, cues, weights=None):
+        cfg = copy.deepcopy(VALID_YAML["color_detection"])
+        cfg.update(salience_strategy=strategy, cues=cues, weights=weights or cfg["weights"])
+        return cfg
+
+    for bad in (
+        color("weighted", ["hue", "luminance"]),
+        color("minimal", ["saturation", "rarity"]),
+        color("weighted", ["rarity"], zero_rarity),
+    ):
+        with pytest.raises(ValueError):
+            ColorDetectionConfig(**bad)
+    for good in (color("full", None), color("boosted", ["hue_contrast", "saturation"]), color("weighted", ["hue", "rarity"])):
+        ColorDetectionConfig(**good)
+
+def test_environment_fills_missing_fields(monkeypatch):
+    monkeypatch.setenv("MAX_WORKERS", "3")
+    monkeypatch.setenv("IMAGE_PATH", "env.jpg")
+    cfg = Settings(**VALID_YAML)
+    assert cfg.max_workers == 3
+    assert cfg.image_path == "foo.jpg"  # given values win
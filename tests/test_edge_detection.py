@@ -35,4 +35,48 @@ def test_detect_returns_expected_keys(dummy_cfg):
         block = result["cues"][m]
         assert set(block.keys()) == {"map","density","salience"}
     # Combined should have at least 'strength'
-    assert "strength" in result["combined"]
\ No newline at end of file
+    assert "strength" in result["combined"]
+
+@pytest.mark.parametrize("strategy", ["product", "sum"])
+def test_stacked_blocks_match_per_method(dummy_cfg, strategy):
+    from src.analyzer.features.edge_detection.transforms import compute_edge_density, compute_edge_salience
+
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, size=(24, 32, 3), dtype=np.uint8)
+    cfg = dummy_cfg.model_copy(update={"methods": ["canny", "sobel", "laplacian"], "salience_strategy": strategy})
+    ed = EdgeDetector(cfg)
+    edge_maps = ed.compute_cues({"rgb": {"padded": img}})
+    blocks = ed.build_cue_blocks(edge_maps)
+
+    for method, edge_map in edge_maps.items():
+        density = compute_edge_density(edge_map, window_size=4)
+        salience = compute_edge_salience(edge_map.astype(np.float32), density, strategy)
+        np.testing.assert_allclose(blocks[method]["density"], density, atol=1e-5)
+        np.testing.assert_allclose(blocks[method]["salience"], salience, atol=1e-5)
+
+
+def test_crop_padding_skips_letterbox(dummy_cfg):
+    import cv2
+
+    rng = np.random.default_rng(0)
+    content = cv2.GaussianBlur(rng.integers(60, 200, size=(20, 40, 3), dtype=np.uint8), (5, 5), 0)
+    padding = {"top": 6, "bottom": 4, "left": 0, "right": 0}
+    padded = cv2.copyMakeBorder(content, 6, 4, 0, 0, cv2.BORDER_CONSTANT, value=[0, 0, 0])
+
+    def image_data():
+        return {"rgb": {"padded": padded}, "padding": padding}
+
+    cropped = EdgeDetector(dummy_cfg).detect(image_data())
+    full = EdgeDetector(dummy_cfg.model_copy(update={"crop_padding": False})).detect(image_data())
+    direct = EdgeDetector(dummy_cfg).detect({"rgb": {"padded": content}})
+
+    for method in dummy_cfg.methods:
+        for key, arr in cropped["cues"][method].items():
+            assert arr.shape == padded.shape[:2]
+            assert not arr[:6].any() and not arr[-4:].any()
+            # the content matches running on the unpadded image
+            np.testing.assert_allclose(arr[6:-4], direct["cues"][method][key], atol=1e-6)
+    for key, arr in cropped["combined"].items():
+        np.testing.assert_allclose(arr[6:-4], direct["combined"][key], atol=1e-6)
+    # without cropping, the black border's edge dominates the Sobel map
+    assert full["cues"]["sobel"]["map"][5:7].mean() > 2 * cropped["cues"]["sobel"]["map"][5:8].mean()
@@ -36,4 +36,60 @@ def test_benchmark_smoke(tmp_path):
     
     # Should complete without error
     run_benchmark(cfg, target_size, benchmark_image_dir, output_dir)
-    assert os.path.exists(output_dir)
\ No newline at end of file
+    assert os.path.exists(output_dir)
+
+
+def test_progressive_run_emits_preview_first(tmp_path):
+    """run(on_preview=...) hands over coarse preview features before the full analysis."""
+    import numpy as np
+    from PIL import Image
+    from src.pipeline import run
+
+    image_path = str(tmp_path / "image.png")
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, size=(120, 200, 3), dtype=np.uint8)).save(image_path)
+    cfg = Settings.load()
+    cfg.output_dir = str(tmp_path)
+    cfg.save_visuals = False
+    cfg.edge_detection = cfg.edge_detection.model_copy(
+        update={"methods": ["canny", "sobel"], "intra_fusion_weights": {"canny": 0.5, "sobel": 0.5}}
+    )
+    cfg.color_detection = cfg.color_detection.model_copy(update={"rarity_engine": "histogram"})
+
+    previews = []
+    features = run(image_path, (128, 64), cfg, on_preview=previews.append)
+
+    assert len(previews) == 1
+    preview = previews[0]
+    assert preview["edges"]["salience"].shape == (16, 32)
+    assert set(preview["edges"]) >= {"sobel"} and "canny" not in preview["edges"]
+    assert "saturation" in preview["color"] and "rarity" not in preview["color"]
+    assert preview["color"]["salience"].shape == (16, 32)
+    assert features["edges"]["salience"].shape == (64, 128)
+    assert "rarity" in features["color"]
+
+
+def test_reanalyze_updates_edited_image(tmp_path):
+    """reanalyze() returns full features and a state that later versions of the image reuse."""
+    import numpy as np
+    from PIL import Image
+    from src.pipeline import reanalyze
+
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, size=(120, 200, 3), dtype=np.uint8)
+    image_path = str(tmp_path / "image.png")
+    Image.fromarray(img).save(image_path)
+    cfg = Settings.load()
+    cfg.edge_detection = cfg.edge_detection.model_copy(
+        update={"methods": ["canny", "sobel"], "intra_fusion_weights": {"canny": 0.5, "sobel": 0.5}}
+    )
+    cfg.color_detection = cfg.color_detection.model_copy(update={"rarity_engine": "histogram"})
+
+    features, analysis = reanalyze(image_path, (128, 64), cfg)
+    assert features["color"]["salience"].shape == (120, 200)
+    assert features["edges"]["salience"].shape == (64, 128)
+
+    img[10:30, 20:60] = 0
+    Image.fromarray(img).save(image_path)
+    updated, same = reanalyze(image_path, (128, 64), cfg, analysis)
+    assert same is analysis
+    assert not updated["color"]["luminance"]["map"][10:30, 20:60].any()
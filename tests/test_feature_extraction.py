@@ -31,4 +31,69 @@ def test_feature_extractor_roundtrip(tmp_path, small_cfg):
     assert "color" in feats and "edges" in feats
     # each should have at least one map
     assert "hue" in feats["color"]
-    assert "canny" in feats["edges"]
\ No newline at end of file
+    assert "canny" in feats["edges"]
+
+def test_threaded_extraction_matches_serial(small_cfg):
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, size=(24, 32, 3), dtype=np.uint8)
+    image_data = {
+        "bgr": {"og": img[..., ::-1]},
+        "rgb": {"padded": img},
+        "gray": {"padded": img[..., 0].copy()},
+    }
+    edge_cfg = small_cfg.edge_detection.model_copy(update={
+        "methods": ["canny", "sobel", "laplacian"],
+        "intra_fusion_weights": {"canny": 0.5, "sobel": 0.25, "laplacian": 0.25}
+    })
+
+    def run(workers):
+        return FeatureExtractor(
+            enable_color=True,
+            enable_edges=True,
+            enable_objects=False,
+            enable_saliency=False,
+            use_dl_models=False,
+            color_detector_config=small_cfg.color_detection.model_copy(update={"max_workers": workers}),
+            edge_detector_config=edge_cfg.model_copy(update={"max_workers": workers}),
+            max_workers=workers
+        ).extract(image_data)
+
+    serial, threaded = run(1), run(4)
+    assert list(serial.keys()) == list(threaded.keys())
+    for section in serial:
+        assert list(serial[section].keys()) == list(threaded[section].keys())
+        for key, value in serial[section].items():
+            if isinstance(value, dict):
+                for sub, arr in value.items():
+                    np.testing.assert_array_equal(arr, threaded[section][key][sub])
+            elif isinstance(value, np.ndarray):
+                np.testing.assert_array_equal(value, threaded[section][key])
+
+def test_threaded_extraction_reuses_workspaces(small_cfg):
+    from src.analyzer.features.workspace import Workspace
+
+    img = np.random.default_rng(0).integers(0, 256, size=(24, 32, 3), dtype=np.uint8)
+    image_data = {"bgr": {"og": img[..., ::-1]}, "rgb": {"padded": img}, "gray": {"padded": img[..., 0].copy()}}
+    edge_cfg = small_cfg.edge_detection.model_copy(update={
+        "methods": ["canny", "sobel"],
+        "intra_fusion_weights": {"canny": 0.5, "sobel": 0.5}
+    })
+    fe = FeatureExtractor(
+        enable_color=True,
+        enable_edges=True,
+        enable_objects=False,
+        enable_saliency=False,
+        use_dl_models=False,
+        color_detector_config=small_cfg.color_detection,
+        edge_detector_config=edge_cfg,
+        max_workers=2
+    )
+
+    def idle_buffers():
+        return {id(buf) for idle in Workspace._idle.values() for ws in idle for buf in ws._buffers.values()}
+
+    fe.extract(image_data)
+    first = idle_buffers()
+    fe.extract(image_data)
+    # the second call's pool threads get the first call's buffers back
+    assert first and idle_buffers() == first
@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+import pytest
+from src.analyzer.gradients import Gradients, image_gradients
+from src.analyzer.features.edge_detection.extractors import extract_canny, extract_sobel, extract_laplacian
+from src.analyzer.features.color_detection.transforms import compute_luminance_contrast
+
+
+@pytest.fixture
+def rgb():
+    rng = np.random.default_rng(0)
+    img = cv2.GaussianBlur(rng.integers(0, 256, size=(40, 56, 3), dtype=np.uint8), (5, 5), 0)
+    return img
+
+
+def test_shared_gradients_match_standalone_extractors(rgb):
+    image_data = {"rgb": {"padded": rgb}}
+    gradients = image_gradients(image_data, "gray", "padded")
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    np.testing.assert_array_equal(gradients.channel, gray)
+
+    dx, dy = gradients.derivatives(3)
+    assert dx.dtype == np.int16
+    np.testing.assert_array_equal(
+        extract_canny(rgb, sigma=0.33, gray=gray, derivatives=(dx, dy)),
+        extract_canny(rgb, sigma=0.33)
+    )
+    np.testing.assert_array_equal(extract_sobel(gray, magnitude=gradients.magnitude()), extract_sobel(gray))
+    np.testing.assert_array_equal(
+        extract_laplacian(gray, blurred=gradients.blurred(3, 1.0)),
+        extract_laplacian(gray)
+    )
+
+    luminance = gray.astype(np.float32) / 255.0
+    shared = Gradients(luminance).magnitude()
+    np.testing.assert_array_equal(
+        compute_luminance_contrast(luminance, "combined", 0.5, gradient_magnitude=shared),
+        compute_luminance_contrast(luminance, "combined", 0.5)
+    )
+
+
+def test_gradients_are_memoized_per_image(rgb):
+    image_data = {"rgb": {"padded": rgb}}
+    gradients = image_gradients(image_data, "gray", "padded")
+    assert image_gradients(image_data, "gray", "padded") is gradients
+    assert gradients.magnitude() is gradients.magnitude()
+    assert gradients.derivatives(3) is gradients.derivatives(3)
+    assert gradients.magnitude(5) is not gradients.magnitude(3)
+
+    orientation = gradients.orientation()
+    assert orientation.dtype == np.float32 and orientation.shape == rgb.shape[:2]
+    assert orientation.min() >= 0.0 and orientation.max() < 2 * np.pi + 1e-5
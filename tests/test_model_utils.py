@@ -0,0 +1,79 @@
+import hashlib
+import pytest
+from src.dl_models import model_utils
+from src.dl_models.model_utils import ModelRegistry
+
+
+@pytest.fixture
+def fake_sed(monkeypatch):
+    """Replace the OpenCV SED constructor with a counting stub."""
+    from cv2 import ximgproc
+
+    loads = []
+
+    def create(path):
+        loads.append(path)
+        return object()
+
+    monkeypatch.setattr(ximgproc, "createStructuredEdgeDetection", create)
+    ModelRegistry.clear()
+    yield loads
+    ModelRegistry.clear()
+
+
+def test_model_loaded_once(tmp_path, fake_sed):
+    path = tmp_path / "model.yml.gz"
+    path.write_bytes(b"model")
+    first = ModelRegistry.structured_edge_model(str(path))
+    second = ModelRegistry.structured_edge_model(str(path))
+    assert first is second
+    assert len(fake_sed) == 1
+    assert ModelRegistry.is_loaded(str(path))
+
+
+def test_checksum_verified(tmp_path, fake_sed):
+    path = tmp_path / "model.yml.gz"
+    path.write_bytes(b"model")
+    good = hashlib.sha256(b"model").hexdigest()
+    assert ModelRegistry.structured_edge_model(str(path), sha256=good) is not None
+
+    ModelRegistry.clear()
+    with pytest.raises(ValueError):
+        ModelRegistry.structured_edge_model(str(path), sha256="0" * 64)
+
+
+def test_offline_missing_model_does_not_download(tmp_path, fake_sed, monkeypatch):
+    def no_network(*args, **kwargs):
+        raise AssertionError("offline mode must not download")
+
+    monkeypatch.setattr(model_utils.urllib.request, "urlretrieve", no_network)
+    with pytest.raises(FileNotFoundError):
+        ModelRegistry.structured_edge_model(str(tmp_path / "missing.yml.gz"), offline=True)
+
+
+def test_checksum_verified_after_unverified_load(tmp_path, fake_sed):
+    path = tmp_path / "model.yml.gz"
+    path.write_bytes(b"model")
+    model = ModelRegistry.structured_edge_model(str(path))
+    with pytest.raises(ValueError):
+        ModelRegistry.structured_edge_model(str(path), sha256="0" * 64)
+    good = hashlib.sha256(b"model").hexdigest()
+    assert ModelRegistry.structured_edge_model(str(path), sha256=good) is model
+    assert len(fake_sed) == 1
+
+
+@pytest.mark.parametrize("payload", [None, b"corrupt"])
+def test_failed_download_leaves_no_files(tmp_path, fake_sed, monkeypatch, payload):
+    def retrieve(url, filename):
+        with open(filename, "wb") as f:
+            f.write(b"partial")
+        if payload is None:
+            raise OSError("connection reset")
+        with open(filename, "wb") as f:
+            f.write(payload)
+
+    monkeypatch.setattr(model_utils.urllib.request, "urlretrieve", retrieve)
+    path = tmp_path / "model.yml.gz"
+    with pytest.raises((OSError, ValueError)):
+        ModelRegistry.structured_edge_model(str(path), sha256="0" * 64)
+    assert list(tmp_path.iterdir()) == []
@@ -1,5 +1,6 @@
 import os
 import unittest
+import cv2
 import numpy as np
 from src.analyzer.preprocessing import preprocess_image
 
@@ -86,5 +87,120 @@ class TestImagePreprocessing(unittest.TestCase):
             self.assertEqual(padded.shape, normalized.shape)
 
 
+    def test_views_are_lazy_and_memoized(self):
+        output = preprocess_image(self.image_path, self.target_size)
+        self.assertFalse(output["hsv"].is_materialized("og"))
+        first = output["hsv"]["og"]
+        self.assertTrue(output["hsv"].is_materialized("og"))
+        self.assertIs(first, output["hsv"]["og"])
+        self.assertFalse(output["lab"].is_materialized("og_normalized"))
+
+    def test_bgr_is_zero_copy_view_of_rgb(self):
+        rgb = self.output["rgb"]["padded"]
+        bgr = self.output["bgr"]["padded"]
+        self.assertTrue(np.shares_memory(rgb, bgr))
+        np.testing.assert_array_equal(bgr, rgb[..., ::-1])
+
+    def test_color_view_converts_once(self):
+        from src.analyzer.preprocessing import color_view
+
+        output = preprocess_image(self.image_path, self.target_size)
+        lab = color_view(output, "lab", "og")
+        self.assertIs(lab, output["lab"]["og"])
+
+        small = cv2.resize(output["bgr"]["og"], (16, 16))
+        plain = {"bgr": {"small": small}}
+        hsv = color_view(plain, "hsv", "small")
+        np.testing.assert_array_equal(hsv, cv2.cvtColor(small, cv2.COLOR_BGR2HSV))
+        self.assertIs(color_view(plain, "hsv", "small"), hsv)
+        with self.assertRaises(KeyError):
+            color_view(plain, "gray", "og")
+
+    def test_views_materialize_concurrently(self):
+        import threading
+        from src.analyzer.preprocessing import LazyViews
+
+        # each factory waits for the other, so a lock held while building would deadlock
+        started = {"a": threading.Event(), "b": threading.Event()}
+
+        def factory(key, other):
+            def build():
+                started[key].set()
+                self.assertTrue(started[other].wait(timeout=5))
+                return np.full(1, ord(key))
+            return build
+
+        views = LazyViews({"a": factory("a", "b"), "b": factory("b", "a")})
+        results = {}
+        threads = [threading.Thread(target=lambda k=k: results.__setitem__(k, views[k])) for k in "ab"]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        self.assertEqual({k: int(v[0]) for k, v in results.items()}, {"a": ord("a"), "b": ord("b")})
+        self.assertIs(views["a"], results["a"])
+
+    def test_draft_decode_for_large_jpeg(self):
+        import tempfile
+        from PIL import Image
+        from src.config.design_registry import DesignRegistry
+
+        rng = np.random.default_rng(0)
+        img = rng.integers(0, 256, size=(1200, 1600, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "large.jpg")
+            Image.fromarray(img).save(path, quality=90)
+            output = preprocess_image(path, (100, 100), draft_decode=True)
+
+            complete = DesignRegistry.get("Preprocessing")["Image Processing"]["Preprocessing Complete"]
+            self.assertEqual(complete["image_transformation"]["decode_scale"], 0.125)
+            self.assertEqual(output["rgb"]["padded"].shape, (100, 100, 3))
+            # the full-resolution original is decoded only on demand
+            self.assertFalse(output["rgb"].is_materialized("og"))
+            self.assertEqual(output["rgb"]["og"].shape, (1200, 1600, 3))
+
+            # without draft decoding the padded view comes from the single full decode
+            preprocess_image(path, (100, 100))
+            complete = DesignRegistry.get("Preprocessing")["Image Processing"]["Preprocessing Complete"]
+            self.assertEqual(complete["image_transformation"]["decode_scale"], 1.0)
+
+    def test_disk_backed_original(self):
+        import tempfile
+        from PIL import Image
+
+        img = np.random.default_rng(0).integers(0, 256, size=(300, 400, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "large.png")
+            Image.fromarray(img).save(path)
+            output = preprocess_image(path, (100, 100), disk_min_pixels=300 * 400, disk_dir=tmp)
+            self.assertIsInstance(output["rgb"]["og"], np.memmap)
+            np.testing.assert_array_equal(output["rgb"]["og"], img)
+            np.testing.assert_array_equal(output["bgr"]["og"], img[..., ::-1])
+
+            in_memory = preprocess_image(path, (100, 100), disk_min_pixels=300 * 400 + 1)
+            self.assertNotIsInstance(in_memory["rgb"]["og"], np.memmap)
+
+    def test_disk_backed_decode_is_bounded(self):
+        import tempfile
+        import tracemalloc
+        from PIL import Image
+        from src.analyzer.preprocessing import DISK_COPY_ROWS
+
+        img = np.random.default_rng(0).integers(0, 256, size=(6 * DISK_COPY_ROWS, 1000, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp:
+            for ext in ("tif", "bmp"):  # top-down and bottom-up row order
+                path = os.path.join(tmp, f"large.{ext}")
+                Image.fromarray(img).save(path)
+                expected = preprocess_image(path, (100, 100))["rgb"]["padded"]
+
+                tracemalloc.start()
+                output = preprocess_image(path, (100, 100), disk_min_pixels=1, disk_dir=tmp)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                # one band and its copy, never the full frame
+                self.assertLess(peak, img.nbytes / 2)
+                np.testing.assert_array_equal(output["rgb"]["og"], img)
+                np.testing.assert_array_equal(output["rgb"]["padded"], expected)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,79 @@
+import json
+import numpy as np
+import pytest
+from src.config.design_registry import DesignRegistry
+from src.config.profiler import StageProfiler
+from src.analyzer.features.parallel import run_tasks
+
+
+@pytest.fixture
+def profiler():
+    StageProfiler.configure(True, trace_memory=True)
+    StageProfiler.reset()
+    yield StageProfiler
+    StageProfiler.configure(False)
+    StageProfiler.reset()
+
+
+def test_disabled_records_nothing():
+    StageProfiler.configure(False)
+    StageProfiler.reset()
+    with StageProfiler.stage("noop"):
+        pass
+
+    @StageProfiler.profiled("noop.fn")
+    def fn():
+        return 1
+
+    assert fn() == 1
+    assert run_tasks({"a": lambda: 1}, 1, stage="noop") == {"a": 1}
+    assert StageProfiler.records() == []
+
+
+def test_nested_stages_record_time_and_memory(profiler):
+    with profiler.stage("outer"):
+        with profiler.stage("inner"):
+            buf = np.ones(2_000_000, dtype=np.uint8)
+            del buf
+        small = np.ones(1000, dtype=np.uint8)
+        del small
+
+    summary = profiler.summary()
+    assert list(summary) == ["inner", "outer"]
+    assert summary["outer"]["wall_ms"] >= summary["inner"]["wall_ms"] > 0
+    assert summary["inner"]["process_peak_bytes"] >= 2_000_000
+    # The outer stage's peak includes the inner allocation despite the peak reset.
+    assert summary["outer"]["process_peak_bytes"] >= 2_000_000
+
+
+def test_memory_traced_on_main_thread_only(profiler):
+    def allocate():
+        buf = np.ones(2_000_000, dtype=np.uint8)
+        del buf
+
+    with profiler.stage("extract"):
+        run_tasks({"hue": allocate, "rarity": allocate}, 2, stage="color")
+
+    summary = profiler.summary()
+    # worker stages would reset the process-wide peak under the main stage
+    assert summary["color.hue"]["process_peak_bytes"] is None
+    assert summary["color.rarity"]["process_peak_bytes"] is None
+    assert summary["extract"]["process_peak_bytes"] >= 2_000_000
+
+
+def test_run_tasks_stages_and_exports(profiler, tmp_path):
+    run_tasks({"hue": lambda: 1, "rarity": lambda: 2}, 2, stage="color")
+    summary = profiler.summary()
+    assert set(summary) == {"color.hue", "color.rarity"}
+
+    trace_path = tmp_path / "trace.json"
+    profiler.to_chrome_trace(str(trace_path))
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    assert {e["name"] for e in events} == {"color.hue", "color.rarity"}
+    assert all(e["ph"] == "X" and e["cat"] == "color" for e in events)
+
+    DesignRegistry.reset()
+    profiler.to_registry()
+    stages = DesignRegistry.get("Profiling")["Stages"]
+    assert stages["color.hue"]["stage_timing"]["calls"] == 1
+    DesignRegistry.reset()
@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+import pytest
+from src.analyzer.pyramid import GaussianPyramid, image_pyramid
+from src.analyzer.features.color_detection.transforms import compute_hue_contrast
+
+
+def test_levels_are_memoized_pyrdown():
+    img = np.random.default_rng(0).random((37, 50)).astype(np.float32)
+    pyramid = GaussianPyramid(img)
+    assert pyramid.level(0) is img
+    np.testing.assert_array_equal(pyramid.level(2), cv2.pyrDown(cv2.pyrDown(img)))
+    assert pyramid.level(2) is pyramid.level(2)
+    assert pyramid.level(2).shape == (10, 13)
+    assert pyramid.expand(pyramid.level(2), 2).shape == img.shape
+    with pytest.raises(ValueError):
+        pyramid.level(pyramid.max_level + 1)
+
+
+def test_laplacian_reconstructs_level():
+    img = np.random.default_rng(1).random((33, 41)).astype(np.float32)
+    pyramid = GaussianPyramid(img)
+    rebuilt = pyramid.laplacian(0) + pyramid.expand(pyramid.level(1), 1)
+    np.testing.assert_allclose(rebuilt, img, atol=1e-5)
+
+
+def test_image_pyramid_is_shared():
+    rgb = np.random.default_rng(2).integers(0, 256, size=(24, 32, 3), dtype=np.uint8)
+    image_data = {"rgb": {"padded": rgb}}
+    pyramid = image_pyramid(image_data, "gray", "padded")
+    assert image_pyramid(image_data, "gray", "padded") is pyramid
+    np.testing.assert_array_equal(pyramid.level(0), cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY))
+
+
+def test_coarse_hue_contrast_approximates_full_resolution():
+    rng = np.random.default_rng(3)
+    hue = cv2.resize(rng.random((12, 16)).astype(np.float32), (128, 96), interpolation=cv2.INTER_NEAREST)
+    full = compute_hue_contrast(hue, sigma=8.0)
+    coarse = compute_hue_contrast(hue, sigma=8.0, level=2)
+    assert coarse.shape == full.shape
+    assert np.corrcoef(coarse.ravel(), full.ravel())[0, 1] > 0.95
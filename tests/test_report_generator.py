@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+import matplotlib
+from src.analyzer.report.report_generator import (
+    VisualWriter,
+    colormap_lut,
+    format_structure,
+    render_visual_map,
+    save_visual_map,
+)
+
+
+def test_lut_matches_matplotlib_colormap():
+    lut = colormap_lut("inferno")
+    assert lut.shape == (256, 3) and lut.dtype == np.uint8
+    rgba = matplotlib.colormaps["inferno"](np.linspace(0, 1, 256))
+    expected = np.round(rgba[:, 2::-1] * 255).astype(np.uint8)
+    assert np.abs(lut.astype(int) - expected.astype(int)).max() <= 1
+    assert colormap_lut("inferno") is lut
+
+
+def test_render_normalizes_and_handles_nan():
+    fmap = np.array([[0.0, 0.5], [1.0, np.nan]], dtype=np.float32)
+    img = render_visual_map(fmap, cmap="gray")
+    assert img.shape == (2, 2, 3)
+    assert img[0, 0, 0] == 0 and img[1, 0, 0] == 255
+    assert img[1, 1, 0] == 0
+
+    flat = render_visual_map(np.full((4, 4), 3.0), cmap="hot")
+    assert (flat == flat[0, 0]).all()
+
+    titled = render_visual_map(np.zeros((64, 32)), cmap="gray", title="Map")
+    assert titled.shape[0] > 64 and titled.shape[1] == 32
+
+
+def test_save_visual_map_through_writer(tmp_path):
+    fmap = np.random.default_rng(0).random((40, 30)).astype(np.float32)
+    paths = [str(tmp_path / "maps" / f"m{i}.png") for i in range(5)]
+    with VisualWriter() as writer:
+        for path in paths:
+            save_visual_map(fmap, path, cmap="viridis", writer=writer)
+    assert not writer.errors
+    for path in paths:
+        img = cv2.imread(path)
+        assert img is not None and img.shape == (40, 30, 3)
+    np.testing.assert_array_equal(cv2.imread(paths[0]), render_visual_map(fmap, cmap="viridis"))
+
+
+def test_writer_close_reraises_write_errors(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("not a directory")
+    writer = VisualWriter()
+    writer.submit(str(blocker / "map.png"), np.zeros((4, 4, 3), dtype=np.uint8))
+    try:
+        writer.close()
+    except Exception as e:
+        assert "map.png" in str(e)
+    else:
+        raise AssertionError("close() did not re-raise the write error")
+    assert len(writer.errors) == 1
+
+
+def test_save_visual_map_raises_when_not_written(tmp_path, capsys):
+    target = tmp_path / "map.png"
+    target.mkdir()  # its directory exists, but the file cannot be written
+    try:
+        save_visual_map(np.zeros((4, 4), dtype=np.float32), str(target))
+    except IOError as e:
+        assert "map.png" in str(e)
+    else:
+        raise AssertionError("save_visual_map() did not raise on a failed write")
+    assert "[SAVED]" not in capsys.readouterr().out
+
+
+def test_format_structure_outlines_nested_keys():
+    text = format_structure({"cues": {"hue": {"strength": 1}}, "combined": 2})
+    assert text.splitlines() == ["- cues", "  - hue", "    - strength", "- combined"]
@@ -0,0 +1,218 @@
+import json
+import base64
+import socket
+import threading
+import http.client
+import numpy as np
+import pytest
+from PIL import Image
+from src.betteredit.config import Settings
+from src.betteredit.server import AnalysisService, make_server
+
+
+@pytest.fixture
+def base_cfg():
+    cfg = Settings.load()
+    edge = cfg.edge_detection.model_copy(update={
+        "methods": ["canny", "sobel"],
+        "intra_fusion_weights": {"canny": 0.5, "sobel": 0.5}
+    })
+    return cfg.model_copy(update={"edge_detection": edge, "save_visuals": False})
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    rng = np.random.default_rng(0)
+    path = tmp_path / "img.png"
+    Image.fromarray(rng.integers(0, 256, size=(48, 64, 3), dtype=np.uint8)).save(path)
+    return str(path)
+
+
+def running_server(service, **kwargs):
+    httpd = make_server(service, port=0, **kwargs)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd
+
+
+def post(httpd, body):
+    conn = http.client.HTTPConnection("127.0.0.1", httpd.server_port, timeout=60)
+    conn.request("POST", "/analyze", body=json.dumps(body), headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_analyze_path_and_bytes(base_cfg, image_path, tmp_path):
+    service = AnalysisService(
+        base_cfg, workers=1, queue_size=4, output_dir=str(tmp_path / "out"), input_root=str(tmp_path)
+    )
+    service.start()
+    httpd = running_server(service)
+    try:
+        status, result = post(httpd, {"image_path": image_path, "overrides": {"target_size": [32, 32]}})
+        assert status == 200 and result["status"] == "ok"
+        assert result["features"]["edges"]["salience"]["shape"] == [32, 32]
+        assert set(result["features"]["color"]) >= {"hue", "rarity", "salience"}
+
+        with open(image_path, "rb") as f:
+            encoded = base64.b64encode(f.read()).decode("ascii")
+        status, from_bytes = post(httpd, {"image_base64": encoded, "overrides": {"target_size": [32, 32]}})
+        assert status == 200
+        assert from_bytes["features"]["color"]["salience"] == result["features"]["color"]["salience"]
+
+        # same detector settings reuse the warm extractor
+        assert len(service._extractors) == 1
+
+        status, error = post(httpd, {"image_path": str(tmp_path / "missing.png")})
+        assert status == 400 and "missing.png" in error["error"]
+
+        # relative paths resolve under the input root
+        status, _ = post(httpd, {"image_path": "img.png", "overrides": {"target_size": [32, 32]}})
+        assert status == 200
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        service.stop()
+
+
+def test_back_pressure_returns_503(base_cfg, image_path):
+    release = threading.Event()
+
+    class BlockingService(AnalysisService):
+        def analyze(self, request):
+            release.wait(timeout=30)
+            return {"status": "ok"}
+
+    service = BlockingService(base_cfg, workers=1, queue_size=1)
+    service.start()
+    httpd = running_server(service)
+    try:
+        first = service.submit({"image_path": image_path})   # taken by the worker
+        while service.queued():
+            pass
+        second = service.submit({"image_path": image_path})  # fills the queue
+        status, body = post(httpd, {"image_path": image_path})
+        assert status == 503 and body["status"] == "busy"
+        release.set()
+        assert first.result(timeout=30)["status"] == "ok"
+        assert second.result(timeout=30)["status"] == "ok"
+    finally:
+        release.set()
+        httpd.shutdown()
+        httpd.server_close()
+        service.stop()
+
+
+def test_paths_confined_to_roots(base_cfg, image_path, tmp_path):
+    service = AnalysisService(
+        base_cfg, workers=1, queue_size=4, output_dir=str(tmp_path / "out"), input_root=str(tmp_path / "inputs")
+    )
+    service.start()
+    httpd = running_server(service)
+    try:
+        for body in (
+            {"image_path": image_path},
+            {"image_path": "../img.png"},
+            {"image_path": "/etc/passwd"},
+            {"image_path": "img.png", "output_dir": "../elsewhere"},
+            {"image_path": "img.png", "output_dir": "/tmp"},
+            {"image_path": "img.png", "overrides": {"cache": {"directory": "/tmp"}}},
+            {"image_path": "img.png", "overrides": {"tiling": {"directory": "/tmp"}}},
+        ):
+            status, error = post(httpd, body)
+            assert status == 403, body
+            assert error["status"] == "error"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        service.stop()
+
+
+def test_timeout_returns_504(base_cfg, image_path):
+    release = threading.Event()
+
+    class SlowService(AnalysisService):
+        def analyze(self, request):
+            release.wait(timeout=30)
+            return {"status": "ok"}
+
+    service = SlowService(base_cfg, workers=1, queue_size=2)
+    service.start()
+    httpd = running_server(service, request_timeout=0.2)
+    try:
+        status, body = post(httpd, {"image_path": image_path})
+        assert status == 504 and body["status"] == "timeout"
+    finally:
+        release.set()
+        httpd.shutdown()
+        httpd.server_close()
+        service.stop()
+
+
+def test_request_limits(base_cfg, image_path, tmp_path):
+    service = AnalysisService(base_cfg, workers=1, queue_size=2, input_root=str(tmp_path))
+    service.start()
+    httpd = running_server(service, max_body_bytes=1024)
+    try:
+        for length in (str(10 ** 9), "-1"):
+            # answered from the headers alone; the body is never sent
+            conn = http.client.HTTPConnection("127.0.0.1", httpd.server_port, timeout=60)
+            conn.putrequest("POST", "/analyze")
+            conn.putheader("Content-Length", length)
+            conn.endheaders()
+            response = conn.getresponse()
+            assert response.status == 413 and json.loads(response.read())["status"] == "error"
+
+        status, error = post(httpd, {"image_path": image_path, "id": ["not", "a", "string"]})
+        assert status == 400 and "id" in error["error"]
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        service.stop()
+
+
+def test_profiled_requests_run_alone():
+    from src.betteredit.server import ProfilingGate
+
+    gate = ProfilingGate()
+    gate.acquire(exclusive=False)
+    gate.acquire(exclusive=False)  # plain requests share the gate
+    entered = threading.Event()
+
+    def profiled():
+        gate.acquire(exclusive=True)
+        entered.set()
+        gate.release(exclusive=True)
+
+    thread = threading.Thread(target=profiled)
+    thread.start()
+    assert not entered.wait(0.1)
+    gate.release(exclusive=False)
+    assert not entered.wait(0.1)
+    gate.release(exclusive=False)
+    assert entered.wait(5)
+    thread.join()
+
+
+def test_unix_socket_health(base_cfg, tmp_path):
+    service = AnalysisService(base_cfg, workers=1, queue_size=2)
+    sock_path = str(tmp_path / "betteredit.sock")
+    httpd = make_server(service, socket_path=sock_path)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    service.start()
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(sock_path)
+        client.sendall(b"GET /health HTTP/1.0\r\n\r\n")
+        raw = b""
+        while chunk := client.recv(4096):
+            raw += chunk
+        client.close()
+        head, _, body = raw.partition(b"\r\n\r\n")
+        assert head.startswith(b"HTTP/1.0 200")
+        assert json.loads(body)["workers"] == 1
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        service.stop()
@@ -0,0 +1,50 @@
+import cv2
+import numpy as np
+import pytest
+from src.analyzer.features.tiling import (
+    ValueRange, dirty_tiles, disk_array, grow_tile, iter_tiles, map_tiles, normalize_tiled
+)
+
+
+def test_tiles_cover_image_once():
+    covered = np.zeros((70, 45), dtype=np.int32)
+    for tile in iter_tiles(covered.shape, 16, halo=3):
+        covered[tile.core] += 1
+        assert tile.hy0 == max(0, tile.y0 - 3) and tile.hx1 == min(45, tile.x1 + 3)
+    assert (covered == 1).all()
+    with pytest.raises(ValueError):
+        next(iter_tiles(covered.shape, 0))
+
+
+def test_halo_reproduces_full_image_filter():
+    arr = np.random.default_rng(0).random((61, 83)).astype(np.float32)
+    expected = cv2.GaussianBlur(arr, (7, 7), 0)
+    out = disk_array(arr.shape)
+    value_range = ValueRange()
+    map_tiles(lambda window: cv2.GaussianBlur(window, (7, 7), 0), [arr], out, 16, halo=3, value_range=value_range)
+    np.testing.assert_allclose(out, expected, atol=1e-6)
+
+    normalize_tiled(out, value_range, 16)
+    np.testing.assert_allclose(out, (expected - expected.min()) / (expected.max() - expected.min()), atol=1e-6)
+
+
+def test_disk_array_is_file_backed(tmp_path):
+    arr = disk_array((4, 5, 3), np.uint8, str(tmp_path))
+    assert isinstance(arr, np.memmap) and arr.dtype == np.uint8
+    assert not arr.any()
+    # the backing file is anonymous
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_dirty_tiles_and_growth():
+    old = np.zeros((40, 50, 3), dtype=np.uint8)
+    new = old.copy()
+    new[20, 35, 1] = 5
+    assert dirty_tiles(old, old, 16) == []
+    (tile,) = dirty_tiles(old, new, 16)
+    assert (tile.y0, tile.x0) == (16, 32)
+    assert dirty_tiles(old, new, 16, threshold=5) == []
+
+    grown = grow_tile(tile, 4, 2, old.shape)
+    assert (grown.y0, grown.y1, grown.x0, grown.x1) == (12, 36, 28, 50)
+    assert (grown.hy0, grown.hy1, grown.hx0, grown.hx1) == (10, 38, 26, 50)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from scipy.ndimage import uniform_filter
+from src.analyzer.features.window_stats import IntegralImage, as_window_sizes
+from src.analyzer.features.color_detection.transforms import compute_color_density
+from src.analyzer.features.edge_detection.transforms import compute_edge_density
+
+
+@pytest.fixture
+def arr():
+    return np.random.default_rng(0).random((37, 53)).astype(np.float32)
+
+
+@pytest.mark.parametrize("size", [1, 4, 5, 16])
+def test_box_statistics_match_uniform_filter(arr, size):
+    table = IntegralImage(arr, max_size=16)
+    mean = uniform_filter(arr, size=size)
+    var = uniform_filter(arr * arr, size=size) - mean * mean
+    np.testing.assert_allclose(table.mean(size), mean, atol=1e-6)
+    np.testing.assert_allclose(table.variance(size), var, atol=1e-6)
+
+
+def test_count_and_size_limits(arr):
+    mask = (arr > 0.5).astype(np.uint8)
+    table = IntegralImage(mask, max_size=8, squares=False)
+    expected = np.rint(uniform_filter(mask.astype(np.float64), size=3) * 9).astype(np.int64)
+    np.testing.assert_array_equal(table.count(3), expected)
+    with pytest.raises(ValueError):
+        table.mean(9)
+    with pytest.raises(ValueError):
+        table.variance(3)
+    with pytest.raises(ValueError):
+        as_window_sizes([])
+
+
+def test_multiscale_density(arr):
+    single = compute_color_density(arr, 8)
+    assert single.shape == arr.shape
+    np.testing.assert_array_equal(compute_color_density(arr, [8]), single)
+
+    multi = compute_color_density(arr, [4, 8, 16])
+    assert multi.min() >= 0.0 and multi.max() <= 1.0 + 1e-6
+    assert not np.allclose(multi, single)
+
+    edges = (arr > 0.8).astype(np.uint8) * 255
+    density = compute_edge_density(edges, [8, 16])
+    assert density.dtype == np.float32 and density.shape == arr.shape
+
+
+@pytest.mark.parametrize("window", [8, [4, 8, 16], 40])
+def test_density_stacks_match_per_channel(window):
+    from src.analyzer.features.color_detection.transforms import compute_color_density_stack
+    from src.analyzer.features.edge_detection.transforms import compute_edge_density_stack
+
+    stack = np.random.default_rng(1).random((3, 37, 53)).astype(np.float32)
+    np.testing.assert_allclose(
+        compute_color_density_stack(stack, window),
+        np.stack([compute_color_density(channel, window) for channel in stack]),
+        atol=1e-6
+    )
+    edges = (stack > 0.7).astype(np.uint8) * 255
+    np.testing.assert_allclose(
+        compute_edge_density_stack(edges, window),
+        np.stack([compute_edge_density(channel, window) for channel in edges]),
+        atol=1e-6
+    )
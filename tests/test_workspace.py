@@ -0,0 +1,81 @@
+import threading
+import tracemalloc
+import numpy as np
+from src.analyzer.features.workspace import Workspace
+from src.analyzer.features.color_detection.transforms import compute_color_density, compute_luminance_contrast
+from src.analyzer.features.color_detection.intra_fusion import compute_cue_salience
+from src.analyzer.features.edge_detection.transforms import compute_edge_salience
+
+
+def test_buffers_are_reused_per_thread():
+    ws = Workspace(max_bytes=2 * 400)
+    a = ws.buffer("a", (10, 10))
+    assert ws.buffer("a", (10, 10)) is a
+    b = ws.buffer("b", (10, 10))
+    assert b is not a
+    ws.buffer("a", (10, 10))          # refresh "a"
+    ws.buffer("c", (10, 10))          # evicts the least recently used buffers
+    assert ws.nbytes() <= 2 * 400
+    assert ws.buffer("a", (10, 10)) is a
+    assert ws.buffer("b", (10, 10)) is not b
+    assert Workspace().buffer("a", (10, 10), np.float64).dtype == np.float64
+
+    main = Workspace.current()
+    assert Workspace.current() is main
+    other = []
+    thread = threading.Thread(target=lambda: other.append(Workspace.current()))
+    thread.start()
+    thread.join()
+    assert other[0] is not main
+
+
+def test_out_variants_match_and_do_not_allocate():
+    rng = np.random.default_rng(0)
+    strength = rng.random((512, 512)).astype(np.float32)
+    density = rng.random((512, 512)).astype(np.float32)
+    out = np.empty_like(strength)
+    calls = [
+        (lambda: compute_color_density(strength, 16), lambda: compute_color_density(strength, 16, out=out)),
+        (lambda: compute_luminance_contrast(strength, "combined", 0.5),
+         lambda: compute_luminance_contrast(strength, "combined", 0.5, out=out)),
+        (lambda: compute_cue_salience(strength, density, "product"),
+         lambda: compute_cue_salience(strength, density, "product", out=out)),
+        (lambda: compute_edge_salience(strength, density, "product"),
+         lambda: compute_edge_salience(strength, density, "product", out=out)),
+    ]
+    for allocating, into in calls:
+        expected = allocating().copy()
+        into()  # warm the workspace
+        tracemalloc.start()
+        result = into()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert result is out
+        np.testing.assert_array_equal(result, expected)
+        # no full-frame temporaries once the workspace is warm (only NumPy's
+        # fixed-size iteration buffers)
+        assert peak < strength.nbytes / 4
+
+
+def test_arena_budget_spans_lease_keys():
+    Workspace.release_idle()
+    budget = Workspace.max_bytes
+    Workspace.configure(3 * 400)
+    try:
+        for key in ("color.hue", "color.rarity", "edges.canny"):
+            with Workspace.lease(key) as ws:
+                ws.buffer("a", (10, 10))
+                ws.buffer("b", (10, 10))
+        # the later leases dropped the earlier idle workspaces
+        assert Workspace.arena_bytes() <= 3 * 400
+        assert "color.hue" not in Workspace._idle
+
+        with Workspace.lease("color.hue") as ws:
+            for name in "abcd":
+                ws.buffer(name, (10, 10))
+            assert Workspace.arena_bytes() <= 3 * 400
+
+        assert Workspace.release_idle() > 0
+        assert Workspace.arena_bytes() == 0 and not Workspace._idle
+    finally:
+        Workspace.configure(budget)